@@ -1,6 +1,8 @@
 # Django settings for HalliganAvailability project.
 import os
 
+from django.utils.six.moves.urllib.parse import quote
+
 PROJECT_ROOT = os.path.join(os.path.dirname(__file__), '..')
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -45,6 +47,27 @@ SESSION_REDIS_PORT = REDIS_PORT = 6666
 SESSION_REDIS_PASSWORD = REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD', '')
 SESSION_REDIS_PREFIX = 'session'
 
+# Prepended to every key the application itself keeps in redis
+REDIS_KEY_PREFIX = 'hh'
+
+# Serve course queues from the copy kept in redis by tas.live_queue
+LIVE_QUEUE_ENABLED = True
+
+# Serve the shared part of the school payload from redis (see
+# tas.school_cache), rebuilding it at least this often, in seconds
+SCHOOL_CACHE_ENABLED = True
+SCHOOL_CACHE_TIMEOUT = 60
+
+# How much each solved request moves a course's average service time
+SERVICE_TIME_SMOOTHING = 0.1
+
+# Seconds to keep published WebSocket messages in the outbox for
+OUTBOX_RETENTION = 60 * 60 * 24
+
+# How far behind a client can be before it gets a snapshot instead of the
+# changes to a course
+DELTA_SYNC_MAX_CHANGES = 500
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -69,19 +92,46 @@ TEMPLATES = [
 ]
 
 AUTHENTICATION_BACKENDS = (
+    'tas.backends.StudentProfileBackend',
+    # Kept so that sessions created before StudentProfileBackend existed
+    # stay logged in.
     'django.contrib.auth.backends.ModelBackend',
 )
 
+# How long (in seconds) a user and their profile are cached in redis by
+# StudentProfileBackend
+USER_CACHE_TIMEOUT = 60 * 60
+
 MIDDLEWARE_CLASSES = (
+    # First, so that the time spent in the other middleware is counted too
+    'tas.middleware.RequestMetricsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'tas.db_router.ReplicaStickinessMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tas.middleware.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
 
+# Requests taking longer than this many seconds are logged to the
+# 'tas.slow_requests' logger along with their SQL. Set it to an empty string
+# to turn it off.
+SLOW_REQUEST_THRESHOLD = os.environ.get('SLOW_REQUEST_THRESHOLD', '1')
+SLOW_REQUEST_THRESHOLD = (float(SLOW_REQUEST_THRESHOLD)
+                          if SLOW_REQUEST_THRESHOLD else None)
+
+# Where profiles of requests made with ?profile=1 are written, and how often
+# (in seconds) the stack is sampled while profiling.
+profile_dir_default = os.path.join(os.path.dirname(BASE_DIR), 'profiles')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', profile_dir_default)
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Addresses allowed to read /metrics/ without logging in as a superuser
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+
 ROOT_URLCONF = 'HalliganAvailability.urls'
 
 INSTALLED_APPS = (
@@ -119,12 +169,26 @@ REGISTRATION_OPEN = True
 
 LOGIN_URL = '/'
 LOGIN_REDIRECT_URL = '/'
-BROKER_URL = 'redis://localhost:6379/0'
+# Celery uses the same redis as everything else, which runs on REDIS_PORT
+# with a password
+BROKER_URL = 'redis://{}{}:{}/0'.format(
+    ':{}@'.format(quote(REDIS_PASSWORD, safe='')) if REDIS_PASSWORD else '',
+    REDIS_HOST, REDIS_PORT
+)
 BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 10850}
+# Task arguments are only ids and paths, and the worker runs as the same
+# user as the web processes so it can read the headshot spool
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
 
 
 ALLOWED_REGISTRATION_DOMAINS = ('tufts.edu', 'cs.tufts.edu')
 
+# How long (in seconds) a process trusts its in-memory copy of the
+# SchoolEmailDomain table. Changes made in the same process apply immediately.
+SCHOOL_DOMAIN_INDEX_TTL = 60
+
 # Websocket-for-Redis stuff
 
 INSTALLED_APPS += (
@@ -155,6 +219,24 @@ DATABASES = {
     }
 }
 
+# Reads are sent to a streaming replica when one is configured (see
+# tas.db_router). For trying it out locally, REPLICA_DB_NAME can name a
+# second database on the same server. Tests use the primary for both.
+if os.environ.get('REPLICA_DB_HOST') or os.environ.get('REPLICA_DB_NAME'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=os.environ.get('REPLICA_DB_HOST', DATABASES['default']['HOST']),
+        NAME=os.environ.get('REPLICA_DB_NAME', DATABASES['default']['NAME']),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['tas.db_router.ReplicaRouter']
+REPLICA_DATABASE = 'replica' if 'replica' in DATABASES else None
+
+# Seconds a session keeps reading from the primary after it writes, which
+# has to be longer than the replica usually lags behind
+REPLICA_STICKY_SECONDS = 10
+
 EMAIL_HOST_USER = 'noreply@halliganhelper.com'
 DEFAULT_FROM_EMAIL = 'support@halliganhelper.com'
 EMAIL_HOST = 'smtp.zoho.com'
@@ -170,6 +252,31 @@ MEDIA_URL = '/media/'
 media_root_default = os.path.join(os.path.dirname(BASE_DIR), 'mediafiles')
 MEDIA_ROOT = os.environ.get('MEDIA_ROOT', media_root_default)
 
+# When set, media requests that reach Django are handed back to the web
+# server instead of being streamed by Django. Either 'x-accel-redirect'
+# (nginx, which needs an internal location at MEDIA_ACCEL_REDIRECT_PREFIX
+# aliased to MEDIA_ROOT) or 'x-sendfile'.
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Cache lifetimes (in seconds) for media. Content addressed files, like
+# processed headshots, never change and can be cached for a year.
+MEDIA_MAX_AGE = 60 * 5
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Uploaded headshots are copied here until a worker resizes them. Every
+# upload is stored in each of HEADSHOT_SIZES (width, height); 'thumbnail' is
+# the one saved on Student.headshot.
+headshot_spool_default = os.path.join(os.path.dirname(BASE_DIR),
+                                      'spool', 'headshots')
+HEADSHOT_SPOOL_DIR = os.environ.get('HEADSHOT_SPOOL_DIR',
+                                    headshot_spool_default)
+HEADSHOT_SIZES = {
+    'thumbnail': (100, 100),
+    'retina': (200, 200),
+    'list-avatar': (48, 48),
+}
+
 STATIC_URL = '/static/'
 static_root_default = os.path.join(os.path.dirname(BASE_DIR), 'staticfiles')
 STATIC_ROOT = os.environ.get('STATIC_ROOT', static_root_default)
@@ -201,8 +308,10 @@ DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': '/password/reset/confirm/{uid}/{token}',
 }
 
+# Uses orjson or simplejson when one is installed, and DRF's own JSON
+# handling otherwise
 DEFAULT_RENDERER_CLASSES = (
-    'rest_framework.renderers.JSONRenderer',
+    'tas.api.fast_json.FastJSONRenderer',
 )
 
 if DEBUG:
@@ -212,6 +321,11 @@ if DEBUG:
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': DEFAULT_RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': (
+        'tas.api.fast_json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
@@ -254,6 +368,11 @@ LOGGING = {
             'handlers': ['null'],
             'propagate': False,
         },
+        # RequestMetricsMiddleware turns on the debug cursor, which would
+        # otherwise log every query.
+        'django.db.backends': {
+            'level': 'INFO',
+        },
         '': {
             'handlers': ['console', 'file'],
             'level': 'DEBUG',
@@ -2,11 +2,12 @@ from django.conf.urls import patterns, include, url
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.contrib import admin
 from django.conf import settings
-from django.conf.urls.static import static
 
 from tas import api as tas_api
 
-from tas.views import ModularHomePage
+from tas.event_stream import course_events
+from tas.metrics import metrics_view
+from tas.views import ModularHomePage, serve_media
 
 admin.autodiscover()
 
@@ -15,8 +16,16 @@ urlpatterns = [
     url(r'^admin/', include(admin.site.urls)),
     url(r'^$', ModularHomePage, name='ModularHomePage'),
     url(r'^api/', include(tas_api.urls)),
+    url(r'^metrics/$', metrics_view, name='metrics'),
+    url(r'^events/courses/(?P<course_pk>\d+)/$', course_events,
+        name='course-events'),
 ]
 
 if settings.DEBUG:
     urlpatterns += staticfiles_urlpatterns()
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if settings.DEBUG or settings.MEDIA_SENDFILE_BACKEND is not None:
+    urlpatterns += [
+        url(r'^{}(?P<path>.*)$'.format(settings.MEDIA_URL.lstrip('/')),
+            serve_media),
+    ]
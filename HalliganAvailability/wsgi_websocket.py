@@ -5,5 +5,26 @@ import gevent.monkey
 gevent.monkey.patch_thread()
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "HalliganAvailability.settings")
 
+from django.core.wsgi import get_wsgi_application
 from ws4redis.uwsgi_runserver import uWSGIWebsocketServer
-application = uWSGIWebsocketServer()
+
+from tas.websocket_server import MultiplexedWebsocketServer
+
+
+class WebsocketServer(MultiplexedWebsocketServer, uWSGIWebsocketServer):
+    """Every WebSocket in this process shares one redis subscription."""
+
+
+# Server-sent event streams are long lived like the WebSockets, so they're
+# served here too (see tas.event_stream) rather than tying up a worker of
+# the main application.
+EVENT_STREAM_PREFIX = '/events/'
+
+websocket_application = WebsocketServer()
+event_stream_application = get_wsgi_application()
+
+
+def application(environ, start_response):
+    if environ.get('PATH_INFO', '').startswith(EVENT_STREAM_PREFIX):
+        return event_stream_application(environ, start_response)
+    return websocket_application(environ, start_response)
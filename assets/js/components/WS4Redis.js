@@ -4,6 +4,7 @@ function WS4Redis( options ) {
     'use strict';
     var opts, ws, deferred, timer, attempts = 1;
     var heartbeat_interval = null, missed_heartbeats = 0;
+    var connected_before = false;
 
     if (this === undefined) {
         return new WS4Redis( options );
@@ -51,6 +52,11 @@ function WS4Redis( options ) {
             missed_heartbeats = 0;
             heartbeat_interval = setInterval(send_heartbeat, 5000);
         }
+        // anything published while we were disconnected was missed
+        if (connected_before && typeof opts.on_reconnect === 'function') {
+            opts.on_reconnect();
+        }
+        connected_before = true;
     }
 
     function on_close(evt) {
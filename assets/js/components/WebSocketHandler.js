@@ -9,7 +9,8 @@ var WebSocketHandler = Backbone.Model.extend({
         this.ws4redis = WS4Redis({
             uri: this._buildWebSocketURI(),
             heartbeat_msg: '--heartbeat--',
-            receive_message: _.bind( this.receiveMessage, this )
+            receive_message: _.bind( this.receiveMessage, this ),
+            on_reconnect: _.bind( this.trigger, this, 'reconnected' )
         });
     },
     _buildWebSocketURI: function() {
@@ -1,8 +1,28 @@
+var _ = require( 'underscore' );
+
 var CourseDependentModel = require( './CourseDependentModel' );
 
 var Request = CourseDependentModel.extend( {
-    endRoute: 'requests/'
+    endRoute: 'requests/',
+    save: function( attrs, options ) {
+        options = _.extend( {}, options );
+
+        /* Someone else changed the request since we last saw it. The
+         * response is what it looks like now, so show that instead.
+         */
+        var error = options.error;
+        options.error = function( model, response, opts ) {
+            if ( response.status === 409 && response.responseJSON ) {
+                model.set( response.responseJSON );
+            }
+
+            if ( error ) {
+                error( model, response, opts );
+            }
+        };
+
+        return CourseDependentModel.prototype.save.call( this, attrs, options );
+    }
 } );
 
 module.exports = Request;
-
@@ -91,8 +91,13 @@ var User = Backbone.Model.extend( {
             cache: false,
             contentType: false,
             processData: false,
-            success: _.bind( function( data ) {
+            success: _.bind( function( data, textStatus, jqxhr ) {
                 this.set( 'headshot_url', data.headshot_url );
+
+                /* 202 means the photo is still being resized on the server */
+                if ( jqxhr.status === 202 ) {
+                    _.delay( _.bind( this.fetch, this ), 5000 );
+                }
             }, this ),
             error: _.bind( function( request ) {
                 errorFunc( photo, 'network' );
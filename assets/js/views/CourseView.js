@@ -61,16 +61,25 @@ var CourseView = Backbone.View.extend({
         this.listenTo( this.makeRequestView, 'newRequest', this.newRequest );
         this.listenTo( this.webSocketHandler, 
                        'request_created request_updated', 
-                       this.newWebSocketRequest );
+                       this.inSequence( this.newWebSocketRequest ) );
         this.listenTo( this.webSocketHandler,
                        'request_removed',
-                       this.removeWebSocketRequest );
+                       this.inSequence( this.removeWebSocketRequest ) );
+        this.listenTo( this.webSocketHandler,
+                       'requests_removed',
+                       this.inSequence( this.removeWebSocketRequests ) );
+        this.listenTo( this.webSocketHandler,
+                       'tas_changed',
+                       this.inSequence( this.changedWebSocketTAs ) );
+        this.listenTo( this.webSocketHandler,
+                       'reconnected',
+                       this.catchUp );
         this.listenTo( this.webSocketHandler,
                        'on_duty',
-                       this.newWebSocketOfficeHour );
+                       this.inSequence( this.newWebSocketOfficeHour ) );
         this.listenTo( this.webSocketHandler,
                        'off_duty',
-                       this.removeWebSocketOfficeHour );
+                       this.inSequence( this.removeWebSocketOfficeHour ) );
         this.listenTo( this, 'newCourse', _.bind( function( courseID ) {
             this.course.set( 'id', courseID );
             this.course.fetch( { 
@@ -103,6 +112,100 @@ var CourseView = Backbone.View.extend({
         } catch ( e ) {
         }
     },
+    changedWebSocketTAs: function( data ) {
+        if ( data.course != this.course.get('id' ) ) {
+           return; 
+        }
+        this.tas.fetch( { 'reset': true } );
+    },
+    inSequence: function( handler ) {
+        /* Only hand a message for this course to `handler` if it's the next
+         * one in the course's sequence. Repeats are dropped, and if
+         * messages were missed we catch up instead. Messages that arrive
+         * while catching up are held until it's done. See tas/changes.py.
+         */
+        var inSequence = function( data ) {
+            if ( data.course != this.course.get( 'id' ) || data.seq === undefined ) {
+                return handler.call( this, data );
+            }
+
+            var sequence = this.course.get( 'sequence' );
+            if ( sequence === undefined ) {
+                return handler.call( this, data );
+            }
+            if ( this.catchingUp ) {
+                this.heldMessages.push( { 'handle': inSequence, 'data': data } );
+                return;
+            }
+            if ( data.seq <= sequence ) {
+                return;
+            }
+            if ( data.seq > sequence + 1 ) {
+                return this.catchUp();
+            }
+
+            this.course.set( 'sequence', data.seq );
+            return handler.call( this, data );
+        };
+        return inSequence;
+    },
+    catchUp: function() {
+        /* Only fetch what changed while the socket was down, rather than
+         * every collection from scratch.
+         */
+        var sequence = this.course.get( 'sequence' );
+        if ( sequence === undefined || this.catchingUp ) {
+            return;
+        }
+
+        this.catchingUp = true;
+        this.heldMessages = [];
+        $.getJSON( this.course.url() + 'changes/', { 'since': sequence },
+                   _.bind( this.applyChanges, this ) )
+            .always( _.bind( function() {
+                this.catchingUp = false;
+                this.replayHeldMessages();
+            }, this ) );
+    },
+    replayHeldMessages: function() {
+        /* Anything already covered by the changes is dropped as a repeat,
+         * and anything newer is applied in order.
+         */
+        var held = _.sortBy( this.heldMessages, function( message ) {
+            return message.data.seq;
+        } );
+        this.heldMessages = [];
+        _.each( held, function( message ) {
+            message.handle.call( this, message.data );
+        }, this );
+    },
+    applyChanges: function( data ) {
+        if ( data.snapshot ) {
+            this.requests.reset( data.requests );
+            this.officeHours.reset( data.office_hours );
+        } else {
+            this.requests.add( data.requests, { 'merge': true } );
+            _.each( data.removed_requests, function( id ) {
+                this.removeWebSocketRequest( { 'course': this.course.get( 'id' ), 'id': id } );
+            }, this );
+
+            this.officeHours.add( data.office_hours, { 'merge': true } );
+            _.each( data.removed_office_hours, function( id ) {
+                this.removeWebSocketOfficeHour( { 'course': this.course.get( 'id' ), 'id': id } );
+            }, this );
+        }
+
+        if ( data.tas !== null ) {
+            this.tas.reset( data.tas );
+        }
+
+        this.course.set( 'sequence', data.sequence );
+    },
+    removeWebSocketRequests: function( data ) {
+        _.each( data.ids, function( id ) {
+            this.removeWebSocketRequest( { 'course': data.course, 'id': id } );
+        }, this );
+    },
     newWebSocketOfficeHour: function( data ) {
         if ( data.course != this.course.get('id' ) ) {
            return; 
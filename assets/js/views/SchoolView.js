@@ -49,7 +49,8 @@ var SchoolView = Backbone.View.extend({
     },
     initWebSocketListeners: function() {
         this.listenTo( this.webSocketHandler, 
-                       'request_created request_removed on_duty off_duty', 
+                       'request_created request_removed requests_removed ' +
+                       'on_duty off_duty',
                        _.bind( this.updateDashboard, this ) );
 
         this.listenTo( this.webSocketHandler,
@@ -10,18 +10,47 @@ from .custom_user import CustomUser
 from .models import (Student, OfficeHour, Course, Request,
                      School, SchoolEmailDomain, TA)
 
-from .utils import check_ta
+from .utils import check_ta, get_administered_school_ids
+
+
+class AdminSchoolScope(object):
+    """The set of schools a user is allowed to administer.
+
+    Resolving the scope means reading the user's groups and looking up the
+    matching schools, so it's only done once per request. Use
+    `AdminSchoolScope.for_request` rather than building one directly.
+    """
+    cache_attribute = '_admin_school_scope'
+
+    def __init__(self, user):
+        self.is_superuser = user.is_superuser
+        self.school_ids = frozenset()
+        if not self.is_superuser:
+            self.school_ids = frozenset(get_administered_school_ids(user))
+
+    @classmethod
+    def for_request(cls, request):
+        scope = getattr(request, cls.cache_attribute, None)
+        if scope is None:
+            scope = cls(request.user)
+            setattr(request, cls.cache_attribute, scope)
+        return scope
+
+    def filter(self, queryset, school_field='school'):
+        """Limit `queryset` to rows whose `school_field` is in scope."""
+        if self.is_superuser:
+            return queryset
+        lookup = '{}__in'.format(school_field)
+        return queryset.filter(**{lookup: self.school_ids})
 
 
 class MySchoolsOnlyModelAdminMixin(object):
+    school_field = 'school'
+
     def get_queryset(self, request):
         qs = super(MySchoolsOnlyModelAdminMixin, self).get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        groups = request.user.groups.values_list('name', flat=True)
-        school_names = [g.rstrip(' Admins') for g in groups]
-        schools = School.objects.filter(name__in=school_names)
-        return qs.filter(school__in=schools)
+        scope = AdminSchoolScope.for_request(request)
+        return scope.filter(qs, self.school_field)
 
 
 class SchoolEmailDomainInline(admin.TabularInline):
@@ -32,11 +61,10 @@ class SchoolEmailDomainInline(admin.TabularInline):
 class SchoolAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super(SchoolAdmin, self).get_queryset(request)
-        if request.user.is_superuser:
+        scope = AdminSchoolScope.for_request(request)
+        if scope.is_superuser:
             return qs
-        groups = request.user.groups.values_list('name', flat=True)
-        school_names = [g.rstrip(' Admins') for g in groups]
-        return qs.filter(name__in=school_names)
+        return qs.filter(pk__in=scope.school_ids)
 
     inlines = [
         SchoolEmailDomainInline,
@@ -53,11 +81,10 @@ class CourseAdmin(MySchoolsOnlyModelAdminMixin, admin.ModelAdmin):
             .get_queryset(request).prefetch_related('school')
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        scope = AdminSchoolScope.for_request(request)
 
-        if db_field.name == 'school' and not request.user.is_superuser:
-            groups = request.user.groups.values_list('name', flat=True)
-            school_names = [g.rstrip(' Admins') for g in groups]
-            kwargs['queryset'] = School.objects.filter(name__in=school_names)
+        if db_field.name == 'school' and not scope.is_superuser:
+            kwargs['queryset'] = School.objects.filter(pk__in=scope.school_ids)
 
         return super(CourseAdmin, self)\
             .formfield_for_foreignkey(db_field, request, **kwargs)
@@ -65,82 +92,58 @@ class CourseAdmin(MySchoolsOnlyModelAdminMixin, admin.ModelAdmin):
 
 class StudentAdmin(MySchoolsOnlyModelAdminMixin, admin.ModelAdmin):
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if not request.user.is_superuser:
-            groups = request.user.groups.values_list('name', flat=True)
-            school_names = [g.rstrip(' Admins') for g in groups]
-            schools = School.objects.filter(name__in=school_names)
-
+        scope = AdminSchoolScope.for_request(request)
+        if not scope.is_superuser:
             if db_field.name == 'school':
-                kwargs['queryset'] = schools
+                kwargs['queryset'] = \
+                    School.objects.filter(pk__in=scope.school_ids)
             if db_field.name == 'user':
-                users = CustomUser.objects.filter(student__school__in=schools)
-                kwargs['queryset'] = users
+                kwargs['queryset'] = scope.filter(CustomUser.objects.all(),
+                                                  'student__school')
 
         return super(StudentAdmin, self)\
             .formfield_for_foreignkey(db_field, request, **kwargs)
 
     def formfield_for_manytomany(self, db_field, request, **kwargs):
-        if not request.user.is_superuser:
-            groups = request.user.groups.values_list('name', flat=True)
-            school_names = [g.rstrip(' Admins') for g in groups]
-            schools = School.objects.filter(name__in=school_names)
-
+        scope = AdminSchoolScope.for_request(request)
+        if not scope.is_superuser:
             if db_field.name == 'courses':
-                kwargs['queryset'] = Course.objects.filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(Course.objects.all())
 
         return super(StudentAdmin, self)\
             .formfield_for_manytomany(db_field, request, **kwargs)
 
 
-class OfficeHourAdmin(admin.ModelAdmin):
-    def get_queryset(self, request):
-        qs = super(OfficeHourAdmin, self).get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        groups = request.user.groups.values_list('name', flat=True)
-        school_names = [g.rstrip(' Admins') for g in groups]
-        return qs.filter(course__school__name__in=school_names)
+class OfficeHourAdmin(MySchoolsOnlyModelAdminMixin, admin.ModelAdmin):
+    school_field = 'course__school'
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if not request.user.is_superuser:
-            groups = request.user.groups.values_list('name', flat=True)
-            school_names = [g.rstrip(' Admins') for g in groups]
-            schools = School.objects.filter(name__in=school_names)
-
+        scope = AdminSchoolScope.for_request(request)
+        if not scope.is_superuser:
             if db_field.name == 'course':
-                kwargs['queryset'] = Course.objects.filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(Course.objects.all())
             if db_field.name == 'ta':
-                kwargs['queryset'] = Student.objects.filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(Student.objects.all())
 
         return super(OfficeHourAdmin, self)\
             .formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class RequestAdmin(admin.ModelAdmin):
-    def get_queryset(self, request):
-        qs = super(RequestAdmin, self).get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        groups = request.user.groups.values_list('name', flat=True)
-        school_names = [g.rstrip(' Admins') for g in groups]
-        return qs.filter(course__school__name__in=school_names)
+class RequestAdmin(MySchoolsOnlyModelAdminMixin, admin.ModelAdmin):
+    school_field = 'course__school'
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        scope = AdminSchoolScope.for_request(request)
         if db_field.name == 'who_solved':
             kwargs['queryset'] = \
                 Student.objects.filter(ta_jobs__ta__active=True)
-        if not request.user.is_superuser:
-            groups = request.user.groups.values_list('name', flat=True)
-            school_names = [g.rstrip(' Admins') for g in groups]
-            schools = School.objects.filter(name__in=school_names)
-
+        if not scope.is_superuser:
             if db_field.name == 'course':
-                kwargs['queryset'] = Course.objects.filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(Course.objects.all())
             if db_field.name == 'requestor':
-                kwargs['queryset'] = Student.objects.filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(Student.objects.all())
             if db_field.name == 'who_solved':
-                kwargs['queryset'] = \
-                    kwargs['queryset'].filter(school__in=schools)
+                kwargs['queryset'] = scope.filter(kwargs['queryset'])
 
         return super(RequestAdmin, self)\
             .formfield_for_foreignkey(db_field, request, **kwargs)
@@ -231,11 +234,8 @@ class CustomUserAdmin(SuperModelAdmin, UserAdmin):
 
     def get_queryset(self, request):
         qs = super(CustomUserAdmin, self).get_queryset(request)
-        if request.user.is_superuser:
-            return qs
-        groups = request.user.groups.values_list('name', flat=True)
-        school_names = [g.rstrip(' Admins') for g in groups]
-        return qs.filter(student__school__name__in=school_names)
+        scope = AdminSchoolScope.for_request(request)
+        return scope.filter(qs, 'student__school')
 
     def check_ta_status(self, request, queryset):
         success_count = 0
@@ -0,0 +1,168 @@
+"""A JSON renderer and parser for the API that use a faster JSON library
+when one is installed.
+
+Encoding a large response with the standard library is slow, which matters
+for the school payload and long queues. Two libraries are tried, fastest
+first:
+
+- orjson, which needs Python 3,
+- simplejson with its C extension, which runs everywhere we deploy.
+
+Without either these behave exactly like DRF's JSONRenderer and JSONParser.
+
+The output is the same whichever is used. Everything a library would format
+differently from `rest_framework.utils.encoders.JSONEncoder` (datetimes,
+dates, times and decimals) is handed to that encoder's `default`, and
+U+2028 and U+2029 are escaped like DRF does. Anything a library can't
+encode at all, like integers wider than 64 bits in orjson, falls back to
+the standard library.
+"""
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import six
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simplejson
+    # Without its C extension simplejson is slower than the standard library
+    from simplejson import _speedups  # noqa
+except ImportError:
+    simplejson = None
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+if simplejson is not None:
+    # Set up like the standard library: decimals and namedtuples are left to
+    # DRF's encoder, and NaN and infinity are allowed
+    _simplejson_encoder = simplejson.JSONEncoder(
+        ensure_ascii=False, separators=(',', ':'), default=_encoder.default,
+        use_decimal=False, namedtuple_as_object=False, allow_nan=True
+    )
+    _simplejson_decoder = simplejson.JSONDecoder(parse_constant={
+        'NaN': float('nan'),
+        'Infinity': float('inf'),
+        '-Infinity': float('-inf'),
+    }.__getitem__)
+
+# Line and paragraph separators, which are valid JSON but not JavaScript
+_SEPARATOR_ESCAPES = (
+    (u'\u2028'.encode('utf-8'), b'\\u2028'),
+    (u'\u2029'.encode('utf-8'), b'\\u2029'),
+)
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+
+
+def _orjson_loads(content):
+    return orjson.loads(content)
+
+
+def _simplejson_dumps(data):
+    encoded = _simplejson_encoder.encode(data)
+    if isinstance(encoded, six.text_type):
+        encoded = encoded.encode('utf-8')
+    return encoded
+
+
+def _simplejson_loads(content):
+    # Decoded first, since simplejson returns byte strings for ASCII strings
+    # in bytes on Python 2, where the standard library returns unicode
+    return _simplejson_decoder.decode(content.decode('utf-8'))
+
+
+def get_backends():
+    """The installed backends, fastest first, as `(dumps, loads)` pairs by
+    name.
+    """
+    backends = OrderedDict()
+    if orjson is not None:
+        backends['orjson'] = (_orjson_dumps, _orjson_loads)
+    if simplejson is not None:
+        backends['simplejson'] = (_simplejson_dumps, _simplejson_loads)
+    return backends
+
+
+def get_backend():
+    """The name of the backend in use, or None."""
+    return next(iter(get_backends()), None)
+
+
+def is_available():
+    return get_backend() is not None
+
+
+def dumps(data, backend=None):
+    """Encode `data` like JSONRenderer does with compact, unicode output.
+    Returns bytes, or None if no backend is installed or it can't encode
+    `data`.
+    """
+    backends = get_backends()
+    backend = backend or get_backend()
+    if backend not in backends:
+        return None
+
+    try:
+        encoded = backends[backend][0](data)
+    except TypeError:
+        return None
+
+    for separator, escaped in _SEPARATOR_ESCAPES:
+        if separator in encoded:
+            encoded = encoded.replace(separator, escaped)
+    return encoded
+
+
+def loads(content, backend=None):
+    """Decode the UTF-8 JSON in `content`.
+
+    :raises: ValueError
+    """
+    return get_backends()[backend or get_backend()][1](content)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        # The backends are only set up for compact, unicode output
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is None and self.compact and not self.ensure_ascii:
+            encoded = dumps(data)
+            if encoded is not None:
+                return encoded
+
+        return super(FastJSONRenderer, self).render(data, accepted_media_type,
+                                                    renderer_context)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding',
+                                              settings.DEFAULT_CHARSET)
+        if (not is_available() or
+                encoding.lower().replace('-', '') != 'utf8'):
+            return super(FastJSONParser, self).parse(stream, media_type,
+                                                     parser_context)
+
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - {}'.format(exc))
@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 from datetime import timedelta
 
 from django.utils.timezone import now
@@ -9,12 +10,15 @@ from rest_framework import serializers, validators
 from ..models import (School,
                       Course,
                       CustomUser,
-                      SchoolEmailDomain,
                       Student,
                       Request,
                       OfficeHour,
                       TA)
 
+from ..backends import StudentProfileBackend
+from ..domains import get_school_id_for_email
+from ..live_queue import count_open_requests
+from ..resolutions import ACTIONS
 from ..utils import get_administrators_for_school
 
 logger = logging.getLogger(__name__)
@@ -24,9 +28,18 @@ class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField()
 
+    def _get_user(self, email):
+        """Look up the user for `email` once per login attempt."""
+        lookup = getattr(self, '_user_lookup', None)
+        if lookup is None or lookup[0] != email:
+            lookup = (email, StudentProfileBackend.get_user_by_email(email))
+            self._user_lookup = lookup
+
+        return lookup[1]
+
     def validate_email(self, email):
         # TODO: Base this off of the django settings module
-        if not CustomUser.objects.filter(email__iexact=email).exists():
+        if self._get_user(email) is None:
             msg = 'There is no account for the email address {}'
             raise serializers.ValidationError(msg.format(email))
 
@@ -44,9 +57,9 @@ class LoginSerializer(serializers.Serializer):
         except serializers.ValidationError:
             return
 
-        # Get the case-sensitive version of the email that the user used.
-        email = CustomUser.objects.get(email__iexact=email).email
-        user = authenticate(email=email, password=password)
+        # Hand the user we already found to the backend so it doesn't have
+        # to be looked up again.
+        user = authenticate(user=self._get_user(email), password=password)
 
         if user is None or not user.is_active:
             msg = 'The email/password combo is invalid'
@@ -74,9 +87,8 @@ class RegistrationSerializer(serializers.Serializer):
     last_name = serializers.CharField(max_length=100)
 
     def validate_email(self, email):
-        domain = email.split('@')[-1]
-        if not SchoolEmailDomain.objects.filter(domain=domain).exists():
-
+        if get_school_id_for_email(email) is None:
+            domain = email.split('@')[-1]
             msg = 'There is no school associated with \'{}\'. Please use your '
             msg += 'school email address'
 
@@ -97,8 +109,8 @@ class RegistrationSerializer(serializers.Serializer):
 
 
 class UserSerializer(serializers.ModelSerializer):
-    headshot_url = serializers.ImageField(source='student.headshot',
-                                          read_only=True)
+    headshot_url = serializers.CharField(source='student.headshot_url',
+                                         read_only=True)
     blurb = serializers.CharField(source='student.blurb')
     ta_jobs = serializers.SerializerMethodField()
 
@@ -126,30 +138,28 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class SchoolCourseSerializer(serializers.ModelSerializer):
+    """A course without anything that depends on who's looking at it, as
+    it's cached in the school payload (see `tas.school_cache`).
+    """
     identifier = serializers.CharField(source='get_identifier')
     active_ta_count = serializers.SerializerMethodField()
     current_request_count = serializers.SerializerMethodField()
-    am_a_ta = serializers.SerializerMethodField()
-
-    def get_am_a_ta(self, course):
-        request = self.context.get('request', None)
-        if request is None:
-            return False
-
-        return TA.objects.filter(active=True,
-                                 course=course,
-                                 student=request.user.student).exists()
 
     def get_active_ta_count(self, course):
         return OfficeHour.objects.filter(course=course,
                                          end_time__gte=now()).count()
 
     def get_current_request_count(self, course):
+        count = count_open_requests(course)
+        if count is not None:
+            return count
+
         requests = Request.objects.filter(
             course=course,
             solved=False,
-            cancelled=False
+            cancelled=False,
+            expired=False
         )
 
         # If there's a TTL, filter by it.
@@ -168,6 +178,31 @@ class CourseSerializer(serializers.ModelSerializer):
             'name',
             'identifier',
             'request_time_to_live',
+            'sequence',
+            'active_ta_count',
+            'current_request_count',
+        )
+
+
+class CourseSerializer(SchoolCourseSerializer):
+    am_a_ta = serializers.SerializerMethodField()
+
+    def get_am_a_ta(self, course):
+        request = self.context.get('request', None)
+        if request is None:
+            return False
+
+        return TA.objects.filter(active=True,
+                                 course=course,
+                                 student=request.user.student).exists()
+
+    class Meta(SchoolCourseSerializer.Meta):
+        fields = (
+            'id',
+            'name',
+            'identifier',
+            'request_time_to_live',
+            'sequence',
             'am_a_ta',
             'active_ta_count',
             'current_request_count',
@@ -177,8 +212,7 @@ class CourseSerializer(serializers.ModelSerializer):
 class RequestorSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(source='user.first_name')
     last_name = serializers.CharField(source='user.last_name')
-    headshot_url = serializers.ImageField(source='headshot',
-                                          read_only=True)
+    headshot_url = serializers.CharField(read_only=True)
 
     class Meta:
         model = Student
@@ -191,8 +225,7 @@ class RequestorSerializer(serializers.ModelSerializer):
 
 
 class TASerializer(serializers.ModelSerializer):
-    headshot_url = serializers.ImageField(source='headshot',
-                                          read_only=True)
+    headshot_url = serializers.CharField(read_only=True)
     first_name = serializers.CharField(source='user.first_name')
     last_name = serializers.CharField(source='user.last_name')
 
@@ -206,9 +239,14 @@ class TASerializer(serializers.ModelSerializer):
             logger.error('Null context passed to RequestoSerializer')
             return False
 
-        return request.user.pk == student.user.pk
+        return request.user.pk == student.user_id
 
     def get_on_duty(self, student):
+        # Annotated by TAViewSet
+        on_duty = getattr(student, 'is_on_duty', None)
+        if on_duty is not None:
+            return bool(on_duty)
+
         return OfficeHour.objects.filter(
             ta=student,
             end_time__gt=now()
@@ -301,12 +339,88 @@ class RequestSerializer(serializers.ModelSerializer):
         model = Request
         fields = ('id', 'question', 'where_located', 'when_asked',
                   'cancelled', 'checked_out', 'solved', 'requestor',
-                  'expired', 'owned_by_me', 'can_ta_for',)
+                  'expired', 'owned_by_me', 'can_ta_for', 'version',)
+
+
+# The columns `serialize_request_row` needs, for `QuerySet.values()`
+REQUEST_ROW_VALUES = ('id', 'question', 'where_located', 'when_asked',
+                      'cancelled', 'checked_out', 'solved', 'expired',
+                      'version', 'course_id', 'requestor_id',
+                      'requestor__headshot_url',
+                      'requestor__user__first_name',
+                      'requestor__user__last_name')
+
+_datetime_field = serializers.DateTimeField()
+
+
+def serialize_request_row(row, student_pk=None, ta_course_ids=()):
+    """What RequestSerializer gives for a request, built from its row of
+    REQUEST_ROW_VALUES without going through the serializer's fields.
+
+    :param int student_pk: The student looking at the request
+    :param ta_course_ids: The courses they're an active TA for
+    """
+    when_asked = row['when_asked']
+    if when_asked is not None:
+        when_asked = _datetime_field.to_representation(when_asked)
+
+    return OrderedDict((
+        ('id', row['id']),
+        ('question', row['question']),
+        ('where_located', row['where_located']),
+        ('when_asked', when_asked),
+        ('cancelled', row['cancelled']),
+        ('checked_out', row['checked_out']),
+        ('solved', row['solved']),
+        ('requestor', OrderedDict((
+            ('id', row['requestor_id']),
+            ('headshot_url', row['requestor__headshot_url']),
+            ('first_name', row['requestor__user__first_name']),
+            ('last_name', row['requestor__user__last_name']),
+        ))),
+        ('expired', row['expired']),
+        ('owned_by_me', row['requestor_id'] == student_pk),
+        ('can_ta_for', row['course_id'] in ta_course_ids),
+        ('version', row['version']),
+    ))
+
+
+def serialize_requests(queryset, web_request=None):
+    """The same as `RequestSerializer(queryset, many=True).data` with
+    `web_request` in the context, in two queries however long the queue is.
+    Use RequestSerializer for anything that writes.
+    """
+    student_pk = None
+    ta_course_ids = frozenset()
+    if web_request is not None:
+        student = web_request.user.student
+        student_pk = student.pk
+        ta_course_ids = frozenset(
+            TA.objects.filter(student=student, active=True)
+            .values_list('course_id', flat=True)
+        )
+
+    return [serialize_request_row(row, student_pk, ta_course_ids)
+            for row in queryset.values(*REQUEST_ROW_VALUES)]
+
+
+class BulkResolutionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(),
+                                required=False)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['all'] == ('ids' in data):
+            msg = 'Either pass the ids of the requests or set all'
+            raise serializers.ValidationError(msg)
+
+        return data
 
 
 class SchoolAdminSerializer(serializers.ModelSerializer):
-    headshot_url = serializers.ImageField(source='student.headshot',
-                                          read_only=True)
+    headshot_url = serializers.CharField(source='student.headshot_url',
+                                         read_only=True)
     full_name = serializers.CharField(source='get_full_name',
                                       read_only=True)
     is_head_admin = serializers.SerializerMethodField()
@@ -320,7 +434,7 @@ class SchoolAdminSerializer(serializers.ModelSerializer):
 
 
 class SchoolSerializer(serializers.ModelSerializer):
-    courses = CourseSerializer(many=True, read_only=True)
+    courses = SchoolCourseSerializer(many=True, read_only=True)
     administrators = serializers.SerializerMethodField()
 
     def get_administrators(self, school):
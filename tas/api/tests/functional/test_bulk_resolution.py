@@ -0,0 +1,108 @@
+import mock
+import pytest
+from django_dynamic_fixture import G
+from rest_framework.test import APIClient
+
+
+class TestBulkResolution(object):
+
+    def setup_course(self):
+        from tas.models import Course, Student, TA
+
+        ta = G(Student)
+        course = G(Course, school=ta.school)
+        G(TA, student=ta, course=course, active=True)
+        return ta, course
+
+    def post(self, student, course, data):
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/bulk/'.format(course.pk)
+        return client.post(url, data, format='json')
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.enqueue_message')
+    def test_solve_ids(self, enqueue_message):
+        from tas.models import Request
+
+        ta, course = self.setup_course()
+        first = G(Request, course=course)
+        second = G(Request, course=course)
+        untouched = G(Request, course=course)
+        other_course = G(Request)
+
+        response = self.post(ta, course, {
+            'action': 'solve',
+            'ids': [first.pk, second.pk, other_course.pk],
+        })
+
+        assert response.status_code == 200
+        assert sorted(response.data['ids']) == sorted([first.pk, second.pk])
+
+        first.refresh_from_db()
+        assert first.solved
+        assert first.who_solved == ta
+        assert first.when_solved is not None
+        untouched.refresh_from_db()
+        assert not untouched.solved
+        other_course.refresh_from_db()
+        assert not other_course.solved
+
+        enqueue_message.assert_called_once_with('requests_removed', {
+            'course': course.pk,
+            'ids': response.data['ids'],
+        })
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.enqueue_message')
+    def test_expire_all(self, enqueue_message):
+        from tas.models import Request
+
+        ta, course = self.setup_course()
+        open_request = G(Request, course=course)
+        G(Request, course=course, solved=True)
+        version = open_request.version
+
+        response = self.post(ta, course, {'action': 'expire', 'all': True})
+
+        assert response.data['ids'] == [open_request.pk]
+        open_request.refresh_from_db()
+        assert open_request.expired
+        assert open_request.expired_at is not None
+        assert open_request.version == version + 1
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.enqueue_message')
+    def test_nothing_to_resolve(self, enqueue_message):
+        ta, course = self.setup_course()
+
+        response = self.post(ta, course, {'action': 'cancel', 'all': True})
+
+        assert response.data['ids'] == []
+        assert not enqueue_message.called
+
+    @pytest.mark.django_db
+    def test_only_tas(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course)
+
+        response = self.post(student, course, {'action': 'solve',
+                                               'all': True})
+
+        assert response.status_code == 403
+        help_request.refresh_from_db()
+        assert not help_request.solved
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('data', [
+        {'action': 'solve'},
+        {'action': 'solve', 'all': True, 'ids': [1]},
+        {'action': 'explode', 'all': True},
+    ])
+    def test_invalid(self, data):
+        ta, course = self.setup_course()
+
+        assert self.post(ta, course, data).status_code == 400
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from django_dynamic_fixture import G
+from rest_framework.test import APIClient
+
+
+class TestRequestVersions(object):
+
+    def url(self, help_request):
+        return '/api/v3/school/courses/{}/requests/{}/'.format(
+            help_request.course_id, help_request.pk
+        )
+
+    def client_for(self, student):
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        return client
+
+    @pytest.mark.django_db
+    def test_saves_bump_version(self):
+        from tas.models import Request
+
+        help_request = G(Request)
+        version = help_request.version
+
+        help_request.save(update_fields=['checked_out'])
+        help_request.refresh_from_db()
+        assert help_request.version == version + 1
+
+    @pytest.mark.django_db
+    def test_etag(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course, requestor=student)
+
+        response = self.client_for(student).get(self.url(help_request))
+        assert response['ETag'] == '"{}"'.format(help_request.version)
+
+    @pytest.mark.django_db
+    def test_update_with_current_version(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course, requestor=student)
+
+        response = self.client_for(student).patch(
+            self.url(help_request),
+            {'question': 'new'},
+            format='json',
+            HTTP_IF_MATCH='"{}"'.format(help_request.version)
+        )
+
+        assert response.status_code == 200
+        assert response.data['version'] == help_request.version + 1
+        assert response['ETag'] == '"{}"'.format(help_request.version + 1)
+
+    @pytest.mark.django_db
+    def test_conflict_returns_current_state(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course, requestor=student)
+        stale_version = help_request.version
+
+        # A TA checks it out in the meantime
+        help_request.checked_out = True
+        help_request.save()
+
+        response = self.client_for(student).patch(
+            self.url(help_request),
+            {'question': 'new', 'version': stale_version},
+            format='json'
+        )
+
+        assert response.status_code == 409
+        data = json.loads(response.content.decode('utf-8'))
+        assert data['checked_out']
+        assert data['question'] == help_request.question
+        assert data['version'] == help_request.version
+
+        help_request.refresh_from_db()
+        assert help_request.question != 'new'
+
+    @pytest.mark.django_db
+    def test_no_version_means_last_write_wins(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course, requestor=student)
+        help_request.save()
+
+        response = self.client_for(student).patch(self.url(help_request),
+                                                  {'question': 'new'},
+                                                  format='json')
+
+        assert response.status_code == 200
+        assert response.data['question'] == 'new'
+
+    @pytest.mark.django_db
+    def test_invalid_version(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course, requestor=student)
+
+        response = self.client_for(student).patch(self.url(help_request),
+                                                  {'question': 'new'},
+                                                  format='json',
+                                                  HTTP_IF_MATCH='"nope"')
+
+        assert response.status_code == 400
@@ -76,6 +76,32 @@ class TestSchoolView(object):
 
         assert data['name'] == real_name
 
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('cached', (False, True))
+    def test_am_a_ta(self, settings, cached):
+        from tas.api.views import SchoolView
+        from tas.models import Course, Student, TA
+
+        settings.SCHOOL_CACHE_ENABLED = cached
+        student = G(Student)
+        other_student = G(Student, school=student.school)
+        taught = G(Course, school=student.school)
+        G(TA, student=student, course=taught, active=True)
+        inactive = G(Course, school=student.school)
+        G(TA, student=student, course=inactive, active=False)
+        G(Course, school=student.school)
+
+        def am_a_ta(user):
+            request = APIRequestFactory().get('/api/v3/school')
+            force_authenticate(request, user=user)
+            response = SchoolView.as_view()(request)
+            response.render()
+            courses = json.loads(response.content.decode('utf-8'))['courses']
+            return set(c['id'] for c in courses if c['am_a_ta'])
+
+        assert am_a_ta(student.user) == {taught.pk}
+        assert am_a_ta(other_student.user) == set()
+
     @pytest.mark.django_db
     @pytest.mark.parametrize(
         'method,status_code',
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+from django_dynamic_fixture import G
+from rest_framework.test import APIClient
+
+
+class TestTAView(object):
+
+    def list_tas(self, student, course):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/tas/'.format(course.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+
+        assert response.status_code == 200
+        return response.data, len(queries)
+
+    def add_tas(self, course, count):
+        from tas.models import Student, TA
+
+        tas = []
+        for _ in range(count):
+            ta = G(Student, school=course.school)
+            G(TA, student=ta, course=course, active=True)
+            tas.append(ta)
+        return tas
+
+    @pytest.mark.django_db
+    def test_on_duty(self):
+        from tas.models import Course, OfficeHour, Student, TA
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        on_duty, off_duty, finished = self.add_tas(course, 3)
+        G(TA, student=G(Student, school=student.school), course=course,
+          active=False)
+
+        # Being on duty for any course counts
+        G(OfficeHour, ta=on_duty, end_time=now() + timedelta(hours=1))
+        G(OfficeHour, ta=finished, course=course,
+          end_time=now() - timedelta(hours=1))
+
+        data, _ = self.list_tas(student, course)
+
+        on_duty_by_id = dict((ta['id'], ta['on_duty']) for ta in data)
+        assert on_duty_by_id == {
+            on_duty.pk: True,
+            off_duty.pk: False,
+            finished.pk: False,
+        }
+
+    @pytest.mark.django_db
+    def test_is_me(self):
+        from tas.models import Course
+
+        course = G(Course)
+        ta, other = self.add_tas(course, 2)
+
+        data, _ = self.list_tas(ta, course)
+
+        is_me_by_id = dict((row['id'], row['is_me']) for row in data)
+        assert is_me_by_id == {ta.pk: True, other.pk: False}
+
+    # Finding the course, its school and the TAs with whether they're on duty
+    LIST_QUERIES = 3
+
+    @pytest.mark.django_db
+    def test_query_count_does_not_grow(self):
+        from tas.models import Course, OfficeHour, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        small_course = G(Course, school=student.school)
+
+        self.add_tas(small_course, 1)
+        for ta in self.add_tas(course, 55)[::2]:
+            G(OfficeHour, ta=ta, course=course,
+              end_time=now() + timedelta(hours=1))
+
+        small_data, small_queries = self.list_tas(student, small_course)
+        data, queries = self.list_tas(student, course)
+
+        assert len(small_data) == 1
+        assert len(data) == 55
+        assert small_queries == self.LIST_QUERIES
+        assert queries == self.LIST_QUERIES
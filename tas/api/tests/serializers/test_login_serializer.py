@@ -124,3 +124,26 @@ class TestLoginSerializerPassword(object):
                 ls.validate_password(user.password)
 
                 assert login.called_once
+
+
+class TestLoginSerializerQueries(object):
+
+    @pytest.mark.django_db
+    def test_user_is_looked_up_once(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.api.serializers import LoginSerializer
+        from tas.models import Student
+
+        student = G(Student)
+        student.user.set_password('password')
+        student.user.save()
+
+        ls = LoginSerializer()
+        ls.initial_data = {'email': student.user.email.upper()}
+
+        with CaptureQueriesContext(connection) as queries:
+            ls.validate_email(student.user.email.upper())
+            assert ls.validate_password('password') == 'password'
+
+        assert len(queries) == 1
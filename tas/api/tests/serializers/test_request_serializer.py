@@ -95,3 +95,45 @@ class TestRequestSerializerCanTAFor(object):
         rs.context = {'request': None}
 
         assert not rs.get_can_ta_for(mock.Mock())
+
+
+class TestSerializeRequests(object):
+
+    @pytest.mark.django_db
+    def test_matches_request_serializer(self):
+        import json
+        from tas.api.serializers import RequestSerializer, serialize_requests
+        from tas.models import Student, Request, TA, Course
+
+        student = G(Student)
+        other_student = G(Student, school=student.school)
+        course = G(Course, school=student.school)
+        other_course = G(Course, school=student.school)
+        G(TA, student=student, course=course, active=True)
+        G(Request, requestor=student, course=course)
+        G(Request, requestor=other_student, course=course, checked_out=True)
+        G(Request, requestor=other_student, course=other_course)
+
+        web_request = mock.Mock()
+        web_request.user = student.user
+
+        queryset = Request.objects.order_by('pk')
+        expected = RequestSerializer(queryset, many=True,
+                                     context={'request': web_request}).data
+        rows = serialize_requests(queryset, web_request)
+
+        assert json.dumps(rows) == json.dumps(expected)
+        assert [row['owned_by_me'] for row in rows] == [True, False, False]
+        assert [row['can_ta_for'] for row in rows] == [True, True, False]
+
+    @pytest.mark.django_db
+    def test_without_request(self):
+        import json
+        from tas.api.serializers import RequestSerializer, serialize_requests
+        from tas.models import Request
+
+        G(Request)
+        queryset = Request.objects.all()
+
+        assert json.dumps(serialize_requests(queryset)) == \
+            json.dumps(RequestSerializer(queryset, many=True).data)
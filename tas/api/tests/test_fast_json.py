@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import io
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import mock
+import pytest
+import pytz
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from tas.api import fast_json
+from tas.api.fast_json import FastJSONParser, FastJSONRenderer
+
+BACKENDS = list(fast_json.get_backends())
+
+requires_orjson = pytest.mark.skipif('orjson' not in BACKENDS,
+                                     reason='orjson is not installed')
+
+without_backends = mock.patch.multiple('tas.api.fast_json', orjson=None,
+                                       simplejson=None)
+
+PAYLOAD = OrderedDict((
+    ('name', u'Tufts University \u2028 \u2029 caf\xe9'),
+    ('when', datetime(2016, 3, 1, 12, 30, 15, 123456, tzinfo=pytz.utc)),
+    ('when_naive', datetime(2016, 3, 1, 12, 30)),
+    ('day', date(2016, 3, 1)),
+    ('at', time(9, 15, 30, 500)),
+    ('score', Decimal('1.25')),
+    ('uuid', uuid.UUID(int=1)),
+    ('courses', [OrderedDict((('id', 1), ('count', 0), ('active', True),
+                              ('ratio', 0.5), ('missing', None)))]),
+    ('ids', (1, 2, 3)),
+    (5, 'integer key'),
+))
+
+
+class TestFastJSONRenderer(object):
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    def test_backend_matches_json_renderer(self, backend):
+        assert fast_json.dumps(PAYLOAD, backend) == \
+            JSONRenderer().render(PAYLOAD)
+
+    def test_matches_json_renderer(self):
+        assert FastJSONRenderer().render(PAYLOAD) == \
+            JSONRenderer().render(PAYLOAD)
+
+    def test_without_backends(self):
+        with without_backends:
+            assert not fast_json.is_available()
+            assert FastJSONRenderer().render(PAYLOAD) == \
+                JSONRenderer().render(PAYLOAD)
+
+    @requires_orjson
+    def test_falls_back_for_what_orjson_cant_encode(self):
+        data = {'big': 2 ** 70}
+        assert fast_json.dumps(data, 'orjson') is None
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_indent(self):
+        media_type = 'application/json; indent=2'
+        assert FastJSONRenderer().render(PAYLOAD, media_type) == \
+            JSONRenderer().render(PAYLOAD, media_type)
+
+    def test_none(self):
+        assert FastJSONRenderer().render(None) == b''
+
+
+class TestFastJSONParser(object):
+
+    def parse(self, parser, content):
+        return parser.parse(io.BytesIO(content), 'application/json',
+                            {'encoding': 'utf-8'})
+
+    @pytest.mark.parametrize('content', (
+        b'{"a": [1, 2.5, null, true], "b": "caf\\u00e9"}',
+        u'{"name": "caf\xe9"}'.encode('utf-8'),
+        b'[]',
+    ))
+    def test_matches_json_parser(self, content):
+        assert self.parse(FastJSONParser(), content) == \
+            self.parse(JSONParser(), content)
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    def test_backend_matches_json_parser(self, backend):
+        content = u'{"name": "caf\xe9", "ascii": "abc", "ids": [1]}'
+        parsed = fast_json.loads(content.encode('utf-8'), backend)
+        assert parsed == self.parse(JSONParser(), content.encode('utf-8'))
+        assert isinstance(parsed['ascii'], type(u''))
+
+    @pytest.mark.parametrize('content', (b'{"a": ', b''))
+    def test_invalid(self, content):
+        with pytest.raises(ParseError):
+            self.parse(FastJSONParser(), content)
+
+        with without_backends:
+            with pytest.raises(ParseError):
+                self.parse(FastJSONParser(), content)
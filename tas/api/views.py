@@ -1,9 +1,12 @@
+import json
 import logging
+from collections import OrderedDict
 from datetime import timedelta
 
 from django.contrib.auth import logout
 from django.conf import settings
 from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from django.contrib.sites.shortcuts import get_current_site
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -15,9 +18,13 @@ from rest_framework import (
     generics,
     permissions,
 )
-from rest_framework.exceptions import NotAuthenticated, ParseError
+from rest_framework.exceptions import (
+    NotAuthenticated,
+    ParseError,
+    PermissionDenied,
+)
 from rest_framework.response import Response
-from rest_framework.decorators import list_route
+from rest_framework.decorators import detail_route, list_route
 from djoser.views import PasswordResetView as DjoserPasswordResetView
 
 from registration.models import RegistrationProfile
@@ -25,10 +32,20 @@ from registration.models import RegistrationProfile
 from ws4redis.publisher import RedisPublisher
 
 
+from .. import live_queue, school_cache, wait_times
+from ..changes import get_changes, get_sequence
+from ..claims import claim_next_request
+from ..resolutions import resolve_requests
 from ..models import (School, Course, Request,
-                      Student, OfficeHour, CustomUser)
+                      Student, OfficeHour, CustomUser, TA)
 
-from ..utils import publish_message
+from ..headshots import (
+    spool_headshot,
+    discard_spooled_headshot,
+    InvalidHeadshotError,
+)
+from ..tasks import process_uploaded_headshot
+from ..outbox import enqueue_message
 
 from .serializers import (
     SchoolSerializer,
@@ -39,7 +56,8 @@ from .serializers import (
     RegistrationSerializer,
     LoginSerializer,
     TASerializer,
-
+    BulkResolutionSerializer,
+    serialize_requests,
 )
 
 from .permissions import (
@@ -51,6 +69,47 @@ from .permissions import (
 logger = logging.getLogger(__name__)
 
 
+def get_open_requests(course):
+    """The requests in the course that are still waiting for a TA."""
+    queryset = Request.objects.filter(course=course,
+                                      cancelled=False,
+                                      solved=False,
+                                      expired=False)
+
+    # If there's a TTL, filter by it.
+    if course.request_time_to_live > 0:
+        when_asked_cutoff = timedelta(hours=course.request_time_to_live)
+        queryset = queryset.filter(
+            when_asked__gte=(timezone.now() - when_asked_cutoff)
+        )
+
+    return queryset.select_related('requestor__user', 'course')
+
+
+def get_current_office_hours(course):
+    return OfficeHour.objects.filter(course=course,
+                                     end_time__gt=timezone.now())\
+        .select_related('ta__user')
+
+
+def get_tas(course_pk):
+    """The active TAs of the course, with whether they're on duty (for any
+    course) worked out in the same query.
+    """
+    on_duty = (
+        'EXISTS (SELECT 1 FROM {office_hour} '
+        'WHERE {office_hour}.ta_id = {student}.id '
+        'AND {office_hour}.end_time > %s)'
+    ).format(office_hour=OfficeHour._meta.db_table,
+             student=Student._meta.db_table)
+
+    return Student.objects.filter(ta__course=course_pk, ta__active=True)\
+        .select_related('user')\
+        .extra(select={'is_on_duty': on_duty},
+               select_params=(timezone.now(),))\
+        .order_by('user__last_name', 'user__first_name')
+
+
 class PasswordResetView(DjoserPasswordResetView):
     subject_template_name = 'registration/password_reset_subject.txt'
     plain_body_template_name = 'registration/password_reset_email.txt'
@@ -85,8 +144,17 @@ class SchoolView(generics.ListAPIView):
     queryset = School.objects.none()
 
     def get(self, request):
-        school = request.user.student.school
-        return Response(SchoolSerializer(school).data)
+        student = request.user.student
+        school = student.school
+
+        data = json.loads(school_cache.get_document(school),
+                          object_pairs_hook=OrderedDict)
+        ta_for = set(TA.objects.filter(student=student, active=True)
+                     .values_list('course_id', flat=True))
+        for course in data['courses']:
+            course['am_a_ta'] = course['id'] in ta_for
+
+        return Response(data)
 
 
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
@@ -106,6 +174,87 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
         user_school = self.request.user.student.school
         return qs.filter(school=user_school)
 
+    @detail_route(methods=['get'])
+    def changes(self, request, pk=None):
+        """What changed in the course's requests, office hours and TAs since
+        the sequence number in `?since=`.
+
+        Responds with a snapshot of everything instead if `since` is
+        missing or too far back; `snapshot` is true when that happens.
+        `tas` is null if the roster didn't change.
+        """
+        course = self.get_object()
+        context = {'request': request}
+
+        changes = None
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                raise ParseError('Invalid sequence number: {}'.format(since))
+            changes = get_changes(course.pk, since)
+
+        if changes is None:
+            # Read the sequence number first, so anything that changes while
+            # the snapshot is taken gets sent again next time.
+            sequence = get_sequence(course.pk)
+            return Response({
+                'sequence': sequence,
+                'snapshot': True,
+                'requests': serialize_requests(get_open_requests(course),
+                                               request),
+                'removed_requests': [],
+                'office_hours': OfficeHourSerializer(
+                    get_current_office_hours(course),
+                    many=True,
+                    context=context
+                ).data,
+                'removed_office_hours': [],
+                'tas': TASerializer(get_tas(course.pk), many=True,
+                                    context=context).data,
+            })
+
+        requests = get_open_requests(course)\
+            .filter(pk__in=changes.request_ids)
+        office_hours = get_current_office_hours(course)\
+            .filter(pk__in=changes.office_hour_ids)
+
+        tas = None
+        if changes.tas_changed:
+            tas = TASerializer(get_tas(course.pk), many=True,
+                               context=context).data
+
+        request_data = serialize_requests(requests, request)
+        office_hour_data = OfficeHourSerializer(office_hours, many=True,
+                                                context=context).data
+        return Response({
+            'sequence': changes.sequence,
+            'snapshot': False,
+            'requests': request_data,
+            'removed_requests': sorted(
+                changes.request_ids - set(row['id'] for row in request_data)
+            ),
+            'office_hours': office_hour_data,
+            'removed_office_hours': sorted(
+                changes.office_hour_ids -
+                set(row['id'] for row in office_hour_data)
+            ),
+            'tas': tas,
+        })
+
+
+class RequestConflict(Exception):
+    """Raised when a request was changed since the client last saw it."""
+
+    def __init__(self, help_request):
+        super(RequestConflict, self).__init__(help_request.pk)
+        self.help_request = help_request
+
+
+def get_etag(help_request):
+    return '"{}"'.format(help_request.version)
+
 
 class RequestViewSet(CreateModelWithRequestMixin,
                      mixins.UpdateModelMixin,
@@ -126,6 +275,58 @@ class RequestViewSet(CreateModelWithRequestMixin,
         requestor = self.request.user.student
         serializer.save(course=course, requestor=requestor)
 
+    def get_expected_version(self):
+        """The version the client last saw, from If-Match or the body.
+        None if the client didn't say, in which case the last write wins.
+        """
+        if_match = self.request.META.get('HTTP_IF_MATCH', '').strip()
+        if if_match == '*':
+            return None
+
+        version = if_match.replace('W/', '', 1).strip('"') or \
+            self.request.data.get('version')
+        if version is None:
+            return None
+
+        try:
+            return int(version)
+        except (TypeError, ValueError):
+            raise ParseError('Invalid version: {}'.format(version))
+
+    def perform_update(self, serializer):
+        expected_version = self.get_expected_version()
+
+        with transaction.atomic():
+            # Lock the row so nobody can slip in between the version check
+            # and the save.
+            help_request = Request.objects.select_for_update()\
+                .get(pk=serializer.instance.pk)
+            if (expected_version is not None and
+                    help_request.version != expected_version):
+                raise RequestConflict(help_request)
+
+            serializer.instance = help_request
+            self.save_update(serializer)
+
+    def save_update(self, serializer):
+        help_request = serializer.instance
+        student = self.request.user.student
+        data = serializer.validated_data
+
+        extra = {}
+        if data.get('checked_out') and not help_request.checked_out:
+            extra['checked_out_by'] = student
+
+        solving = data.get('solved') and not help_request.solved
+        if solving:
+            extra.update(when_solved=timezone.now(), who_solved=student)
+
+        help_request = serializer.save(**extra)
+        if solving:
+            transaction.on_commit(
+                lambda: wait_times.record_solved(help_request)
+            )
+
     def get_queryset(self):
         queryset = super(RequestViewSet, self).get_queryset()
         queryset = queryset.filter(cancelled=False, solved=False)
@@ -134,7 +335,12 @@ class RequestViewSet(CreateModelWithRequestMixin,
 
     def list(self, request, course_pk=None):
         course = Course.objects.get(pk=course_pk)
-        queryset = self.get_queryset().filter(course=course_pk)
+
+        open_requests = live_queue.get_open_requests(course)
+        if open_requests is not None:
+            return Response(self.personalize(course, open_requests))
+
+        queryset = self.get_queryset().filter(course=course_pk, expired=False)
 
         # If there's a TTL, filter by it.
         if course.request_time_to_live > 0:
@@ -143,8 +349,117 @@ class RequestViewSet(CreateModelWithRequestMixin,
                 when_asked__gte=(timezone.now() - when_asked_cutoff)
             )
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(serialize_requests(queryset, request))
+
+    @list_route(methods=['post'])
+    @transaction.atomic
+    def claim(self, request, course_pk=None):
+        """Check out the oldest open request nobody is working on yet.
+        Responds with 204 if there isn't one.
+        """
+        course = get_object_or_404(Course, pk=course_pk)
+        ta = request.user.student
+        if not TA.objects.filter(student=ta, course=course,
+                                 active=True).exists():
+            raise PermissionDenied
+
+        help_request = claim_next_request(course, ta)
+        if help_request is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        enqueue_message('request_updated', {
+            'course': course.pk,
+            'id': help_request.pk,
+        })
+
+        return Response(self.get_serializer(help_request).data)
+
+    @list_route(methods=['post'])
+    @transaction.atomic
+    def bulk(self, request, course_pk=None):
+        """Solve, cancel or expire a list of requests, or every open one.
+
+        Takes `{"action": "solve", "ids": [1, 2]}` or
+        `{"action": "expire", "all": true}` and responds with the ids of the
+        requests that were closed.
+        """
+        course = get_object_or_404(Course, pk=course_pk)
+        ta = request.user.student
+        if not TA.objects.filter(student=ta, course=course,
+                                 active=True).exists():
+            raise PermissionDenied
+
+        serializer = BulkResolutionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        resolved_ids = resolve_requests(course, ta,
+                                        serializer.validated_data['action'],
+                                        serializer.validated_data.get('ids'))
+        if resolved_ids:
+            enqueue_message('requests_removed', {
+                'course': course.pk,
+                'ids': resolved_ids,
+            })
+
+        return Response({'ids': resolved_ids})
+
+    @list_route(methods=['get'])
+    def position(self, request, course_pk=None):
+        """Where the user's oldest open request in the course is in line, and
+        about how many seconds it'll be until a TA gets to it.
+        """
+        course = get_object_or_404(Course, pk=course_pk)
+        queryset = get_open_requests(course)
+
+        help_request = queryset.filter(requestor=request.user.student)\
+            .order_by('when_asked', 'pk').first()
+        on_duty_tas = OfficeHour.objects.filter(course=course,
+                                                end_time__gt=timezone.now())\
+            .values('ta').distinct().count()
+        service_time = wait_times.get_service_time(course.pk)
+
+        ahead = queue_length = None
+        if help_request is not None:
+            position = live_queue.get_position(course, help_request.pk)
+            if position is not None and position[0] is not None:
+                ahead, queue_length = position
+            else:
+                ahead = queryset.filter(
+                    when_asked__lt=help_request.when_asked
+                ).count()
+
+        if queue_length is None:
+            queue_length = live_queue.count_open_requests(course)
+        if queue_length is None:
+            queue_length = queryset.count()
+
+        estimated_wait = None
+        if ahead is not None:
+            estimated_wait = wait_times.estimate_wait(ahead, service_time,
+                                                      on_duty_tas)
+
+        return Response({
+            'id': help_request.pk if help_request is not None else None,
+            'position': ahead + 1 if ahead is not None else None,
+            'queue_length': queue_length,
+            'on_duty_tas': on_duty_tas,
+            'service_time': service_time,
+            'estimated_wait': estimated_wait,
+        })
+
+    def personalize(self, course, open_requests):
+        """Fill in the fields of the live queue's rows that depend on who is
+        looking at them.
+        """
+        student = self.request.user.student
+        can_ta_for = TA.objects.filter(student=student,
+                                       course=course,
+                                       active=True).exists()
+        for row in open_requests:
+            row['owned_by_me'] = row['requestor']['id'] == student.pk
+            row['can_ta_for'] = can_ta_for
+
+        return open_requests
 
     def retrieve(self, request, pk=None, course_pk=None):
         help_request = get_object_or_404(self.get_queryset(),
@@ -152,23 +467,36 @@ class RequestViewSet(CreateModelWithRequestMixin,
                                          course=course_pk)
 
         serializer = self.get_serializer(help_request)
-        return Response(serializer.data)
+        return Response(serializer.data,
+                        headers={'ETag': get_etag(help_request)})
 
+    @transaction.atomic
     def create(self, request, course_pk=None):
         course = get_object_or_404(Course, pk=course_pk)
         request.data['course'] = course
 
         created = super(RequestViewSet, self).create(request, course_pk)
 
-        publish_message('request_created', {
+        enqueue_message('request_created', {
             'course': course.pk,
             'id': created.data['id']
         })
 
         return created
 
+    @transaction.atomic
     def update(self, *args, **kwargs):
-        updated = super(RequestViewSet, self).update(*args, **kwargs)
+        try:
+            updated = super(RequestViewSet, self).update(*args, **kwargs)
+        except RequestConflict as conflict:
+            # Send back what the request looks like now, so the client
+            # doesn't have to fetch it again.
+            current = conflict.help_request
+            return Response(self.get_serializer(current).data,
+                            status=status.HTTP_409_CONFLICT,
+                            headers={'ETag': get_etag(current)})
+
+        updated['ETag'] = '"{}"'.format(updated.data['version'])
 
         course_pk = kwargs.get('course_pk')
         try:
@@ -178,10 +506,11 @@ class RequestViewSet(CreateModelWithRequestMixin,
             raise ParseError
 
         packet_type = 'request_updated'
-        if updated.data['cancelled'] or updated.data['solved']:
+        if (updated.data['cancelled'] or updated.data['solved'] or
+                updated.data['expired']):
             packet_type = 'request_removed'
 
-        publish_message(packet_type, {
+        enqueue_message(packet_type, {
             'course': course_pk,
             'id': updated.data['id'],
         })
@@ -239,6 +568,7 @@ class OfficeHourViewSet(CreateModelWithRequestMixin,
 
         return Response(serializer.data)
 
+    @transaction.atomic
     def create(self, request, course_pk=None):
         school = request.user.student.school
 
@@ -246,13 +576,14 @@ class OfficeHourViewSet(CreateModelWithRequestMixin,
         request.data['course'] = course
 
         created = super(OfficeHourViewSet, self).create(request, course_pk)
-        publish_message('on_duty', {
-            'course': course_pk,
+        enqueue_message('on_duty', {
+            'course': course.pk,
             'id': created.data['id'],
         })
 
         return created
 
+    @transaction.atomic
     def destroy(self, request, pk=None, course_pk=None, **kwargs):
         office_hour = get_object_or_404(OfficeHour.objects.all(), pk=pk)
 
@@ -261,8 +592,8 @@ class OfficeHourViewSet(CreateModelWithRequestMixin,
             office_hour.end_time = now
             office_hour.save()
 
-        publish_message('off_duty', {
-            'course': course_pk,
+        enqueue_message('off_duty', {
+            'course': office_hour.course_id,
             'id': office_hour.pk,
         })
 
@@ -275,17 +606,13 @@ class TAViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (OwnSchoolPermission,)
 
     def list(self, request, course_pk=None):
-        queryset = Course.objects.get(pk=course_pk).tas.filter(ta__active=True)
-        queryset = queryset.order_by('ta__active',
-                                     'user__last_name',
-                                     'user__first_name')
+        queryset = get_tas(course_pk)
 
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None, course_pk=None):
-        queryset = Course.objects.get(pk=course_pk).tas.filter(ta__active=True)
-        ta = get_object_or_404(queryset, pk=pk)
+        ta = get_object_or_404(get_tas(course_pk), pk=pk)
 
         serializer = self.get_serializer(ta)
         return Response(serializer.data)
@@ -357,9 +684,26 @@ class UserViewSet(viewsets.ViewSet):
                            photo, request.user.pk)
             raise ParseError
 
-        request.user.student.headshot = photo
-        request.user.student.save()
-        return Response(self.get_serializer(request.user).data)
+        try:
+            spooled_path = spool_headshot(photo)
+        except InvalidHeadshotError:
+            logger.warning('Attempt to upload a non-image: %s user:%s',
+                           photo, request.user.pk)
+            raise ParseError
+
+        # Resizing happens in a worker. Until it's done the user keeps their
+        # current headshot, which is what we respond with.
+        try:
+            process_uploaded_headshot.delay(request.user.student.pk,
+                                            spooled_path)
+        except Exception:
+            # Nothing will ever process the spooled file
+            logger.exception('Failed to queue a headshot. user:%s',
+                             request.user.pk)
+            discard_spooled_headshot(spooled_path)
+            raise
+        return Response(self.get_serializer(request.user).data,
+                        status=status.HTTP_202_ACCEPTED)
 
     @list_route(methods=['post'])
     def register(self, request):
@@ -0,0 +1,131 @@
+import logging
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import redis
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .utils import get_redis_connection, redis_key
+
+logger = logging.getLogger(__name__)
+
+
+def get_user_cache_key(user_pk):
+    return redis_key('user', user_pk)
+
+
+def invalidate_cached_users(user_pks):
+    """Drop the cached copies of the given users so that the next request
+    loads them from the database.
+    """
+    keys = [get_user_cache_key(pk) for pk in user_pks]
+    if not keys:
+        return
+
+    try:
+        get_redis_connection().delete(*keys)
+    except redis.RedisError:
+        logger.exception('Failed to invalidate cached users. user_pks=%s',
+                         user_pks)
+
+
+class StudentProfileBackend(ModelBackend):
+    """A ModelBackend that loads the user together with their Student profile
+    and School in a single query, and keeps the result in redis.
+
+    Nearly every API view walks `request.user.student.school`, so having both
+    relations loaded up front saves a couple of queries per request. The
+    cached copy is dropped whenever the user, their profile or their school
+    is saved (see the receivers in `tas.models`).
+    """
+
+    @staticmethod
+    def get_user_by_email(email):
+        """Look up a user by their email address, ignoring case. Returns None
+        if there isn't one.
+        """
+        user_model = get_user_model()
+        users = user_model._default_manager.select_related('student__school')
+        try:
+            return users.get(email__iexact=email)
+        except user_model.DoesNotExist:
+            return None
+        except user_model.MultipleObjectsReturned:
+            return users.filter(email=email).first()
+
+    def authenticate(self, email=None, password=None, user=None, **kwargs):
+        """Authenticate by email address, ignoring case.
+
+        Callers that have already looked up the user (see LoginSerializer)
+        can pass it as `user` to avoid looking it up again.
+        """
+        if password is None:
+            return None
+
+        if user is None:
+            email = email or kwargs.get('username')
+            if email is None:
+                return None
+            user = self.get_user_by_email(email)
+
+        if user is None:
+            # Run the hasher anyway so that response times don't reveal
+            # which email addresses have accounts.
+            get_user_model()().set_password(password)
+            return None
+
+        if user.check_password(password):
+            return user
+
+        return None
+
+    def get_user(self, user_id):
+        user = self._get_cached_user(user_id)
+        if user is not None:
+            return user
+
+        user_model = get_user_model()
+        try:
+            user = user_model._default_manager\
+                .select_related('student__school')\
+                .get(pk=user_id)
+        except user_model.DoesNotExist:
+            return None
+
+        self._cache_user(user)
+        return user
+
+    def _get_cached_user(self, user_id):
+        try:
+            cached = get_redis_connection().get(get_user_cache_key(user_id))
+        except redis.RedisError:
+            logger.exception('Failed to read cached user. user_id=%s',
+                             user_id)
+            return None
+
+        if cached is None:
+            return None
+
+        try:
+            return pickle.loads(cached)
+        except Exception:
+            logger.exception('Failed to unpickle cached user. user_id=%s',
+                             user_id)
+            return None
+
+    def _cache_user(self, user):
+        timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 60 * 60)
+        try:
+            get_redis_connection().setex(
+                get_user_cache_key(user.pk),
+                timeout,
+                pickle.dumps(user, pickle.HIGHEST_PROTOCOL)
+            )
+        except redis.RedisError:
+            logger.exception('Failed to cache user. user_id=%s', user.pk)
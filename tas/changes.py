@@ -0,0 +1,71 @@
+"""Catching clients up on what happened to a course while they weren't
+listening.
+
+Every message about a course that goes through `tas.outbox` is numbered
+with the course's next sequence number, which is published as `seq` in the
+message's data. The numbers of a course have no gaps and are published in
+order, though a message can be published more than once. So a client that
+knows the last number it applied (starting from the course's `sequence`)
+can tell, for every message:
+
+- `seq` is at most the last number: it's a repeat and can be ignored.
+- `seq` is the last number plus one: apply it.
+- `seq` is any higher: messages were missed. Ask `get_changes` (through
+  the course's `changes/?since=` endpoint) for what changed instead.
+"""
+import json
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Course, OutboxEvent
+
+Changes = namedtuple('Changes', ('sequence', 'request_ids',
+                                 'office_hour_ids', 'tas_changed'))
+
+REQUEST_MESSAGES = ('request_created', 'request_updated', 'request_removed',
+                    'requests_removed')
+OFFICE_HOUR_MESSAGES = ('on_duty', 'off_duty')
+TA_MESSAGES = ('tas_changed',)
+
+
+def get_sequence(course_pk):
+    return Course.objects.values_list('sequence', flat=True).get(pk=course_pk)
+
+
+def get_changes(course_pk, since):
+    """What changed in the course after sequence number `since`.
+
+    Returns None when the client should start over from a snapshot instead:
+    when `since` is from the future, when it's more than
+    `settings.DELTA_SYNC_MAX_CHANGES` changes ago, or when some of the
+    changes have already been pruned from the outbox.
+    """
+    sequence = get_sequence(course_pk)
+    max_changes = getattr(settings, 'DELTA_SYNC_MAX_CHANGES', 500)
+    if since > sequence or sequence - since > max_changes:
+        return None
+
+    events = OutboxEvent.objects.filter(course_pk=course_pk,
+                                        sequence__gt=since,
+                                        sequence__lte=sequence)\
+        .values_list('message_type', 'data')
+    events = list(events)
+    if len(events) != sequence - since:
+        return None
+
+    request_ids = set()
+    office_hour_ids = set()
+    tas_changed = False
+    for message_type, data in events:
+        data = json.loads(data) if data else {}
+        if message_type in REQUEST_MESSAGES:
+            request_ids.update(data.get('ids', [data.get('id')]))
+        elif message_type in OFFICE_HOUR_MESSAGES:
+            office_hour_ids.add(data.get('id'))
+        elif message_type in TA_MESSAGES:
+            tas_changed = True
+
+    request_ids.discard(None)
+    office_hour_ids.discard(None)
+    return Changes(sequence, request_ids, office_hour_ids, tas_changed)
@@ -0,0 +1,56 @@
+"""Handing out requests to TAs.
+
+When several TAs ask for the next request at once, each one has to get a
+different student without waiting on the others. The oldest claimable row
+is locked with `FOR UPDATE SKIP LOCKED`, so a TA whose candidate is already
+being claimed simply moves on to the next one instead of blocking or
+claiming it twice. This needs postgres 9.5 or later.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import Request
+
+CLAIM_NEXT_SQL = '''
+    SELECT * FROM {request}
+    WHERE course_id = %s
+      AND NOT cancelled
+      AND NOT solved
+      AND NOT expired
+      AND NOT checked_out
+      {ttl_filter}
+    ORDER BY when_asked, id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+'''
+
+
+def claim_next_request(course, ta):
+    """Check out the oldest open request in `course` that nobody is working
+    on for `ta`, the student who is TAing. Returns None if there isn't one.
+    """
+    params = [course.pk]
+    ttl_filter = ''
+
+    # If there's a TTL, filter by it.
+    if course.request_time_to_live > 0:
+        when_asked_cutoff = timedelta(hours=course.request_time_to_live)
+        params.append(now() - when_asked_cutoff)
+        ttl_filter = 'AND when_asked >= %s'
+
+    sql = CLAIM_NEXT_SQL.format(request=Request._meta.db_table,
+                                ttl_filter=ttl_filter)
+
+    with transaction.atomic():
+        claimed = list(Request.objects.raw(sql, params))
+        if not claimed:
+            return None
+
+        help_request = claimed[0]
+        help_request.checked_out = True
+        help_request.checked_out_by = ta
+        help_request.save(update_fields=['checked_out', 'checked_out_by'])
+
+    return help_request
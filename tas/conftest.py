@@ -0,0 +1,37 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_school_domain_index():
+    """The domain index outlives the database rollback between tests, so
+    start every test with an empty one.
+    """
+    from tas.domains import school_domain_index
+    school_domain_index.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def isolated_redis_keys(settings):
+    """Tests run in parallel against the same redis server, each with their
+    own database. Give every test its own key space so cached rows from one
+    test's database never show up in another.
+    """
+    settings.REDIS_KEY_PREFIX = 'test:{}'.format(uuid.uuid4().hex)
+
+
+@pytest.fixture(autouse=True)
+def disable_live_queue(settings):
+    """The live queue is updated when transactions commit, which never
+    happens inside a test. Tests of the live queue turn it back on.
+    """
+    settings.LIVE_QUEUE_ENABLED = False
+
+
+@pytest.fixture(autouse=True)
+def disable_school_cache(settings):
+    """Like the live queue, the school cache is invalidated when
+    transactions commit. Tests of the cache turn it back on.
+    """
+    settings.SCHOOL_CACHE_ENABLED = False
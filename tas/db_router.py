@@ -0,0 +1,105 @@
+"""Send reads to a streaming replica of the database.
+
+When `settings.REPLICA_DATABASE` names a database, `ReplicaRouter` sends
+every read to it, except:
+
+- inside a transaction on the primary, so a transaction sees its own
+  writes and row locks are taken where they count,
+- while the current thread is pinned to the primary, by `use_primary` or
+  `ReplicaStickinessMiddleware`.
+
+The middleware pins requests that can write (anything but GET, HEAD and
+OPTIONS) and, for `settings.REPLICA_STICKY_SECONDS` afterwards, every request
+in the same session, so people see their own changes even while the
+replica is behind. Writes always go to the primary.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_DATABASE = DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Where in the session the time until which the primary is used is kept
+STICKY_SESSION_KEY = '_use_primary_until'
+
+_local = threading.local()
+
+
+def get_replica():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+def is_pinned():
+    return getattr(_local, 'pinned', False)
+
+
+def set_pinned(pinned):
+    _local.pinned = pinned
+
+
+class use_primary(object):
+    """Context manager that sends every read in its block to the primary."""
+
+    def __enter__(self):
+        self.was_pinned = is_pinned()
+        set_pinned(True)
+        return self
+
+    def __exit__(self, *exc_info):
+        set_pinned(self.was_pinned)
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        if (replica is None or is_pinned() or
+                connections[PRIMARY_DATABASE].in_atomic_block):
+            return PRIMARY_DATABASE
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = (PRIMARY_DATABASE, get_replica())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        if db == get_replica():
+            return False
+        return None
+
+
+class ReplicaStickinessMiddleware(object):
+    """Pin requests to the primary after their session has written.
+
+    This has to come after SessionMiddleware.
+    """
+
+    def process_request(self, request):
+        session = getattr(request, 'session', None)
+        use_primary_until = 0
+        if session is not None:
+            use_primary_until = session.get(STICKY_SESSION_KEY, 0)
+
+        set_pinned(request.method not in SAFE_METHODS or
+                   use_primary_until > time.time())
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if (get_replica() is not None and session is not None and
+                request.method not in SAFE_METHODS and
+                response.status_code < 400):
+            sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            session[STICKY_SESSION_KEY] = time.time() + sticky_seconds
+
+        set_pinned(False)
+        return response
@@ -0,0 +1,89 @@
+"""A process-local index from email domains to schools.
+
+Registration and profile creation both need to know which school an email
+address belongs to. Rather than asking the database every time, the
+SchoolEmailDomain table is loaded into a trie keyed on the domain's labels
+from right to left, so the most specific registered domain wins:
+with only `tufts.edu` registered, `cs.tufts.edu` resolves to Tufts, but a
+separately registered `cs.tufts.edu` takes precedence.
+
+The index is thrown away whenever a SchoolEmailDomain is saved or deleted in
+this process (see the receivers in `tas.models`), and rebuilt after
+`settings.SCHOOL_DOMAIN_INDEX_TTL` seconds so changes made by other processes
+are picked up too.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Key for the school id stored at the node for a registered domain. Domain
+# labels can never be empty, so this can't collide with one.
+_SCHOOL = ''
+
+
+def _labels(domain):
+    return reversed(domain.strip().lower().rstrip('.').split('.'))
+
+
+class SchoolDomainIndex(object):
+
+    def __init__(self):
+        self._trie = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._trie = None
+
+    def _build(self):
+        from .models import SchoolEmailDomain
+
+        trie = {}
+        domains = SchoolEmailDomain.objects.values_list('domain', 'school_id')
+        for domain, school_id in domains:
+            node = trie
+            for label in _labels(domain):
+                node = node.setdefault(label, {})
+            node[_SCHOOL] = school_id
+
+        logger.debug('Built school domain index. domains=%s', len(domains))
+        return trie
+
+    def _get_trie(self):
+        ttl = getattr(settings, 'SCHOOL_DOMAIN_INDEX_TTL', 60)
+        trie = self._trie
+        if trie is None or time.time() - self._built_at > ttl:
+            with self._lock:
+                trie = self._trie
+                if trie is None or time.time() - self._built_at > ttl:
+                    trie = self._build()
+                    self._trie = trie
+                    self._built_at = time.time()
+
+        return trie
+
+    def resolve(self, domain):
+        """Returns the pk of the school `domain` belongs to, or None."""
+        node = self._get_trie()
+        school_id = None
+        for label in _labels(domain):
+            node = node.get(label)
+            if node is None:
+                break
+            school_id = node.get(_SCHOOL, school_id)
+
+        return school_id
+
+
+school_domain_index = SchoolDomainIndex()
+
+
+def get_school_id_for_email(email):
+    """Returns the pk of the school an email address belongs to, or None if
+    no school has registered its domain.
+    """
+    return school_domain_index.resolve(email.split('@')[-1])
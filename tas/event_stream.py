@@ -0,0 +1,247 @@
+"""Server-Sent Events for read-only displays.
+
+Hallway monitors and dashboards only ever listen, so instead of a WebSocket
+each gets an `text/event-stream` response with the same messages that are
+published to the WebSocket clients (see `tas.utils.publish_message`) for
+one course. Every message is sent with its sequence number as the event
+id, so displays can follow the contract in `tas.changes`.
+
+Each process keeps a single subscription to the broadcast channel, in
+`EventHub`, and hands every message to the queues of the streams that are
+watching its course. Streams that fall too far behind are closed; browsers
+reconnect on their own.
+
+The hub also feeds the WebSockets (see `tas.websocket_server`), which
+listen to every message on the channel rather than a single course. Both
+are served by the gevent process (see `HalliganAvailability.wsgi_websocket`),
+where every open connection costs a greenlet rather than a thread. When
+threads have been patched by gevent, the hub uses gevent's queues and select.
+"""
+import json
+import logging
+import threading
+import time
+
+import redis
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, StreamingHttpResponse
+
+from .utils import get_redis_connection
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+try:
+    from gevent import monkey as gevent_monkey
+except ImportError:
+    gevent_monkey = None
+
+logger = logging.getLogger(__name__)
+
+# How often a comment is sent down idle streams, so proxies don't time them
+# out, in seconds
+KEEPALIVE_INTERVAL = 15
+
+# How many messages a stream can be behind before it's closed
+MAX_BACKLOG = 100
+
+# How long to wait before subscribing again after losing redis, in seconds
+RECONNECT_DELAY = 1
+
+# The ws4redis facility the hub listens to
+FACILITY = 'ta'
+
+# What to register for to get every message, unformatted
+ALL_COURSES = None
+
+
+def _is_green():
+    return (gevent_monkey is not None and
+            gevent_monkey.is_module_patched('threading'))
+
+
+def _make_queue():
+    if _is_green():
+        import gevent.queue
+        return gevent.queue.Queue(MAX_BACKLOG)
+    return queue.Queue(MAX_BACKLOG)
+
+
+def _wait_readable(sock, timeout):
+    if _is_green():
+        import gevent.select as select_module
+    else:
+        import select as select_module
+    readable, _, _ = select_module.select([sock], [], [], timeout)
+    return bool(readable)
+
+
+def get_broadcast_channel():
+    """The channel ws4redis broadcasts the 'ta' facility on."""
+    prefix = getattr(settings, 'WS4REDIS_PREFIX', None)
+    prefix = '{}:'.format(prefix) if prefix else ''
+    return '{}broadcast:{}'.format(prefix, FACILITY)
+
+
+def format_event(packet):
+    """Format a published packet as a server-sent event."""
+    data = packet.get('data') or {}
+    lines = []
+    if isinstance(data, dict) and data.get('seq') is not None:
+        lines.append('id: {}'.format(data['seq']))
+    lines.append('event: {}'.format(packet['type']))
+    lines.append('data: {}'.format(json.dumps(data)))
+    return '\n'.join(lines) + '\n\n'
+
+
+class Stream(object):
+    """A client's backlog of messages."""
+
+    def __init__(self):
+        self.events = _make_queue()
+        self.closed = False
+
+    def put(self, event):
+        """Raises queue.Full if the client has fallen too far behind."""
+        self.events.put_nowait(event)
+
+
+class EventHub(object):
+    """Fans the broadcast channel out to the streams of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.subscriber = None
+
+    def _ensure_subscribed(self):
+        with self.lock:
+            if self.subscriber is None:
+                self.subscriber = threading.Thread(target=self._subscribe,
+                                                   name='event-hub')
+                self.subscriber.daemon = True
+                self.subscriber.start()
+
+    def _subscribe(self):
+        while True:
+            try:
+                pubsub = get_redis_connection().pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(get_broadcast_channel())
+                while True:
+                    if _wait_readable(pubsub.connection._sock,
+                                      KEEPALIVE_INTERVAL):
+                        self._read_messages(pubsub)
+            except redis.RedisError:
+                logger.exception('Lost the event stream subscription')
+                time.sleep(RECONNECT_DELAY)
+
+    def _read_messages(self, pubsub):
+        """Dispatch everything that has arrived on `pubsub`.
+
+        redis-py reads as much as the socket has, so after a burst of
+        messages the rest of the burst waits in its buffer while the socket
+        looks idle. Keep reading until both are empty.
+        """
+        while pubsub.connection.can_read():
+            message = pubsub.get_message()
+            if message is not None:
+                self.dispatch(message['data'])
+
+    def register(self, course_pk, stream=None):
+        """Start collecting the events of `course_pk`, or every message on
+        the channel as it was published for ALL_COURSES, in `stream`.
+        """
+        self._ensure_subscribed()
+        if stream is None:
+            stream = Stream()
+        with self.lock:
+            self.streams.setdefault(course_pk, set()).add(stream)
+        return stream
+
+    def unregister(self, course_pk, stream):
+        with self.lock:
+            streams = self.streams.get(course_pk, set())
+            streams.discard(stream)
+            if not streams:
+                self.streams.pop(course_pk, None)
+
+    def dispatch(self, raw_message):
+        """Hand a published packet to every stream watching its course."""
+        if isinstance(raw_message, bytes):
+            raw_message = raw_message.decode('utf-8')
+
+        with self.lock:
+            listeners = list(self.streams.get(ALL_COURSES, ()))
+        self._deliver(ALL_COURSES, listeners, raw_message)
+
+        try:
+            packet = json.loads(raw_message)
+            course_pk = int(packet['data']['course'])
+        except (ValueError, KeyError, TypeError):
+            # Heartbeats and messages that aren't about a course
+            return
+
+        with self.lock:
+            streams = list(self.streams.get(course_pk, ()))
+        if streams:
+            self._deliver(course_pk, streams, format_event(packet))
+
+    def _deliver(self, course_pk, streams, event):
+        for stream in streams:
+            try:
+                stream.put(event)
+            except queue.Full:
+                logger.warning('Closing a stream that fell behind. '
+                               'course=%s', course_pk)
+                stream.closed = True
+                self.unregister(course_pk, stream)
+
+    def stream(self, course_pk):
+        """Yields the events for `course_pk` until the client goes away or
+        falls too far behind.
+        """
+        stream = self.register(course_pk)
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield 'retry: 1000\n\n'
+            while not stream.closed:
+                try:
+                    # gevent's queues raise the standard library's Empty
+                    yield stream.events.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            self.unregister(course_pk, stream)
+
+
+hub = EventHub()
+
+
+def course_events(request, course_pk):
+    """Stream the events for a course. Like the WebSocket, this is open to
+    anyone; the events only say what changed, not what it changed to.
+    """
+    from .models import Course
+
+    if not Course.objects.filter(pk=course_pk).exists():
+        raise Http404
+
+    # request_finished only closes the database connections once the stream
+    # ends, hours from now, and every greenlet has its own. Streams don't
+    # need them, so give them back now, unless they're in a transaction.
+    for connection in connections.all():
+        if not connection.in_atomic_block:
+            connection.close()
+
+    response = StreamingHttpResponse(hub.stream(int(course_pk)),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
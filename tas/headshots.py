@@ -0,0 +1,127 @@
+"""Out-of-band processing for uploaded headshots.
+
+Uploads are spooled to disk by the web process and resized into every size
+in `settings.HEADSHOT_SIZES` by a celery worker. Resized images are named
+after the hash of the uploaded file, so uploading the same photo twice
+reuses the images that already exist.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from imagekit.processors import ResizeToFit
+
+logger = logging.getLogger(__name__)
+
+HEADSHOT_DIRECTORY = 'headshots'
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r'^{}/[0-9a-f]{{40}}/'.format(HEADSHOT_DIRECTORY)
+)
+
+# The size stored on Student.headshot
+DEFAULT_HEADSHOT_SIZE = 'thumbnail'
+
+
+class InvalidHeadshotError(ValueError):
+    pass
+
+
+def get_spool_directory():
+    spool_directory = settings.HEADSHOT_SPOOL_DIR
+    if not os.path.isdir(spool_directory):
+        os.makedirs(spool_directory)
+
+    return spool_directory
+
+
+def spool_headshot(uploaded_file):
+    """Copy an uploaded file to the spool directory and return its path.
+
+    The file is only sniffed to make sure it's an image; decoding and
+    resizing are left to `process_headshot`.
+
+    :raises: InvalidHeadshotError
+    """
+    descriptor, path = tempfile.mkstemp(dir=get_spool_directory(),
+                                        suffix='.upload')
+    with os.fdopen(descriptor, 'wb') as spooled:
+        for chunk in uploaded_file.chunks():
+            spooled.write(chunk)
+
+    try:
+        Image.open(path)
+    except IOError:
+        os.remove(path)
+        raise InvalidHeadshotError(uploaded_file.name)
+
+    return path
+
+
+def discard_spooled_headshot(path):
+    """Remove a spooled upload that won't be processed."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def hash_file(fileobj, chunk_size=64 * 1024):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def get_headshot_name(content_hash, size=DEFAULT_HEADSHOT_SIZE):
+    return '{}/{}/{}.jpg'.format(HEADSHOT_DIRECTORY, content_hash, size)
+
+
+def is_content_addressed(name):
+    """Whether a stored file is named after its content, meaning the file
+    behind the name never changes and can be cached forever.
+    """
+    return CONTENT_ADDRESSED_NAME.match(name) is not None
+
+
+def process_headshot(path):
+    """Resize the spooled image at `path` into every headshot size.
+
+    Sizes that already exist for an identical upload are not regenerated.
+
+    :returns: The storage name of the default size
+    """
+    with open(path, 'rb') as spooled:
+        content_hash = hash_file(spooled)
+
+    image = None
+    for size, (width, height) in settings.HEADSHOT_SIZES.items():
+        name = get_headshot_name(content_hash, size)
+        if default_storage.exists(name):
+            continue
+
+        if image is None:
+            image = Image.open(path)
+            image.load()
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+        resized = ResizeToFit(width=width, height=height).process(image)
+        # ResizeToFit hands back RGBA, which can't be saved as a JPEG
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        output = BytesIO()
+        resized.save(output, 'JPEG', quality=90)
+        default_storage.save(name, ContentFile(output.getvalue()))
+
+    return get_headshot_name(content_hash)
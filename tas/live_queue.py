@@ -0,0 +1,400 @@
+"""A copy of every course's open requests, kept in redis.
+
+For each course there is a sorted set of the ids of its open (not cancelled,
+solved or expired) requests, scored by when they were asked, and a hash from
+those ids to the serialized request. Listing a queue or counting it then
+never touches postgres.
+
+Updates are applied once their transaction commits, and two processes can
+commit changes to the same request in one order and apply them in the
+other. So every row is stored with the request's `version`, and an update
+older than what's already there is dropped. Closing a request leaves its
+version behind for `TOMBSTONE_SECONDS`, so a late update from before it
+was closed can't put it back in the queue.
+
+Updates are also applied while a queue is being rebuilt, and the rebuild
+is merged into what's there rather than replacing it, so nothing that
+commits between the rebuild's read and its write is lost.
+
+The queue is updated after every save of a Request once the transaction
+commits (see the receivers in `tas.models`). Code that changes requests
+without sending signals, like `QuerySet.update`, has to call
+`request_changed` itself. Requests older than the course's time to live are
+dropped when the queue is read. A queue that doesn't exist yet, or whose
+contents look inconsistent, is rebuilt from the database; the
+`RebuildLiveQueues` command rebuilds them on demand.
+
+Everything here returns None if redis can't be reached, or if
+`settings.LIVE_QUEUE_ENABLED` is off, and callers fall back to the database.
+"""
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+import redis
+from redis.client import Script
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from .db_router import use_primary
+from .utils import get_redis_connection, redis_key, to_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Fields of RequestSerializer that depend on who is asking. They're left out
+# of the cached rows and filled in by the view.
+PER_VIEWER_FIELDS = ('owned_by_me', 'can_ta_for')
+
+# How long the version of a closed request is kept. Updates are applied
+# within moments of committing, so this only has to outlast the slowest one.
+TOMBSTONE_SECONDS = 60 * 60
+
+# How long a rebuild can take before updates stop being applied to the queue
+# it's building
+REBUILD_SECONDS = 60
+
+# Adds, updates or removes one request, unless what's stored is newer or the
+# queue is neither built nor being built. Requests updated during a rebuild
+# are remembered, so the rebuild doesn't drop them.
+#
+# KEYS: the queue, its rows, its versions, the request's tombstone, the
+#       built and building markers and the requests updated while building
+# ARGV: the request id, its version, 1 if it's open, when it was asked, its
+#       row, how long to keep the tombstone and REBUILD_SECONDS
+_APPLY_SCRIPT = Script(None, """
+local building = redis.call('EXISTS', KEYS[6]) == 1
+if not building and redis.call('EXISTS', KEYS[5]) == 0 then
+    return 0
+end
+if building then
+    redis.call('SADD', KEYS[7], ARGV[1])
+    redis.call('EXPIRE', KEYS[7], ARGV[7])
+end
+
+local closed_version = tonumber(redis.call('GET', KEYS[4]) or -1)
+local stored_version = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or -1)
+local version = tonumber(ARGV[2])
+if version < stored_version or version < closed_version then
+    return 0
+end
+
+if ARGV[3] == '1' then
+    if version == closed_version then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[5])
+    redis.call('HSET', KEYS[3], ARGV[1], version)
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    redis.call('SETEX', KEYS[4], ARGV[6], version)
+end
+return 1
+""")
+
+# Finishes a rebuild: drops the requests that are neither in the database
+# nor were updated since the rebuild started, and marks the queue built.
+#
+# KEYS: the queue, its rows, its versions, the requests updated while
+#       building and the building and built markers
+# ARGV: the rebuild's token, then the ids of the open requests it read
+_FINISH_REBUILD_SCRIPT = Script(None, """
+local keep = {}
+for i = 2, #ARGV do
+    keep[ARGV[i]] = true
+end
+for _, request_id in ipairs(redis.call('SMEMBERS', KEYS[4])) do
+    keep[request_id] = true
+end
+
+for _, request_id in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+    if not keep[request_id] then
+        redis.call('ZREM', KEYS[1], request_id)
+        redis.call('HDEL', KEYS[2], request_id)
+        redis.call('HDEL', KEYS[3], request_id)
+    end
+end
+
+redis.call('SET', KEYS[6], 1)
+if redis.call('GET', KEYS[5]) == ARGV[1] then
+    redis.call('DEL', KEYS[5], KEYS[4])
+end
+return 1
+""")
+
+
+def is_enabled():
+    return getattr(settings, 'LIVE_QUEUE_ENABLED', True)
+
+
+def _queue_key(course_id):
+    return redis_key('queue', course_id)
+
+
+def _rows_key(course_id):
+    return redis_key('queue', course_id, 'rows')
+
+
+def _versions_key(course_id):
+    return redis_key('queue', course_id, 'versions')
+
+
+def _tombstone_key(course_id, request_id):
+    return redis_key('queue', course_id, 'closed', request_id)
+
+
+def _built_key(course_id):
+    return redis_key('queue', course_id, 'built')
+
+
+def _building_key(course_id):
+    return redis_key('queue', course_id, 'building')
+
+
+def _touched_key(course_id):
+    return redis_key('queue', course_id, 'touched')
+
+
+def _is_open(help_request):
+    return not (help_request.cancelled or help_request.solved or
+                help_request.expired)
+
+
+def _get_cutoff(course):
+    """The score below which requests have timed out, or '-inf'."""
+    if course.request_time_to_live > 0:
+        when_asked_cutoff = timedelta(hours=course.request_time_to_live)
+        return to_timestamp(now() - when_asked_cutoff)
+    return '-inf'
+
+
+def _dump_row(data):
+    for field in PER_VIEWER_FIELDS:
+        data.pop(field, None)
+    return json.dumps(data)
+
+
+def serialize_request(help_request):
+    from .api.serializers import RequestSerializer
+
+    return _dump_row(RequestSerializer(help_request).data)
+
+
+def _apply(pipeline, course_id, request_id, version, when_asked=None,
+           row=None):
+    """Add the open request `request_id` to the course's queue, or remove it
+    if `row` is None, unless a newer version is already stored or the queue
+    isn't built.
+    """
+    is_open = row is not None
+    keys = [_queue_key(course_id), _rows_key(course_id),
+            _versions_key(course_id), _tombstone_key(course_id, request_id),
+            _built_key(course_id), _building_key(course_id),
+            _touched_key(course_id)]
+    args = [request_id, version, 1 if is_open else 0,
+            to_timestamp(when_asked) if is_open else 0,
+            row if is_open else '', TOMBSTONE_SECONDS, REBUILD_SECONDS]
+    _APPLY_SCRIPT(keys=keys, args=args, client=pipeline)
+
+
+def _add_to_pipeline(pipeline, help_request):
+    if _is_open(help_request):
+        _apply(pipeline, help_request.course_id, help_request.pk,
+               help_request.version, help_request.when_asked,
+               serialize_request(help_request))
+    else:
+        _apply(pipeline, help_request.course_id, help_request.pk,
+               help_request.version)
+
+
+def sync_requests(help_requests):
+    """Bring the cached queues up to date with `help_requests`.
+
+    Courses whose queue is neither built nor being built are skipped;
+    they'll be built from the database when they're first read.
+    """
+    help_requests = list(help_requests)
+    if not help_requests:
+        return
+
+    try:
+        pipeline = get_redis_connection().pipeline(transaction=True)
+        for help_request in help_requests:
+            _add_to_pipeline(pipeline, help_request)
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('Failed to update live queues. Dropping them so '
+                         'they get rebuilt. courses=%s',
+                         [r.course_id for r in help_requests])
+        invalidate(set(r.course_id for r in help_requests))
+
+
+def request_changed(*help_requests):
+    """Update the live queue once the current transaction commits."""
+    if is_enabled():
+        transaction.on_commit(lambda: sync_requests(help_requests))
+
+
+def course_changed(*course_ids):
+    """Rebuild the queues of `course_ids` the next time they're read, once
+    the current transaction commits.
+    """
+    if is_enabled():
+        transaction.on_commit(lambda: invalidate(course_ids))
+
+
+def invalidate(course_ids):
+    try:
+        keys = [_built_key(course_id) for course_id in course_ids]
+        if keys:
+            get_redis_connection().delete(*keys)
+    except redis.RedisError:
+        logger.exception('Failed to invalidate live queues. courses=%s',
+                         course_ids)
+
+
+def rebuild(course):
+    """Bring the cached queue for `course` in line with the database.
+
+    This reads from the primary, since a queue rebuilt from a replica that's
+    behind would stay behind until the missing requests change again.
+    """
+    from .api.serializers import REQUEST_ROW_VALUES, serialize_request_row
+    from .models import Request
+
+    open_requests = Request.objects.filter(course=course,
+                                           cancelled=False,
+                                           solved=False,
+                                           expired=False)
+    if course.request_time_to_live > 0:
+        when_asked_cutoff = timedelta(hours=course.request_time_to_live)
+        open_requests = open_requests.filter(
+            when_asked__gte=(now() - when_asked_cutoff)
+        )
+    connection = get_redis_connection()
+    # From here on, updates that commit are applied to the queue too, and
+    # are kept even though the read below can't see them
+    token = uuid.uuid4().hex
+    connection.set(_building_key(course.pk), token, ex=REBUILD_SECONDS)
+
+    with use_primary():
+        rows = list(open_requests.values(*REQUEST_ROW_VALUES))
+
+    pipeline = connection.pipeline(transaction=True)
+    # In case the read took so long that the marker expired
+    pipeline.set(_building_key(course.pk), token, ex=REBUILD_SECONDS)
+    for row in rows:
+        # Still checked against the versions, in case a request changed
+        # after it was read
+        _apply(pipeline, course.pk, row['id'], row['version'],
+               row['when_asked'], _dump_row(serialize_request_row(row)))
+    keys = [_queue_key(course.pk), _rows_key(course.pk),
+            _versions_key(course.pk), _touched_key(course.pk),
+            _building_key(course.pk), _built_key(course.pk)]
+    args = [token] + [row['id'] for row in rows]
+    _FINISH_REBUILD_SCRIPT(keys=keys, args=args, client=pipeline)
+    pipeline.execute()
+
+
+def _ensure_built(connection, course):
+    if not connection.exists(_built_key(course.pk)):
+        rebuild(course)
+
+
+def _trim(connection, course):
+    """Drop requests that have outlived the course's time to live."""
+    cutoff = _get_cutoff(course)
+    if cutoff == '-inf':
+        return
+
+    expired = connection.zrangebyscore(_queue_key(course.pk),
+                                       '-inf', '({}'.format(cutoff))
+    if expired:
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.zrem(_queue_key(course.pk), *expired)
+        pipeline.hdel(_rows_key(course.pk), *expired)
+        pipeline.hdel(_versions_key(course.pk), *expired)
+        pipeline.execute()
+
+
+def get_open_requests(course):
+    """Returns the serialized open requests for `course`, oldest first,
+    without the fields in PER_VIEWER_FIELDS. Returns None if the queue
+    can't be read.
+    """
+    if not is_enabled():
+        return None
+
+    try:
+        connection = get_redis_connection()
+        _ensure_built(connection, course)
+        _trim(connection, course)
+
+        for _ in range(2):
+            request_ids = connection.zrangebyscore(_queue_key(course.pk),
+                                                   _get_cutoff(course),
+                                                   '+inf')
+            if not request_ids:
+                return []
+
+            rows = connection.hmget(_rows_key(course.pk), request_ids)
+            if None not in rows:
+                return [json.loads(row.decode('utf-8'),
+                                   object_pairs_hook=OrderedDict)
+                        for row in rows]
+
+            # The sorted set and the rows disagree, which can happen if an
+            # update raced with a rebuild. Rebuild and try again.
+            logger.warning('Live queue is inconsistent. course=%s', course.pk)
+            rebuild(course)
+    except redis.RedisError:
+        logger.exception('Failed to read live queue. course=%s', course.pk)
+
+    return None
+
+
+def count_open_requests(course):
+    """Returns how many open requests `course` has, or None if the queue
+    can't be read.
+    """
+    if not is_enabled():
+        return None
+
+    try:
+        connection = get_redis_connection()
+        _ensure_built(connection, course)
+        return connection.zcount(_queue_key(course.pk), _get_cutoff(course),
+                                 '+inf')
+    except redis.RedisError:
+        logger.exception('Failed to count live queue. course=%s', course.pk)
+        return None
+
+
+def get_position(course, request_id):
+    """Returns `(ahead, length)`: how many open requests in `course` were
+    asked before `request_id`, or None if it isn't open, and how many open
+    requests there are. Returns None if the queue can't be read.
+    """
+    if not is_enabled():
+        return None
+
+    try:
+        connection = get_redis_connection()
+        _ensure_built(connection, course)
+        _trim(connection, course)
+
+        pipeline = connection.pipeline(transaction=True)
+        pipeline.zrank(_queue_key(course.pk), request_id)
+        pipeline.zcard(_queue_key(course.pk))
+        ahead, length = pipeline.execute()
+        return ahead, length
+    except redis.RedisError:
+        logger.exception('Failed to read live queue position. course=%s',
+                         course.pk)
+        return None
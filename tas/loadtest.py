@@ -0,0 +1,514 @@
+"""Simulate a lab night against a running HalliganHelper server.
+
+Three kinds of simulated clients run side by side, each in its own thread:
+
+- Students log in, ask a question in the course queue, sometimes cancel it
+  and ask again after a while.
+- TAs log in, go on duty, and repeatedly check out and solve the oldest
+  open request.
+- Listeners hold a WebSocket open on the broadcast channel and record when
+  each event arrives.
+
+Every API call goes through the same routes the web client uses, so the
+numbers include the whole stack (uWSGI or runserver, Django, postgres and
+redis). Use the `LoadTest` management command to seed the accounts and run
+a simulation; this module only knows how to talk to the server.
+"""
+from __future__ import division
+
+import base64
+import json
+import logging
+import math
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+
+from django.utils.six.moves.urllib.parse import urlparse
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+LOGIN_URL = '/api/v3/user/login/'
+REQUESTS_URL = '/api/v3/school/courses/{course}/requests/'
+REQUEST_URL = '/api/v3/school/courses/{course}/requests/{pk}/'
+OFFICE_HOURS_URL = '/api/v3/school/courses/{course}/officehours/'
+WEBSOCKET_URL = '/ws/ta?subscribe-broadcast'
+
+BENCHMARK_MESSAGE = 'benchmark'
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+
+    # Multiplied before dividing, so 7% of 100 is exactly 7
+    rank = int(math.ceil(percent * len(sorted_values) / 100)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+class Recorder(object):
+    """Collects latencies from every simulated client. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.events_received = 0
+        self._sent = {}
+        self._received = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def record_call(self, name, seconds, ok):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def expect_event(self, event_type, course, pk, sent_at):
+        """Remember when the call that will cause an event was sent, so the
+        listeners can work out how long delivery took.
+        """
+        with self._lock:
+            self._sent.setdefault((event_type, course, pk), sent_at)
+
+    def record_event(self, event_type, course, pk, received_at):
+        # Events often arrive before the response to the call that caused
+        # them, so they're only matched up with expect_event in summary().
+        with self._lock:
+            self.events_received += 1
+            self._received.setdefault((event_type, course, pk), received_at)
+
+    def get_event_lags(self):
+        with self._lock:
+            lags = defaultdict(list)
+            for key, received_at in self._received.items():
+                sent_at = self._sent.get(key)
+                if sent_at is not None:
+                    lags[key[0]].append(received_at - sent_at)
+            return lags
+
+    def summary(self):
+        """Returns the results as a dict, ready to be printed or dumped."""
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        total_calls = sum(len(v) for v in self.latencies.values())
+
+        def describe(values):
+            values = sorted(values)
+            description = {'count': len(values)}
+            for percent in PERCENTILES:
+                description['p{}'.format(percent)] = percentile(values,
+                                                                percent)
+            return description
+
+        endpoints = {}
+        for name, latencies in self.latencies.items():
+            endpoints[name] = describe(latencies)
+            endpoints[name]['errors'] = self.errors[name]
+            endpoints[name]['throughput'] = len(latencies) / elapsed
+
+        return {
+            'elapsed': elapsed,
+            'calls': total_calls,
+            'throughput': total_calls / elapsed if elapsed else 0,
+            'endpoints': endpoints,
+            'events_received': self.events_received,
+            'event_lag': dict((event_type, describe(lags))
+                              for event_type, lags
+                              in self.get_event_lags().items()),
+        }
+
+
+class SimulatedUser(threading.Thread):
+    """A logged in user that makes API calls until told to stop."""
+
+    def __init__(self, base_url, email, password, course, recorder,
+                 stop_event, think_time):
+        super(SimulatedUser, self).__init__()
+        self.daemon = True
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.course = course
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.think_time = think_time
+        self.session = requests.Session()
+
+    def call(self, name, method, path, expected_status, **kwargs):
+        headers = kwargs.setdefault('headers', {})
+        csrf_token = self.session.cookies.get('csrftoken')
+        if csrf_token:
+            headers['X-CSRFToken'] = csrf_token
+        headers['Referer'] = self.base_url + '/'
+
+        started = time.time()
+        try:
+            response = self.session.request(method, self.base_url + path,
+                                            **kwargs)
+        except requests.RequestException:
+            logger.exception('%s failed for %s', name, self.email)
+            self.recorder.record_call(name, time.time() - started, False)
+            return None
+
+        ok = response.status_code == expected_status
+        self.recorder.record_call(name, time.time() - started, ok)
+        if not ok:
+            logger.debug('%s returned %s for %s: %s', name,
+                         response.status_code, self.email, response.content)
+            return None
+
+        return response
+
+    def think(self):
+        """Wait for a random time around `think_time`. Returns False once
+        the simulation is over.
+        """
+        pause = random.expovariate(1 / self.think_time)
+        return not self.stop_event.wait(pause)
+
+    def login(self):
+        # The home page hands out the CSRF cookie the API needs for writes.
+        self.call('home', 'GET', '/', 200)
+        return self.call('login', 'POST', LOGIN_URL, 200, json={
+            'email': self.email,
+            'password': self.password,
+        }) is not None
+
+    def run(self):
+        if not self.login():
+            logger.error('Could not log in as %s', self.email)
+            return
+
+        try:
+            self.simulate()
+        except Exception:
+            logger.exception('Simulated user %s crashed', self.email)
+
+    def simulate(self):
+        raise NotImplementedError
+
+
+class SimulatedStudent(SimulatedUser):
+    cancel_probability = 0.2
+
+    def simulate(self):
+        requests_url = REQUESTS_URL.format(course=self.course)
+        while self.think():
+            sent_at = time.time()
+            response = self.call('create_request', 'POST', requests_url, 201,
+                                 json={
+                                     'question': 'Load test question',
+                                     'where_located': 'Lab 116',
+                                 })
+            if response is None:
+                continue
+
+            pk = response.json()['id']
+            self.recorder.expect_event('request_created', self.course, pk,
+                                       sent_at)
+
+            if not self.think():
+                return
+
+            if random.random() < self.cancel_probability:
+                sent_at = time.time()
+                response = self.call(
+                    'cancel_request', 'PATCH',
+                    REQUEST_URL.format(course=self.course, pk=pk), 200,
+                    json={'cancelled': True}
+                )
+                if response is not None:
+                    self.recorder.expect_event('request_removed',
+                                               self.course, pk, sent_at)
+
+            # Stay in line for a while before asking something else
+            if not self.think():
+                return
+
+
+class SimulatedTA(SimulatedUser):
+
+    def go_on_duty(self):
+        end_time = now() + timedelta(hours=4)
+        return self.call('go_on_duty', 'POST',
+                         OFFICE_HOURS_URL.format(course=self.course), 201,
+                         json={
+                             'location': 'Lab 116',
+                             'end_time': end_time.isoformat(),
+                         })
+
+    def simulate(self):
+        self.go_on_duty()
+
+        requests_url = REQUESTS_URL.format(course=self.course)
+        while self.think():
+            response = self.call('list_requests', 'GET', requests_url, 200)
+            if response is None:
+                continue
+
+            waiting = [r for r in response.json() if not r['checked_out']]
+            if not waiting:
+                continue
+
+            waiting.sort(key=lambda r: r['when_asked'])
+            request_url = REQUEST_URL.format(course=self.course,
+                                             pk=waiting[0]['id'])
+            sent_at = time.time()
+            response = self.call('check_out_request', 'PATCH', request_url,
+                                 200, json={'checked_out': True})
+            if response is None:
+                continue
+
+            self.recorder.expect_event('request_updated', self.course,
+                                       waiting[0]['id'], sent_at)
+
+            if not self.think():
+                return
+
+            sent_at = time.time()
+            response = self.call('solve_request', 'PATCH', request_url, 200,
+                                 json={'solved': True})
+            if response is not None:
+                self.recorder.expect_event('request_removed', self.course,
+                                           waiting[0]['id'], sent_at)
+
+
+class WebSocketListener(threading.Thread):
+    """Subscribes to the broadcast channel with a bare-bones WebSocket
+    client and records every event it sees.
+    """
+    heartbeat = '--heartbeat--'
+
+    def __init__(self, base_url, recorder, stop_event):
+        super(WebSocketListener, self).__init__()
+        self.daemon = True
+        self.base_url = urlparse(base_url)
+        self.recorder = recorder
+        self.stop_event = stop_event
+        self.connected = threading.Event()
+
+    def connect(self):
+        host = self.base_url.hostname
+        port = self.base_url.port or 80
+        connection = socket.create_connection((host, port), timeout=10)
+
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        handshake = (
+            'GET {path} HTTP/1.1\r\n'
+            'Host: {host}:{port}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            'Sec-WebSocket-Key: {key}\r\n'
+            'Sec-WebSocket-Version: 13\r\n'
+            '\r\n'
+        ).format(path=WEBSOCKET_URL, host=host, port=port, key=key)
+        connection.sendall(handshake.encode('ascii'))
+
+        response = b''
+        while b'\r\n\r\n' not in response:
+            chunk = connection.recv(1024)
+            if not chunk:
+                raise IOError('Connection closed during handshake')
+            response += chunk
+
+        status_line = response.split(b'\r\n', 1)[0]
+        if b' 101 ' not in status_line:
+            raise IOError('WebSocket handshake failed: {}'.format(
+                status_line))
+
+        connection.settimeout(1)
+        return connection
+
+    def _read_exactly(self, connection, length):
+        data = b''
+        while len(data) < length:
+            try:
+                chunk = connection.recv(length - len(data))
+            except socket.timeout:
+                if self.stop_event.is_set():
+                    raise
+                continue
+            if not chunk:
+                raise IOError('Connection closed')
+            data += chunk
+        return data
+
+    def read_frame(self, connection):
+        """Returns (opcode, payload) for the next frame from the server."""
+        first, second = struct.unpack(
+            '!BB', self._read_exactly(connection, 2)
+        )
+        opcode = first & 0x0f
+        length = second & 0x7f
+        if length == 126:
+            length, = struct.unpack('!H', self._read_exactly(connection, 2))
+        elif length == 127:
+            length, = struct.unpack('!Q', self._read_exactly(connection, 8))
+
+        return opcode, self._read_exactly(connection, length)
+
+    def send_frame(self, connection, opcode, payload):
+        # Frames from a client have to be masked
+        mask = bytearray(os.urandom(4))
+        masked = bytearray(payload)
+        for index in range(len(masked)):
+            masked[index] ^= mask[index % 4]
+
+        header = struct.pack('!BB', 0x80 | opcode, 0x80 | len(payload))
+        connection.sendall(header + bytes(mask) + bytes(masked))
+
+    def handle_packet(self, packet, received_at):
+        data = packet.get('data') or {}
+        self.recorder.record_event(packet.get('type'), data.get('course'),
+                                   data.get('id'), received_at)
+
+    def run(self):
+        try:
+            connection = self.connect()
+        except (IOError, socket.error):
+            logger.exception('WebSocket listener could not connect')
+            return
+
+        self.connected.set()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    opcode, payload = self.read_frame(connection)
+                except socket.timeout:
+                    break
+
+                if opcode == 0x8:  # close
+                    break
+                if opcode == 0x9:  # ping
+                    self.send_frame(connection, 0xa, payload)
+                    continue
+                if opcode != 0x1:
+                    continue
+
+                received_at = time.time()
+                message = payload.decode('utf-8')
+                if message == self.heartbeat:
+                    continue
+
+                self.handle_packet(json.loads(message), received_at)
+        except (IOError, socket.error):
+            if not self.stop_event.is_set():
+                logger.exception('WebSocket listener disconnected')
+        finally:
+            connection.close()
+
+
+def run_simulation(base_url, course, students, tas, listeners, duration,
+                   think_time):
+    """Run a simulation and return the Recorder with its results.
+
+    :param str base_url: Where the server is, like http://localhost:8000
+    :param int course: The pk of the course to queue up in
+    :param list students: (email, password) for each simulated student
+    :param list tas: (email, password) for each simulated TA. They have to
+                     be active TAs for `course`.
+    :param int listeners: How many WebSocket listeners to connect
+    :param float duration: How long to run for, in seconds
+    :param float think_time: Mean pause between a user's actions, in seconds
+    """
+    recorder = Recorder()
+    stop_event = threading.Event()
+
+    websocket_listeners = [
+        WebSocketListener(base_url, recorder, stop_event)
+        for _ in range(listeners)
+    ]
+    for listener in websocket_listeners:
+        listener.start()
+    for listener in websocket_listeners:
+        listener.connected.wait(10)
+
+    users = [
+        SimulatedTA(base_url, email, password, course, recorder,
+                    stop_event, think_time)
+        for email, password in tas
+    ] + [
+        SimulatedStudent(base_url, email, password, course, recorder,
+                         stop_event, think_time)
+        for email, password in students
+    ]
+
+    recorder.started_at = time.time()
+    for user in users:
+        user.start()
+
+    stop_event.wait(duration)
+    stop_event.set()
+    recorder.finished_at = time.time()
+
+    for thread in users + websocket_listeners:
+        thread.join(5)
+
+    return recorder
+
+
+class BenchmarkListener(WebSocketListener):
+    """Records how long each benchmark message took to arrive."""
+
+    def handle_packet(self, packet, received_at):
+        if packet.get('type') != BENCHMARK_MESSAGE:
+            return
+
+        self.recorder.record_event(BENCHMARK_MESSAGE, None,
+                                   packet['data']['id'], received_at)
+        self.recorder.record_call(
+            'delivery', received_at - packet['data']['sent_at'], True
+        )
+
+
+def run_websocket_benchmark(base_url, connections, messages, rate,
+                            settle_time=5):
+    """Hold `connections` WebSockets open on the broadcast channel, publish
+    `messages` messages straight to redis at `rate` a second, and return
+    the Recorder with how long each delivery took, under 'delivery', and
+    how many connections were made, as `connected`.
+
+    Every client of the server gets the messages, so don't point this at
+    production.
+    """
+    from .utils import publish_message
+
+    recorder = Recorder()
+    stop_event = threading.Event()
+
+    listeners = [BenchmarkListener(base_url, recorder, stop_event)
+                 for _ in range(connections)]
+    for listener in listeners:
+        listener.start()
+    for listener in listeners:
+        listener.connected.wait(10)
+    recorder.connected = sum(1 for listener in listeners
+                             if listener.connected.is_set())
+
+    recorder.started_at = time.time()
+    for index in range(messages):
+        publish_message(BENCHMARK_MESSAGE, {'id': index,
+                                            'sent_at': time.time()})
+        time.sleep(1 / rate)
+
+    # Give the last messages time to arrive
+    stop_event.wait(settle_time)
+    stop_event.set()
+    recorder.finished_at = time.time()
+
+    for listener in listeners:
+        listener.join(5)
+
+    return recorder
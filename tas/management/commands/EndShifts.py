@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tas.shifts import run_scheduler
+
+
+class Command(BaseCommand):
+    help = ('Publish off_duty when office hours end. Runs until it is '
+            'killed; run one or more next to the web servers.')
+
+    def handle(self, *args, **options):
+        run_scheduler()
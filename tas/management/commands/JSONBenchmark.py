@@ -0,0 +1,146 @@
+import io
+import json
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from tas.api import fast_json
+
+
+def make_payload(course_count, request_count):
+    """Something shaped like the school payload, with every course's queue
+    and the datetimes and decimals left for the encoder.
+    """
+    started = now()
+    return OrderedDict((
+        ('name', 'Benchmark University'),
+        ('administrators', []),
+        ('courses', [
+            OrderedDict((
+                ('id', course),
+                ('name', 'Course {}'.format(course)),
+                ('identifier', 'COMP {}'.format(course)),
+                ('am_a_ta', course % 2 == 0),
+                ('active_ta_count', 3),
+                ('current_request_count', request_count),
+                ('average_rating', Decimal('4.25')),
+                ('requests', [
+                    OrderedDict((
+                        ('id', course * request_count + index),
+                        ('question', u'Why is my code segfaulting?'),
+                        ('where_located', u'Halligan 116'),
+                        ('when_asked', started - timedelta(seconds=index)),
+                        ('cancelled', False),
+                        ('checked_out', index % 3 == 0),
+                        ('solved', False),
+                        ('requestor', OrderedDict((
+                            ('id', index),
+                            ('headshot_url', '/media/blank/blank.jpg'),
+                            ('first_name', u'Jos\xe9'),
+                            ('last_name', 'Student'),
+                        ))),
+                        ('expired', False),
+                        ('version', 1),
+                    ))
+                    for index in range(request_count)
+                ]),
+            ))
+            for course in range(course_count)
+        ]),
+    ))
+
+
+class Command(BaseCommand):
+    help = ('Encode and decode a large API payload with DRF\'s JSON '
+            'renderer and parser and with each backend in tas.api.fast_json, '
+            'check that they agree and report how long each took.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=20,
+                            help='how many courses in the payload')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='how many requests each course has')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='how many times to time each step')
+        parser.add_argument('--json', action='store_true',
+                            help='print the results as JSON')
+
+    def time(self, function, repeat):
+        """The fastest of `repeat` runs, in seconds, and the last result."""
+        timings = []
+        for _ in range(repeat):
+            started = time.time()
+            result = function()
+            timings.append(time.time() - started)
+        return min(timings), result
+
+    def handle(self, *args, **options):
+        payload = make_payload(options['courses'], options['requests'])
+        repeat = options['repeat']
+
+        render_time, rendered = self.time(
+            lambda: JSONRenderer().render(payload), repeat
+        )
+        parse_time, parsed = self.time(
+            lambda: JSONParser().parse(io.BytesIO(rendered),
+                                       'application/json',
+                                       {'encoding': 'utf-8'}),
+            repeat
+        )
+
+        backends = {}
+        for backend in fast_json.get_backends():
+            backend_render_time, backend_rendered = self.time(
+                lambda: fast_json.dumps(payload, backend), repeat
+            )
+            backend_parse_time, backend_parsed = self.time(
+                lambda: fast_json.loads(rendered, backend), repeat
+            )
+            backends[backend] = {
+                'identical': (backend_rendered == rendered and
+                              backend_parsed == parsed),
+                'render_seconds': backend_render_time,
+                'parse_seconds': backend_parse_time,
+            }
+
+        results = {
+            'backend': fast_json.get_backend(),
+            'bytes': len(rendered),
+            'render_seconds': render_time,
+            'parse_seconds': parse_time,
+            'backends': backends,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self.stdout.write('{} byte payload'.format(results['bytes']))
+            if not backends:
+                self.stdout.write('Neither orjson nor simplejson with its C '
+                                  'extension is installed, so the API uses '
+                                  'the standard library')
+            for backend, timings in sorted(backends.items()):
+                in_use = ' (in use)' if backend == results['backend'] else ''
+                self.stdout.write('{}{}'.format(backend, in_use))
+                for step in ('render', 'parse'):
+                    slow = results['{}_seconds'.format(step)]
+                    fast = timings['{}_seconds'.format(step)]
+                    self.stdout.write(
+                        '  {:<7} {:.2f}ms -> {:.2f}ms ({:.1f}x)'.format(
+                            step, slow * 1000, fast * 1000,
+                            slow / fast if fast else 0
+                        )
+                    )
+
+        disagree = sorted(backend for backend, timings in backends.items()
+                          if not timings['identical'])
+        if disagree:
+            raise CommandError('These JSON backends disagree with the '
+                               'standard library: {}'.format(
+                                   ', '.join(disagree)))
@@ -0,0 +1,126 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tas.custom_user import CustomUser
+from tas.loadtest import run_simulation, PERCENTILES
+from tas.models import School, SchoolEmailDomain, Course, TA, Request
+
+SCHOOL_NAME = 'Load Test University'
+DOMAIN = 'loadtest.halliganhelper.com'
+PASSWORD = 'load-test-password'
+
+
+class Command(BaseCommand):
+    help = ('Simulate a lab night against a running server and report '
+            'latencies. The server has to use the same database as this '
+            'command, which creates the accounts it logs in with, and '
+            'RelayEvents has to be running for events to arrive.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000',
+                            help='where the server is running')
+        parser.add_argument('--students', type=int, default=50,
+                            help='how many students to simulate')
+        parser.add_argument('--tas', type=int, default=5,
+                            help='how many TAs to simulate')
+        parser.add_argument('--listeners', type=int, default=20,
+                            help='how many WebSocket listeners to connect')
+        parser.add_argument('--duration', type=float, default=60,
+                            help='how long to run for, in seconds')
+        parser.add_argument('--think-time', type=float, default=2,
+                            help='mean pause between actions, in seconds')
+        parser.add_argument('--json', action='store_true',
+                            help='print the results as JSON')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='delete the load test school and its '
+                                 'accounts, then exit')
+
+    def get_or_create_user(self, email):
+        try:
+            return CustomUser.objects.get(email=email)
+        except CustomUser.DoesNotExist:
+            return CustomUser.objects.create_user(email, PASSWORD,
+                                                  first_name='Load',
+                                                  last_name='Test')
+
+    def seed(self, student_count, ta_count):
+        administrator = self.get_or_create_user('admin@{}'.format(DOMAIN))
+        school, _ = School.objects.get_or_create(
+            name=SCHOOL_NAME,
+            defaults={'administrator': administrator, 'max_course_count': 1}
+        )
+        SchoolEmailDomain.objects.get_or_create(domain=DOMAIN, school=school)
+        course, _ = Course.objects.get_or_create(
+            school=school, department='LOAD', number=1,
+            defaults={'name': 'Load Testing'}
+        )
+
+        # Start every run with an empty queue
+        Request.objects.filter(course=course).delete()
+
+        students = []
+        for index in range(student_count):
+            email = 'student{}@{}'.format(index, DOMAIN)
+            self.get_or_create_user(email)
+            students.append((email, PASSWORD))
+
+        tas = []
+        for index in range(ta_count):
+            email = 'ta{}@{}'.format(index, DOMAIN)
+            user = self.get_or_create_user(email)
+            TA.objects.update_or_create(student=user.student, course=course,
+                                        defaults={'active': True})
+            tas.append((email, PASSWORD))
+
+        return course, students, tas
+
+    def cleanup(self):
+        CustomUser.objects.filter(email__endswith='@' + DOMAIN).delete()
+        School.objects.filter(name=SCHOOL_NAME).delete()
+
+    def format_row(self, name, description):
+        timings = ' '.join(
+            '{}={:.1f}ms'.format(key, description[key] * 1000)
+            if description[key] is not None else '{}=-'.format(key)
+            for key in ['p{}'.format(p) for p in PERCENTILES]
+        )
+        return '{:<20} n={:<6} {}'.format(name, description['count'],
+                                          timings)
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.cleanup()
+            return
+
+        course, students, tas = self.seed(options['students'], options['tas'])
+
+        self.stderr.write('Running against {} for {}s: {} students, {} TAs, '
+                          '{} listeners'.format(options['url'],
+                                                options['duration'],
+                                                len(students), len(tas),
+                                                options['listeners']))
+
+        recorder = run_simulation(options['url'], course.pk, students, tas,
+                                  options['listeners'], options['duration'],
+                                  options['think_time'])
+        summary = recorder.summary()
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2, sort_keys=True))
+            return
+
+        self.stdout.write('{} calls in {:.1f}s ({:.1f}/s)'.format(
+            summary['calls'], summary['elapsed'], summary['throughput']))
+
+        self.stdout.write('\nLatency by endpoint')
+        for name, description in sorted(summary['endpoints'].items()):
+            self.stdout.write('{} errors={} ({:.1f}/s)'.format(
+                self.format_row(name, description),
+                description['errors'],
+                description['throughput']))
+
+        self.stdout.write('\nEvent delivery lag ({} events received)'.format(
+            summary['events_received']))
+        for event_type, description in sorted(summary['event_lag'].items()):
+            self.stdout.write(self.format_row(event_type, description))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tas import live_queue
+from tas.models import Course
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the copy of every course queue kept in redis from the '
+            'database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int,
+                            help='only rebuild these courses')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options['course_ids']:
+            courses = courses.filter(pk__in=options['course_ids'])
+
+        for course in courses:
+            live_queue.rebuild(course)
+            self.stdout.write('Rebuilt {}'.format(course.get_identifier()))
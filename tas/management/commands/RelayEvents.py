@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tas.outbox import run_relay
+
+
+class Command(BaseCommand):
+    help = ('Publish the WebSocket messages queued by the web servers. Runs '
+            'until it is killed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='how many messages to publish per '
+                                 'transaction')
+
+    def handle(self, *args, **options):
+        run_relay(batch_size=options['batch_size'])
@@ -0,0 +1,123 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tas.api.serializers import RequestSerializer, serialize_requests
+from tas.api.views import get_open_requests
+from tas.custom_user import CustomUser
+from tas.models import School, SchoolEmailDomain, Course, TA, Request
+
+SCHOOL_NAME = 'Serializer Benchmark University'
+DOMAIN = 'serializers.halliganhelper.com'
+PASSWORD = 'serializer-benchmark-password'
+
+
+class Rollback(Exception):
+    pass
+
+
+class BenchmarkRequest(object):
+    """Just enough of a request for the serializers."""
+
+    def __init__(self, user):
+        self.user = user
+
+
+class Command(BaseCommand):
+    help = ('Serialize a long queue with RequestSerializer and with '
+            'serialize_requests, check that they agree and report how long '
+            'each took. Everything it creates is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='how many open requests to queue up')
+        parser.add_argument('--students', type=int, default=50,
+                            help='how many students to spread them over')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='how many times to time each serializer')
+        parser.add_argument('--json', action='store_true',
+                            help='print the results as JSON')
+
+    def seed(self, request_count, student_count):
+        administrator = CustomUser.objects.create_user(
+            'admin@{}'.format(DOMAIN), PASSWORD
+        )
+        school = School.objects.create(name=SCHOOL_NAME,
+                                       administrator=administrator,
+                                       max_course_count=1)
+        SchoolEmailDomain.objects.create(domain=DOMAIN, school=school)
+        course = Course.objects.create(school=school, department='BENCH',
+                                       number=1, name='Benchmarking')
+
+        students = [
+            CustomUser.objects.create_user(
+                'student{}@{}'.format(index, DOMAIN), PASSWORD,
+                first_name='Student', last_name=str(index)
+            ).student
+            for index in range(student_count)
+        ]
+        TA.objects.create(student=students[0], course=course, active=True)
+
+        Request.objects.bulk_create(
+            Request(course=course,
+                    requestor=students[index % len(students)],
+                    question='Question {}'.format(index),
+                    where_located='Lab 116')
+            for index in range(request_count)
+        )
+
+        return course, students[0].user
+
+    def time(self, serialize, repeat):
+        """The fastest of `repeat` runs, in seconds, and the last result."""
+        timings = []
+        for _ in range(repeat):
+            started = time.time()
+            data = serialize()
+            timings.append(time.time() - started)
+        return min(timings), data
+
+    def benchmark(self, options):
+        course, viewer = self.seed(options['requests'], options['students'])
+        web_request = BenchmarkRequest(viewer)
+
+        def with_serializer():
+            return RequestSerializer(get_open_requests(course), many=True,
+                                     context={'request': web_request}).data
+
+        def with_rows():
+            return serialize_requests(get_open_requests(course), web_request)
+
+        serializer_time, serializer_data = self.time(with_serializer,
+                                                     options['repeat'])
+        rows_time, rows_data = self.time(with_rows, options['repeat'])
+
+        return {
+            'requests': len(rows_data),
+            'identical': json.dumps(serializer_data) == json.dumps(rows_data),
+            'serializer_seconds': serializer_time,
+            'rows_seconds': rows_time,
+            'speedup': serializer_time / rows_time if rows_time else None,
+        }
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                results = self.benchmark(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+        else:
+            self.stdout.write('{} requests'.format(results['requests']))
+            self.stdout.write('RequestSerializer   {:.1f}ms'.format(
+                results['serializer_seconds'] * 1000))
+            self.stdout.write('serialize_requests  {:.1f}ms ({:.1f}x)'.format(
+                results['rows_seconds'] * 1000, results['speedup'] or 0))
+
+        if not results['identical']:
+            raise CommandError('The serializers disagree')
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tas.loadtest import run_websocket_benchmark, PERCENTILES
+
+
+class Command(BaseCommand):
+    help = ('Hold many WebSockets open against a running server, publish '
+            'messages to its broadcast channel, and report how long they '
+            'took to be delivered. Every client of the server gets the '
+            'messages, so don\'t run this against production.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8002',
+                            help='where the WebSocket server is running')
+        parser.add_argument('--connections', type=int, default=500,
+                            help='how many WebSockets to open')
+        parser.add_argument('--messages', type=int, default=100,
+                            help='how many messages to publish')
+        parser.add_argument('--rate', type=float, default=10,
+                            help='messages to publish a second')
+        parser.add_argument('--json', action='store_true',
+                            help='print the results as JSON')
+
+    def handle(self, *args, **options):
+        self.stderr.write('Opening {} WebSockets to {}'.format(
+            options['connections'], options['url']))
+
+        recorder = run_websocket_benchmark(options['url'],
+                                           options['connections'],
+                                           options['messages'],
+                                           options['rate'])
+        summary = recorder.summary()
+        delivery = summary['endpoints'].get('delivery', {'count': 0})
+        expected = recorder.connected * options['messages']
+
+        results = {
+            'connections': options['connections'],
+            'connected': recorder.connected,
+            'messages': options['messages'],
+            'expected_deliveries': expected,
+            'deliveries': delivery['count'],
+            'latency': dict((key, delivery.get(key))
+                            for key in ['p{}'.format(p)
+                                        for p in PERCENTILES]),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
+            return
+
+        self.stdout.write('{} of {} WebSockets connected'.format(
+            results['connected'], results['connections']))
+        self.stdout.write('{} of {} messages delivered'.format(
+            results['deliveries'], results['expected_deliveries']))
+        self.stdout.write('Delivery latency ' + ' '.join(
+            '{}={:.1f}ms'.format(key, value * 1000)
+            if value is not None else '{}=-'.format(key)
+            for key, value in sorted(results['latency'].items())
+        ))
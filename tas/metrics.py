@@ -0,0 +1,249 @@
+"""Per-view request metrics.
+
+`tas.middleware.RequestMetricsMiddleware` records, for every request, the
+wall time, time spent in the database, number of queries, time spent
+publishing to redis and the size of the response, grouped by the name of
+the view that handled it. The totals are exported in the Prometheus text
+format by `metrics_view`.
+
+The counters are kept once per process, by view, behind a lock that's
+only held long enough to add a few numbers. Keeping them per thread would
+grow without bound, since the gevent processes start a greenlet for every
+connection.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.backends.utils import CursorWrapper
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Upper bounds (in seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The counters kept for every view, along with the help text they're
+# exported with.
+COUNTERS = (
+    ('requests_total', 'Requests handled'),
+    ('request_duration_seconds_total', 'Wall time spent handling requests'),
+    ('db_duration_seconds_total', 'Time spent waiting on the database'),
+    ('db_queries_total', 'Database queries made'),
+    ('redis_publish_duration_seconds_total', 'Time spent publishing to redis'),
+    ('response_bytes_total', 'Bytes of response bodies'),
+)
+
+_local = threading.local()
+
+
+def _new_view_counters():
+    counters = dict((name, 0) for name, _ in COUNTERS)
+    counters['buckets'] = [0] * len(DURATION_BUCKETS)
+    return counters
+
+
+_lock = threading.Lock()
+_counters = defaultdict(_new_view_counters)
+
+
+def start_request(keep_sql=False):
+    """Reset the redis and database time tracked for the current thread's
+    request. With `keep_sql` the SQL of every query is kept as well, for
+    `get_queries`.
+    """
+    _local.redis_publish_time = 0
+    _local.db_queries = 0
+    _local.db_time = 0
+    _local.sql = [] if keep_sql else None
+
+
+def record_redis_publish(seconds):
+    _local.redis_publish_time = getattr(_local, 'redis_publish_time', 0) + \
+        seconds
+
+
+def get_redis_publish_time():
+    return getattr(_local, 'redis_publish_time', 0)
+
+
+class timed_redis_publish(object):
+    """Context manager that adds the time spent in its block to the current
+    request's redis publish time.
+    """
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_redis_publish(time.time() - self.started)
+
+
+def record_query(seconds, sql, params=None):
+    """Count a query against the current thread's request."""
+    _local.db_queries = getattr(_local, 'db_queries', 0) + 1
+    _local.db_time = getattr(_local, 'db_time', 0) + seconds
+    if getattr(_local, 'sql', None) is not None:
+        _local.sql.append((seconds, sql, params))
+
+
+def get_query_count():
+    return getattr(_local, 'db_queries', 0)
+
+
+def get_query_time():
+    return getattr(_local, 'db_time', 0)
+
+
+def get_queries():
+    """The `(seconds, sql, params)` of every query in the current thread's
+    request, if it's keeping them.
+    """
+    return list(getattr(_local, 'sql', None) or [])
+
+
+class TimedCursorWrapper(CursorWrapper):
+    """Counts and times the queries run on a cursor for the request metrics.
+
+    This is much cheaper than the debug cursor, which formats and keeps the
+    SQL of every query. Here the SQL and parameters are only held on to, and
+    only while the request is keeping them.
+    """
+
+    def execute(self, sql, params=None):
+        started = time.time()
+        try:
+            return super(TimedCursorWrapper, self).execute(sql, params)
+        finally:
+            record_query(time.time() - started, sql, params)
+
+    def executemany(self, sql, param_list):
+        started = time.time()
+        try:
+            return super(TimedCursorWrapper, self).executemany(sql,
+                                                               param_list)
+        finally:
+            record_query(time.time() - started, sql)
+
+
+def instrument_connection(connection):
+    """Wrap the cursors `connection` hands out in `TimedCursorWrapper`, debug
+    cursors included. Only done once per connection.
+    """
+    if getattr(connection, '_metrics_instrumented', False):
+        return
+
+    make_cursor = connection.make_cursor
+    make_debug_cursor = connection.make_debug_cursor
+    connection.make_cursor = lambda cursor: TimedCursorWrapper(
+        make_cursor(cursor), connection
+    )
+    connection.make_debug_cursor = lambda cursor: TimedCursorWrapper(
+        make_debug_cursor(cursor), connection
+    )
+    connection._metrics_instrumented = True
+
+
+def record_request(view_name, duration, db_duration, db_queries,
+                   redis_publish_duration, response_bytes):
+    bucket = None
+    for index, upper_bound in enumerate(DURATION_BUCKETS):
+        if duration <= upper_bound:
+            bucket = index
+            break
+
+    with _lock:
+        counters = _counters[view_name]
+        counters['requests_total'] += 1
+        counters['request_duration_seconds_total'] += duration
+        counters['db_duration_seconds_total'] += db_duration
+        counters['db_queries_total'] += db_queries
+        counters['redis_publish_duration_seconds_total'] += \
+            redis_publish_duration
+        counters['response_bytes_total'] += response_bytes
+        if bucket is not None:
+            counters['buckets'][bucket] += 1
+
+
+def collect():
+    """Returns a copy of the counters, by view name."""
+    totals = defaultdict(_new_view_counters)
+    with _lock:
+        for view_name, counters in _counters.items():
+            view_totals = totals[view_name]
+            for name, _ in COUNTERS:
+                view_totals[name] = counters[name]
+            view_totals['buckets'] = list(counters['buckets'])
+
+    return totals
+
+
+def reset():
+    """Forget everything recorded so far. Only meant for tests."""
+    with _lock:
+        _counters.clear()
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')\
+        .replace('\n', '\\n')
+
+
+def render_prometheus(totals, prefix='halliganhelper'):
+    """Format the collected counters in the Prometheus text format."""
+    pid = os.getpid()
+    lines = []
+
+    def label(view_name, **extra):
+        labels = [('view', view_name), ('pid', str(pid))]
+        labels.extend(sorted(extra.items()))
+        return ','.join('{}="{}"'.format(key, _escape_label(value))
+                        for key, value in labels)
+
+    for name, help_text in COUNTERS:
+        metric = '{}_{}'.format(prefix, name)
+        lines.append('# HELP {} {}'.format(metric, help_text))
+        lines.append('# TYPE {} counter'.format(metric))
+        for view_name, counters in sorted(totals.items()):
+            lines.append('{}{{{}}} {}'.format(metric, label(view_name),
+                                              counters[name]))
+
+    metric = '{}_request_duration_seconds'.format(prefix)
+    lines.append('# HELP {} Request duration'.format(metric))
+    lines.append('# TYPE {} histogram'.format(metric))
+    for view_name, counters in sorted(totals.items()):
+        cumulative = 0
+        for upper_bound, count in zip(DURATION_BUCKETS, counters['buckets']):
+            cumulative += count
+            lines.append('{}_bucket{{{}}} {}'.format(
+                metric, label(view_name, le=repr(upper_bound)), cumulative
+            ))
+        lines.append('{}_bucket{{{}}} {}'.format(
+            metric, label(view_name, le='+Inf'), counters['requests_total']
+        ))
+        lines.append('{}_sum{{{}}} {}'.format(
+            metric, label(view_name),
+            counters['request_duration_seconds_total']
+        ))
+        lines.append('{}_count{{{}}} {}'.format(
+            metric, label(view_name), counters['requests_total']
+        ))
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Export this process's request metrics for Prometheus.
+
+    Only superusers and the addresses in `settings.METRICS_ALLOWED_IPS` are
+    allowed to see them.
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    user = getattr(request, 'user', None)
+    is_superuser = user is not None and user.is_superuser
+    if not is_superuser and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponseForbidden()
+
+    return HttpResponse(render_prometheus(collect()),
+                        content_type='text/plain; version=0.0.4')
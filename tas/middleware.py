@@ -0,0 +1,141 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+from . import metrics
+from .profiling import StackSampler, render_collapsed
+
+logger = logging.getLogger(__name__)
+slow_request_logger = logging.getLogger('tas.slow_requests')
+
+
+def get_view_name(request):
+    """The name requests are grouped under in the metrics: the URL name of
+    the view (plus the resource for tastypie), or 'unresolved' for requests
+    that never made it to a view.
+    """
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is None:
+        return 'unresolved'
+
+    # Falls back to the dotted path of the view for unnamed URLs
+    view_name = resolver_match.view_name
+
+    resource_name = resolver_match.kwargs.get('resource_name')
+    if resource_name:
+        view_name = '{}:{}'.format(view_name, resource_name)
+
+    return view_name
+
+
+class RequestMetricsMiddleware(object):
+    """Record how long each request took and what it spent its time on.
+
+    Queries are counted and timed by wrapping the cursors of every
+    connection in `tas.metrics.TimedCursorWrapper`. Requests slower than
+    `settings.SLOW_REQUEST_THRESHOLD` seconds are logged to the
+    'tas.slow_requests' logger, along with their queries. Their SQL is only
+    kept while that threshold is set.
+    """
+
+    def process_request(self, request):
+        request._metrics_started = time.time()
+        for connection in connections.all():
+            metrics.instrument_connection(connection)
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', None)
+        metrics.start_request(keep_sql=threshold is not None)
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is None:
+            return response
+
+        duration = time.time() - started
+        query_count = metrics.get_query_count()
+        db_duration = metrics.get_query_time()
+        redis_duration = metrics.get_redis_publish_time()
+
+        if response.streaming:
+            response_bytes = int(response.get('Content-Length', 0))
+        else:
+            response_bytes = len(response.content)
+
+        view_name = get_view_name(request)
+        metrics.record_request(view_name, duration, db_duration, query_count,
+                               redis_duration, response_bytes)
+
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', None)
+        if threshold is not None and duration >= threshold:
+            slow_request_logger.warning(
+                'Slow request. view="%s" method=%s path="%s" status=%s '
+                'duration=%.3f db_duration=%.3f queries=%s '
+                'redis_duration=%.3f bytes=%s\n%s',
+                view_name, request.method, request.path,
+                response.status_code, duration, db_duration, query_count,
+                redis_duration, response_bytes,
+                '\n'.join('[{:.3f}] {} {!r}'.format(seconds, sql, params)
+                          for seconds, sql, params in metrics.get_queries())
+            )
+
+        return response
+
+
+class RequestProfilerMiddleware(object):
+    """Profile individual requests on demand.
+
+    A superuser can add `?profile=1` or an `X-Profile: 1` header to any
+    request to have it sampled by `tas.profiling.StackSampler`. The
+    collapsed stacks are written to `settings.PROFILE_DIR` and the file name
+    is returned in the `X-Profile` response header. Use `?profile=inline` to
+    get the profile back instead of the normal response.
+
+    This has to come after AuthenticationMiddleware, so only session logins
+    can turn it on.
+    """
+
+    def should_profile(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_superuser:
+            return False
+
+        return bool(request.GET.get('profile') or
+                    request.META.get('HTTP_X_PROFILE'))
+
+    def process_request(self, request):
+        if not self.should_profile(request):
+            return
+
+        interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+        sampler = StackSampler(threading.current_thread().ident, interval)
+        sampler.start()
+        request._profile_sampler = sampler
+
+    def process_response(self, request, response):
+        sampler = getattr(request, '_profile_sampler', None)
+        if sampler is None:
+            return response
+
+        profile = render_collapsed(sampler.stop())
+        if request.GET.get('profile') == 'inline':
+            return HttpResponse(profile, content_type='text/plain')
+
+        view_name = re.sub(r'[^\w.-]+', '_', get_view_name(request))
+        file_name = '{}-{}-{}.folded'.format(int(time.time() * 1000),
+                                             os.getpid(), view_name)
+
+        profile_directory = settings.PROFILE_DIR
+        if not os.path.isdir(profile_directory):
+            os.makedirs(profile_directory)
+        with open(os.path.join(profile_directory, file_name), 'w') as output:
+            output.write(profile)
+
+        logger.info('Profiled request. view="%s" path="%s" profile="%s"',
+                    view_name, request.path, file_name)
+        response['X-Profile'] = file_name
+        return response
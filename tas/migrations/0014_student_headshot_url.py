@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def move_headshots_to_content_addressed_names(apps, schema_editor):
+    from tas.headshots import (
+        hash_file,
+        get_headshot_name,
+        is_content_addressed,
+    )
+
+    Student = apps.get_model('tas', 'Student')
+    default_image = 'blank/blank.jpg'
+
+    for student in Student.objects.exclude(headshot=default_image):
+        name = student.headshot.name
+        if name and not is_content_addressed(name):
+            try:
+                with default_storage.open(name) as headshot:
+                    new_name = get_headshot_name(hash_file(headshot))
+                    if not default_storage.exists(new_name):
+                        headshot.seek(0)
+                        default_storage.save(new_name, headshot)
+                student.headshot = new_name
+            except (IOError, OSError):
+                logger.exception('Could not move headshot. student=%s '
+                                 'headshot=%s', student.pk, name)
+
+        student.headshot_url = default_storage.url(student.headshot.name)
+        student.save(update_fields=['headshot', 'headshot_url'])
+
+    Student.objects.filter(headshot=default_image).update(
+        headshot_url=default_storage.url(default_image)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tas', '0013_create_course_request_ttl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='headshot_url',
+            field=models.CharField(blank=True, editable=False, help_text=b'The URL of the headshot. Kept up to date on save.', max_length=255),
+        ),
+        migrations.RunPython(move_headshots_to_content_addressed_names,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index the case-insensitive form of CustomUser.email.
+
+    On postgres `email__iexact` compiles to UPPER("email"::text), which the
+    plain unique index on email can't serve. The expression here has to
+    match that exactly for the planner to use it.
+    """
+
+    dependencies = [
+        ('tas', '0014_student_headshot_url'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX tas_customuser_email_upper '
+            'ON tas_customuser (UPPER(email::text));',
+            'DROP INDEX tas_customuser_email_upper;',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Record who checked out a request, and index the requests TAs can
+    still claim in the order they're claimed in.
+    """
+
+    dependencies = [
+        ('tas', '0015_customuser_email_upper_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='checked_out_by',
+            field=models.ForeignKey(blank=True, help_text='The TA working on the request', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='requests_checked_out', to='tas.Student'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX tas_request_claimable '
+            'ON tas_request (course_id, when_asked, id) '
+            'WHERE NOT cancelled AND NOT solved AND NOT checked_out;',
+            'DROP INDEX tas_request_claimable;',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tas', '0016_request_checked_out_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped on every save. Used to detect conflicting updates.'),
+        ),
+    ]
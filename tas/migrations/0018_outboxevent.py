@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tas', '0017_request_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_type', models.CharField(help_text='The type of the packet', max_length=50)),
+                ('data', models.TextField(blank=True, help_text='The JSON encoded data of the packet')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='When the message was queued')),
+                ('delivered_at', models.DateTimeField(blank=True, help_text='When the message was published', null=True)),
+            ],
+        ),
+        # The relay only ever looks for undelivered messages
+        migrations.RunSQL(
+            'CREATE INDEX tas_outboxevent_undelivered '
+            'ON tas_outboxevent (id) WHERE delivered_at IS NULL;',
+            'DROP INDEX tas_outboxevent_undelivered;',
+        ),
+    ]
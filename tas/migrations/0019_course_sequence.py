@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tas', '0018_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="The sequence number of the last change to the course's requests, office hours or TAs"),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='course_pk',
+            field=models.IntegerField(blank=True, help_text='The course the message is about', null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='sequence',
+            field=models.PositiveIntegerField(blank=True, help_text="The course's sequence number for the change", null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='outboxevent',
+            index_together=set([('course_pk', 'sequence')]),
+        ),
+    ]
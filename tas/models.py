@@ -1,17 +1,20 @@
 import logging
 import hashlib
 
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
 
 from imagekit.models import ProcessedImageField
 from imagekit.processors import ResizeToFit
 
+from . import live_queue, school_cache, shifts
+from .backends import invalidate_cached_users
 from .custom_user import CustomUser
+from .domains import school_domain_index, get_school_id_for_email
 from .utils import get_school_admin_group_name
 
 logger = logging.getLogger(__name__)
@@ -53,6 +56,12 @@ class SchoolEmailDomain(models.Model):
         return '{} - {}'.format(self.school.name, self.domain)
 
 
+@receiver(post_save, sender=SchoolEmailDomain)
+@receiver(post_delete, sender=SchoolEmailDomain)
+def invalidate_school_domain_index(**kwargs):
+    school_domain_index.invalidate()
+
+
 class Course(models.Model):
     """ A Course is the representation of an academic course.
         Requests and TAs are associated with courses.
@@ -77,6 +86,12 @@ class Course(models.Model):
         default=3,
         help_text='The time until a request for a course times out'
     )
+    sequence = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='The sequence number of the last change to the course\'s '
+                  'requests, office hours or TAs'
+    )
 
     def get_identifier(self):
         return '{} {}{}'.format(self.department.title(),
@@ -87,6 +102,19 @@ class Course(models.Model):
         return '{}: {}'.format(self.school.name, self.name)
 
 
+@receiver(post_save, sender=Course)
+def invalidate_live_queue(instance, created, **kwargs):
+    # The time to live decides which requests the queue starts out with
+    if not created:
+        live_queue.course_changed(instance.pk)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_school_cache_for_course(instance, **kwargs):
+    school_cache.school_changed(instance.school_id)
+
+
 def determine_headshot_name(student, filename):
     data = {
         'email': student.user.email,
@@ -131,6 +159,32 @@ class Student(models.Model):
     blurb = models.CharField(max_length=255,
                              help_text="A field for TA bios")
 
+    headshot_url = models.CharField(max_length=255,
+                                    blank=True,
+                                    editable=False,
+                                    help_text='The URL of the headshot. '
+                                              'Kept up to date on save.')
+
+    def save(self, *args, **kwargs):
+        # Resolving the URL here means serializing a student never has to
+        # touch the storage backend.
+        if self.headshot and not self.headshot._committed:
+            # A new upload, like one from the admin, only gets its final
+            # name when the field stores it
+            super(Student, self).save(*args, **kwargs)
+            self.headshot_url = self.headshot.url
+            super(Student, self).save(update_fields=['headshot_url'],
+                                      using=kwargs.get('using'))
+            return
+
+        self.headshot_url = self.headshot.url if self.headshot else ''
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'headshot' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'headshot_url'}
+
+        super(Student, self).save(*args, **kwargs)
+
     def __str__(self):
         return self.user.get_full_name()
 
@@ -142,14 +196,40 @@ class Student(models.Model):
 @receiver(post_save, sender=CustomUser)
 def create_student_profile_for_user(instance, created, **kwargs):
     if created:
-        domain = instance.email.split('@')[-1]
-        try:
-            sed = SchoolEmailDomain.objects.get(domain=domain)
-            Student.objects.get_or_create(user=instance, school=sed.school)
-
-        except SchoolEmailDomain.DoesNotExist:
+        school_id = get_school_id_for_email(instance.email)
+        if school_id is None:
             logger.error('Tried to create a student for the '
-                         'non existent email domain: %s', domain)
+                         'non existent email domain: %s',
+                         instance.email.split('@')[-1])
+            return
+
+        Student.objects.get_or_create(user=instance, school_id=school_id)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(instance, **kwargs):
+    invalidate_cached_users([instance.pk])
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_cached_student_user(instance, **kwargs):
+    invalidate_cached_users([instance.user_id])
+
+
+@receiver(post_save, sender=School)
+def invalidate_school_cache(instance, created, **kwargs):
+    if not created:
+        school_cache.school_changed(instance.pk)
+
+
+@receiver(post_save, sender=School)
+def invalidate_cached_school_users(instance, created, **kwargs):
+    if not created:
+        user_pks = Student.objects.filter(school=instance)\
+            .values_list('user_id', flat=True)
+        invalidate_cached_users(list(user_pks))
 
 
 class TA(models.Model):
@@ -204,6 +284,12 @@ class Request(models.Model):
     checked_out = models.BooleanField(default=False,
                                       help_text='Has a TA started working '
                                                 'on the request?')
+    checked_out_by = models.ForeignKey(Student,
+                                       related_name='requests_checked_out',
+                                       null=True,
+                                       blank=True,
+                                       help_text='The TA working on the '
+                                                 'request')
     solved = models.BooleanField(default=False,
                                  help_text='Has the request been resolved?')
     when_solved = models.DateTimeField(blank=True, null=True,
@@ -219,12 +305,80 @@ class Request(models.Model):
     expired_at = models.DateTimeField(blank=True, null=True,
                                       help_text='When the request was marked '
                                       'as expired')
+    version = models.PositiveIntegerField(default=0,
+                                          editable=False,
+                                          help_text='Bumped on every save. '
+                                                    'Used to detect '
+                                                    'conflicting updates.')
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(Request,
+                                                           instance=self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'version'}
+
+        with transaction.atomic(using=using):
+            # Bump the stored version with the row locked, so writers that
+            # didn't lock it themselves still can't save the same version
+            stored_version = None
+            if self.pk is not None and not kwargs.get('force_insert'):
+                stored_version = Request.objects.using(using)\
+                    .select_for_update().filter(pk=self.pk)\
+                    .values_list('version', flat=True).first()
+            if stored_version is not None:
+                self.version = stored_version
+            self.version += 1
+
+            super(Request, self).save(*args, **kwargs)
 
     def __str__(self):
         return '{0} - Comp {1}'.format(self.requestor.user.get_full_name(),
                                        self.course.number)
 
 
+@receiver(post_save, sender=Request)
+def update_live_queue(instance, **kwargs):
+    live_queue.request_changed(instance)
+
+
+@receiver(post_delete, sender=Request)
+def remove_from_live_queue(instance, **kwargs):
+    live_queue.course_changed(instance.course_id)
+
+
+def update_live_queue_for_student(student_filter, update_fields):
+    """Requests embed the name and headshot of whoever asked them, so
+    refresh the open requests of a student whose profile changed.
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if not live_queue.is_enabled():
+        return
+
+    open_requests = Request.objects.filter(cancelled=False, solved=False,
+                                           expired=False,
+                                           **student_filter)
+    live_queue.request_changed(
+        *open_requests.select_related('requestor__user')
+    )
+
+
+@receiver(post_save, sender=Student)
+def update_live_queue_for_requestor(instance, created, update_fields,
+                                    **kwargs):
+    if not created:
+        update_live_queue_for_student({'requestor': instance}, update_fields)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_live_queue_for_requestor_user(instance, created, update_fields,
+                                         **kwargs):
+    if not created:
+        update_live_queue_for_student({'requestor__user': instance},
+                                      update_fields)
+
+
 class OfficeHour(models.Model):
     """The representation of an office hour.
     It's associated with a course and a TA
@@ -239,3 +393,52 @@ class OfficeHour(models.Model):
                            help_text='The TA on duty')
     location = models.CharField(max_length=255,
                                 help_text='The home base of the TA')
+
+
+@receiver(post_save, sender=OfficeHour)
+def schedule_shift_end(instance, **kwargs):
+    transaction.on_commit(lambda: shifts.schedule(instance))
+
+
+@receiver(post_delete, sender=OfficeHour)
+def unschedule_shift_end(instance, **kwargs):
+    transaction.on_commit(lambda: shifts.unschedule(instance))
+
+
+@receiver(post_save, sender=TA)
+@receiver(post_delete, sender=TA)
+def announce_ta_roster_change(instance, **kwargs):
+    from .outbox import enqueue_message
+    enqueue_message('tas_changed', {'course': instance.course_id})
+
+
+class OutboxEvent(models.Model):
+    """A WebSocket message waiting to be published.
+
+    Messages are written in the same transaction as the change they're
+    about and published by the `RelayEvents` command once that transaction
+    has committed. See `tas.outbox`.
+    """
+    message_type = models.CharField(max_length=50,
+                                    help_text='The type of the packet')
+    data = models.TextField(blank=True,
+                            help_text='The JSON encoded data of the packet')
+    created = models.DateTimeField(auto_now_add=True,
+                                   help_text='When the message was queued')
+    delivered_at = models.DateTimeField(blank=True, null=True,
+                                        help_text='When the message was '
+                                                  'published')
+    # Not a foreign key, so messages about a course can be queued while it's
+    # being deleted.
+    course_pk = models.IntegerField(blank=True, null=True,
+                                    help_text='The course the message is '
+                                              'about')
+    sequence = models.PositiveIntegerField(blank=True, null=True,
+                                           help_text='The course\'s sequence '
+                                                     'number for the change')
+
+    class Meta:
+        index_together = (('course_pk', 'sequence'),)
+
+    def __str__(self):
+        return '{} #{}'.format(self.message_type, self.pk)
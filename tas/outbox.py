@@ -0,0 +1,176 @@
+"""Publishing WebSocket messages only once the change they're about is
+committed.
+
+Views call `enqueue_message` instead of `publish_message`. That writes an
+`OutboxEvent` in the same transaction as the change and sends a postgres
+NOTIFY, which is only delivered if the transaction commits. The
+`RelayEvents` command listens for those notifications and publishes
+undelivered messages in the order they were queued, in batches, marking
+each batch delivered. Clients can't hear about a request before it can be
+fetched, a failed publish is retried instead of lost, and web requests
+never wait on redis.
+
+Delivery is at least once: if publishing fails part way through a batch,
+the whole batch is sent again.
+"""
+import json
+import logging
+import select
+import time
+from datetime import timedelta
+
+import redis
+
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+from django.utils.timezone import now
+
+from . import school_cache
+from .models import Course, OutboxEvent
+from .utils import publish_message
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'tas_outbox'
+
+# How long the relay waits for a notification before checking the outbox
+# anyway, in seconds
+POLL_INTERVAL = 1.0
+
+# How often delivered messages older than OUTBOX_RETENTION are deleted
+PRUNE_INTERVAL = 60 * 60
+
+
+NEXT_SEQUENCE_SQL = (
+    'UPDATE {course} SET sequence = sequence + 1 WHERE id = %s '
+    'RETURNING sequence, school_id'
+).format(course=Course._meta.db_table)
+
+
+def _next_sequence(course_pk):
+    """Bump the course's sequence number and return it. The row stays locked
+    until the transaction ends, so sequence numbers are committed in order.
+    Returns None if the course doesn't exist (anymore).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(NEXT_SEQUENCE_SQL, [course_pk])
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    sequence, school_id = row
+    # The school payload has the course's sequence number and counts
+    school_cache.school_changed(school_id)
+    return sequence
+
+
+def enqueue_message(message_type, data=None):
+    """Publish a message once the current transaction commits.
+
+    Messages about a course (ones with 'course' in their data) are numbered
+    with the course's next sequence number, which is what
+    `tas.changes.get_changes` works from.
+    """
+    course_pk = data.get('course') if data is not None else None
+    if course_pk is not None:
+        course_pk = int(course_pk)
+
+    with transaction.atomic():
+        sequence = None
+        if course_pk is not None:
+            sequence = _next_sequence(course_pk)
+
+        event = OutboxEvent.objects.create(
+            message_type=message_type,
+            data=json.dumps(data) if data is not None else '',
+            course_pk=course_pk,
+            sequence=sequence
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('NOTIFY {}'.format(NOTIFY_CHANNEL))
+
+    return event
+
+
+def relay_batch(batch_size=100):
+    """Publish the oldest undelivered messages. Returns how many were
+    published.
+    """
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update()
+                      .filter(delivered_at__isnull=True)
+                      .order_by('pk')[:batch_size])
+
+        for event in events:
+            data = json.loads(event.data) if event.data else None
+            if event.sequence is not None:
+                data['seq'] = event.sequence
+            publish_message(event.message_type, data)
+
+        if events:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events])\
+                .update(delivered_at=now())
+
+    return len(events)
+
+
+def relay_pending(batch_size=100):
+    relayed = 0
+    while True:
+        count = relay_batch(batch_size)
+        relayed += count
+        if count < batch_size:
+            return relayed
+
+
+def prune_delivered():
+    retention = getattr(settings, 'OUTBOX_RETENTION', 60 * 60 * 24)
+    cutoff = now() - timedelta(seconds=retention)
+    deleted = OutboxEvent.objects.filter(delivered_at__lt=cutoff).delete()
+    logger.info('Pruned delivered outbox messages. count=%s', deleted[0])
+
+
+def _listen():
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute('LISTEN {}'.format(NOTIFY_CHANNEL))
+    return connection.connection
+
+
+def _wait_for_notification(listener, timeout):
+    # Notifications can already have been read off the socket while relaying,
+    # in which case select wouldn't see them
+    listener.poll()
+    if not listener.notifies:
+        readable, _, _ = select.select([listener], [], [], timeout)
+        if readable:
+            listener.poll()
+    del listener.notifies[:]
+
+
+def run_relay(batch_size=100, should_stop=lambda: False):
+    listener = None
+    last_pruned = 0
+    while not should_stop():
+        try:
+            if listener is None:
+                listener = _listen()
+
+            relayed = relay_pending(batch_size)
+            if relayed:
+                logger.debug('Relayed outbox messages. count=%s', relayed)
+
+            if time.time() - last_pruned > PRUNE_INTERVAL:
+                prune_delivered()
+                last_pruned = time.time()
+
+            _wait_for_notification(listener, POLL_INTERVAL)
+        except redis.RedisError:
+            logger.exception('Failed to relay outbox messages')
+            time.sleep(POLL_INTERVAL)
+        except DatabaseError:
+            logger.exception('Lost the outbox database connection')
+            connection.close()
+            listener = None
+            time.sleep(POLL_INTERVAL)
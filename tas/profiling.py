@@ -0,0 +1,59 @@
+"""A small statistical profiler for profiling a single request.
+
+A background thread looks at the stack of the thread handling the request
+every few milliseconds and counts how often each stack was seen. Nothing is
+hooked into the interpreter, so the request runs at close to full speed.
+The results are written in the "collapsed" format understood by
+flamegraph.pl and speedscope: one `frame;frame;frame count` line per stack.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+
+
+def format_frame(frame):
+    code = frame.f_code
+    filename = code.co_filename
+    # Trim everything up to site-packages or the project so frames stay short
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+
+    return '{} ({}:{})'.format(code.co_name, filename, code.co_firstlineno)
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of `thread_id` every `interval` seconds until
+    `stop` is called.
+    """
+
+    def __init__(self, thread_id, interval):
+        super(StackSampler, self).__init__()
+        self.daemon = True
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(format_frame(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+def render_collapsed(samples):
+    """Format samples as collapsed stacks, most common first."""
+    return ''.join('{} {}\n'.format(stack, count)
+                   for stack, count in samples.most_common())
@@ -0,0 +1,61 @@
+"""Closing many requests at once, like at the end of office hours."""
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from . import live_queue
+from .models import Request
+
+SOLVE = 'solve'
+CANCEL = 'cancel'
+EXPIRE = 'expire'
+ACTIONS = (SOLVE, CANCEL, EXPIRE)
+
+
+def _get_changes(action, ta):
+    if action == SOLVE:
+        return {'solved': True, 'when_solved': now(), 'who_solved': ta}
+    elif action == CANCEL:
+        return {'cancelled': True}
+    elif action == EXPIRE:
+        return {'expired': True, 'expired_at': now()}
+
+    raise ValueError('Unknown action: {}'.format(action))
+
+
+def resolve_requests(course, ta, action, request_ids=None):
+    """Solve, cancel or expire the open requests in `course` with the ids in
+    `request_ids`, or all of them if it's None. Returns the ids of the
+    requests that were changed; ones that were already closed are skipped.
+
+    Requests solved this way don't count towards the course's service time,
+    since nobody spent that long helping them.
+    """
+    changes = _get_changes(action, ta)
+
+    with transaction.atomic():
+        open_requests = Request.objects.select_for_update().filter(
+            course=course,
+            cancelled=False,
+            solved=False,
+            expired=False
+        )
+        if request_ids is not None:
+            open_requests = open_requests.filter(pk__in=request_ids)
+
+        help_requests = list(open_requests.order_by('pk'))
+        resolved_ids = [help_request.pk for help_request in help_requests]
+        if not resolved_ids:
+            return []
+
+        Request.objects.filter(pk__in=resolved_ids)\
+            .update(version=F('version') + 1, **changes)
+
+        # update() doesn't send post_save, so update the live queue here
+        for help_request in help_requests:
+            help_request.version += 1
+            for field, value in changes.items():
+                setattr(help_request, field, value)
+        live_queue.request_changed(*help_requests)
+
+    return resolved_ids
@@ -0,0 +1,109 @@
+"""The part of the school payload that's the same for everyone, kept in
+redis.
+
+`/api/v3/school/` is mostly the school's courses, their counts and the
+school's administrators, none of which depend on who's asking. That shared
+document is built once by `SchoolSerializer`, stored under `school:<id>`
+and served to everyone; the view only adds which courses the viewer is a
+TA for (`am_a_ta`).
+
+The document is dropped whenever something in it changes:
+
+- every message published about a course, through `tas.outbox`, which
+  covers requests, office hours and TAs,
+- saving or deleting a course, and saving the school.
+
+Anything else, like the admin group changing or a request timing out,
+shows up within `settings.SCHOOL_CACHE_TIMEOUT` seconds. A document built
+while the school changes isn't stored, so an invalidation can never be
+overwritten by what was there before it.
+
+Like `tas.live_queue`, this falls back to the database when redis can't be
+reached or `settings.SCHOOL_CACHE_ENABLED` is off.
+"""
+import json
+import logging
+
+import redis
+
+from django.conf import settings
+from django.db import transaction
+
+from .db_router import use_primary
+from .utils import get_redis_connection, redis_key
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return getattr(settings, 'SCHOOL_CACHE_ENABLED', True)
+
+
+def _document_key(school_id):
+    return redis_key('school', school_id)
+
+
+def _generation_key(school_id):
+    return redis_key('school', school_id, 'generation')
+
+
+def build_document(school):
+    """The shared part of the school payload, as JSON."""
+    from .api.serializers import SchoolSerializer
+
+    # Built from the primary, since a stale document would be kept until
+    # the next change
+    with use_primary():
+        return json.dumps(SchoolSerializer(school).data)
+
+
+def get_document(school):
+    """Returns the shared part of the school payload as JSON, building it
+    if it isn't cached.
+    """
+    if not is_enabled():
+        return build_document(school)
+
+    try:
+        connection = get_redis_connection()
+        document = connection.get(_document_key(school.pk))
+        if document is not None:
+            return document.decode('utf-8')
+
+        with connection.pipeline(transaction=True) as pipeline:
+            # Don't store the document if the school changes while it's
+            # being built
+            pipeline.watch(_generation_key(school.pk))
+            document = build_document(school)
+            pipeline.multi()
+            pipeline.setex(_document_key(school.pk),
+                           settings.SCHOOL_CACHE_TIMEOUT, document)
+            try:
+                pipeline.execute()
+            except redis.WatchError:
+                pass
+            return document
+    except redis.RedisError:
+        logger.exception('Failed to read the school cache. school=%s',
+                         school.pk)
+        return build_document(school)
+
+
+def invalidate(school_ids):
+    try:
+        pipeline = get_redis_connection().pipeline(transaction=True)
+        for school_id in school_ids:
+            pipeline.incr(_generation_key(school_id))
+            pipeline.delete(_document_key(school_id))
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('Failed to invalidate the school cache. '
+                         'schools=%s', school_ids)
+
+
+def school_changed(*school_ids):
+    """Drop the cached documents of `school_ids` once the current
+    transaction commits.
+    """
+    if is_enabled():
+        transaction.on_commit(lambda: invalidate(school_ids))
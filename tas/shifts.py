@@ -0,0 +1,154 @@
+"""Telling clients when TAs go off duty.
+
+Office hours end on their own when `end_time` passes, without anything
+being saved. So that clients don't have to poll for TAs disappearing, every
+office hour that's still going is kept in a redis sorted set scored by when
+it ends. The `EndShifts` command runs `run_scheduler`, which sleeps until
+the next shift is due and queues `off_duty` (see `tas.outbox`) for every
+shift that has ended since it last woke up.
+
+Due shifts are taken off the set by a script, so each one is queued exactly
+once even with several schedulers running.
+"""
+import logging
+import time
+
+import redis
+
+from django.db import close_old_connections, transaction, DatabaseError
+from django.utils.timezone import now
+
+from .utils import get_redis_connection, redis_key, to_timestamp
+
+logger = logging.getLogger(__name__)
+
+# The longest the scheduler sleeps for, which is also the longest it takes
+# to notice a shift that was scheduled while it was asleep.
+MAX_SLEEP = 1.0
+
+# Returns up to ARGV[2] members scored at or before ARGV[1] and removes them
+_POP_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1],
+                       'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+_pop_due_script = None
+
+
+def _shift_ends_key():
+    return redis_key('shift_ends')
+
+
+def _member(office_hour):
+    return '{}:{}'.format(office_hour.course_id, office_hour.pk)
+
+
+def _get_pop_due_script():
+    global _pop_due_script
+    if _pop_due_script is None:
+        _pop_due_script = get_redis_connection().register_script(_POP_DUE)
+    return _pop_due_script
+
+
+def schedule(office_hour):
+    """Make sure `off_duty` is published when `office_hour` ends.
+
+    Shifts that have already ended are taken off the schedule. Whoever ended
+    them early (see `OfficeHourViewSet.destroy`) publishes `off_duty`.
+    """
+    try:
+        connection = get_redis_connection()
+        if office_hour.end_time > now():
+            connection.zadd(_shift_ends_key(),
+                            to_timestamp(office_hour.end_time),
+                            _member(office_hour))
+        else:
+            connection.zrem(_shift_ends_key(), _member(office_hour))
+    except redis.RedisError:
+        logger.exception('Failed to schedule the end of a shift. '
+                         'office_hour=%s', office_hour.pk)
+
+
+def unschedule(office_hour):
+    try:
+        get_redis_connection().zrem(_shift_ends_key(), _member(office_hour))
+    except redis.RedisError:
+        logger.exception('Failed to unschedule the end of a shift. '
+                         'office_hour=%s', office_hour.pk)
+
+
+def schedule_all():
+    """Schedule every office hour that's still going, for when redis has
+    lost track of them.
+    """
+    from .models import OfficeHour
+
+    office_hours = OfficeHour.objects.filter(end_time__gt=now())
+    pipeline = get_redis_connection().pipeline(transaction=False)
+    for office_hour in office_hours:
+        pipeline.zadd(_shift_ends_key(), to_timestamp(office_hour.end_time),
+                      _member(office_hour))
+    pipeline.execute()
+
+
+def end_due_shifts(batch_size=100):
+    """Queue `off_duty` for every shift that has ended. Returns how many
+    there were.
+    """
+    from .outbox import enqueue_message
+
+    ended = 0
+    until = time.time()
+    while True:
+        due = _get_pop_due_script()(keys=[_shift_ends_key()],
+                                    args=[until, batch_size],
+                                    client=get_redis_connection())
+        try:
+            with transaction.atomic():
+                for member in due:
+                    course_pk, office_hour_pk = \
+                        member.decode('utf-8').split(':')
+                    enqueue_message('off_duty', {
+                        'course': int(course_pk),
+                        'id': int(office_hour_pk),
+                    })
+        except DatabaseError:
+            # Put them back so the next run picks them up
+            pipeline = get_redis_connection().pipeline(transaction=False)
+            for member in due:
+                pipeline.zadd(_shift_ends_key(), until, member)
+            pipeline.execute()
+            raise
+
+        ended += len(due)
+        if len(due) < batch_size:
+            return ended
+
+
+def seconds_until_next_shift_ends():
+    """How long until the next scheduled shift ends, up to MAX_SLEEP."""
+    upcoming = get_redis_connection().zrange(_shift_ends_key(), 0, 0,
+                                             withscores=True)
+    if not upcoming:
+        return MAX_SLEEP
+
+    _, ends_at = upcoming[0]
+    return min(max(ends_at - time.time(), 0), MAX_SLEEP)
+
+
+def run_scheduler(should_stop=lambda: False):
+    schedule_all()
+    while not should_stop():
+        try:
+            ended = end_due_shifts()
+            if ended:
+                logger.info('Ended shifts. count=%s', ended)
+            time.sleep(seconds_until_next_shift_ends())
+        except (redis.RedisError, DatabaseError):
+            logger.exception('Failed to end shifts')
+            close_old_connections()
+            time.sleep(MAX_SLEEP)
@@ -1,8 +1,38 @@
 from __future__ import absolute_import
 from celery import shared_task
 import logging
+import os
 import redis
 
+from .headshots import process_headshot
+
 logger = logging.getLogger(__name__)
 
 POOL = redis.ConnectionPool(host='localhost', db=0)
+
+
+@shared_task
+def process_uploaded_headshot(student_pk, spooled_path):
+    from .models import Student
+
+    try:
+        headshot_name = process_headshot(spooled_path)
+    except IOError:
+        logger.exception('Failed to process headshot. student=%s path=%s',
+                         student_pk, spooled_path)
+        return
+    finally:
+        if os.path.exists(spooled_path):
+            os.remove(spooled_path)
+
+    try:
+        student = Student.objects.get(pk=student_pk)
+    except Student.DoesNotExist:
+        logger.warning('Processed a headshot for a missing student. '
+                       'student=%s', student_pk)
+        return
+
+    # Assigning the name (rather than a file) skips the field's own
+    # processing, which has already been done above.
+    student.headshot = headshot_name
+    student.save(update_fields=['headshot'])
@@ -38,3 +38,22 @@ class TestRequest(object):
         # more fragile
         with pytest.raises(BadDataError):
             G(Request, where_located=location)
+
+    @pytest.mark.django_db
+    def test_version_is_bumped_from_the_stored_version(self):
+        from tas.models import Request
+        request = G(Request)
+        assert request.version == 1
+
+        # Two writers that loaded the same version, neither locking the row
+        first = Request.objects.get(pk=request.pk)
+        second = Request.objects.get(pk=request.pk)
+        first.checked_out = True
+        first.save()
+        second.solved = True
+        second.save(update_fields=['solved'])
+
+        assert first.version == 2
+        assert second.version == 3
+        request.refresh_from_db()
+        assert request.version == 3
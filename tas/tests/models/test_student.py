@@ -55,3 +55,53 @@ class TestStudent(object):
         user = G(CustomUser, email='does_not_exist')
 
         assert not Student.objects.filter(user=user).exists()
+
+    @pytest.mark.django_db
+    def test_headshot_url_is_precomputed(self):
+        from tas.models import Student
+        student = G(Student)
+
+        assert student.headshot_url == student.headshot.url
+
+    @pytest.mark.django_db
+    def test_headshot_url_follows_update_fields(self):
+        from tas.models import Student
+        student = G(Student)
+
+        student.headshot = 'headshots/{}/thumbnail.jpg'.format('a' * 40)
+        student.save(update_fields=['headshot'])
+        student.refresh_from_db()
+
+        assert student.headshot_url == student.headshot.url
+
+    @pytest.mark.django_db
+    def test_headshot_url_of_new_upload(self, settings, tmpdir):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.storage import FileSystemStorage
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from tas.models import Student
+
+        settings.MEDIA_ROOT = str(tmpdir)
+        storage = FileSystemStorage(location=settings.MEDIA_ROOT)
+        output = BytesIO()
+        Image.new('RGB', (200, 200), 'red').save(output, 'JPEG')
+        student = G(Student)
+
+        with mock.patch.object(Student._meta.get_field('headshot'),
+                               'storage', storage):
+            student.headshot = SimpleUploadedFile('photo.jpg',
+                                                  output.getvalue())
+            student.save()
+            student.refresh_from_db()
+
+            assert student.headshot.name.startswith('headshots/')
+            assert student.headshot_url == student.headshot.url
+
+    @pytest.mark.django_db
+    def test_student_created_for_subdomain(self):
+        from tas.models import CustomUser, SchoolEmailDomain, Student
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+        user = G(CustomUser, email='email@cs.tufts.edu')
+
+        assert Student.objects.get(user=user).school == sed.school
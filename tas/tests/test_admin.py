@@ -0,0 +1,68 @@
+import mock
+import pytest
+from django_dynamic_fixture import G
+
+
+class TestAdminSchoolScope(object):
+
+    def test_superuser_is_not_filtered(self):
+        from tas.admin import AdminSchoolScope
+
+        user = mock.Mock(is_superuser=True)
+        queryset = mock.Mock()
+
+        scope = AdminSchoolScope(user)
+
+        assert scope.filter(queryset) is queryset
+        assert not queryset.filter.called
+
+    @mock.patch('tas.admin.get_administered_school_ids')
+    def test_filters_by_school_id(self, get_administered_school_ids):
+        from tas.admin import AdminSchoolScope
+
+        get_administered_school_ids.return_value = [1, 2]
+        user = mock.Mock(is_superuser=False)
+        queryset = mock.Mock()
+
+        scope = AdminSchoolScope(user)
+        scope.filter(queryset, 'course__school')
+
+        queryset.filter.assert_called_once_with(
+            course__school__in=frozenset([1, 2])
+        )
+
+    @mock.patch('tas.admin.get_administered_school_ids')
+    def test_resolved_once_per_request(self, get_administered_school_ids):
+        from tas.admin import AdminSchoolScope
+
+        get_administered_school_ids.return_value = []
+        request = mock.Mock(spec=['user'])
+        request.user = mock.Mock(is_superuser=False)
+
+        first = AdminSchoolScope.for_request(request)
+        second = AdminSchoolScope.for_request(request)
+
+        assert first is second
+        assert get_administered_school_ids.call_count == 1
+
+    @pytest.mark.django_db
+    def test_course_admin_only_shows_my_schools(self, rf):
+        from django.contrib import admin
+        from django.contrib.auth.models import Group
+        from tas.admin import CourseAdmin
+        from tas.models import Course, School, Student
+        from tas.utils import get_school_admin_group_name
+
+        school = G(School)
+        course = G(Course, school=school)
+        G(Course, school=G(School))
+
+        student = G(Student, school=school)
+        group_name = get_school_admin_group_name(school.name)
+        student.user.groups.add(Group.objects.get(name=group_name))
+
+        request = rf.get('/admin/tas/course/')
+        request.user = student.user
+
+        course_admin = CourseAdmin(Course, admin.site)
+        assert list(course_admin.get_queryset(request)) == [course]
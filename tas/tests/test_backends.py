@@ -0,0 +1,163 @@
+import pickle
+
+import mock
+import pytest
+import redis
+from django_dynamic_fixture import G
+
+
+@mock.patch('tas.backends.get_redis_connection')
+class TestStudentProfileBackend(object):
+
+    @pytest.mark.django_db
+    def test_loads_student_and_school(self, get_redis_connection):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.backends import StudentProfileBackend
+        from tas.models import Student
+
+        get_redis_connection.return_value.get.return_value = None
+        student = G(Student)
+
+        backend = StudentProfileBackend()
+        with CaptureQueriesContext(connection) as queries:
+            user = backend.get_user(student.user.pk)
+            assert user.student.school == student.school
+
+        assert len(queries) == 1
+
+    @pytest.mark.django_db
+    def test_caches_user(self, get_redis_connection):
+        from tas.backends import StudentProfileBackend, get_user_cache_key
+        from tas.models import Student
+
+        redis_client = get_redis_connection.return_value
+        redis_client.get.return_value = None
+        student = G(Student)
+
+        StudentProfileBackend().get_user(student.user.pk)
+
+        key, _, value = redis_client.setex.call_args[0]
+        assert key == get_user_cache_key(student.user.pk)
+        assert pickle.loads(value) == student.user
+
+    @pytest.mark.django_db
+    def test_uses_cached_user(self, get_redis_connection):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.backends import StudentProfileBackend
+        from tas.models import CustomUser, Student
+
+        student = G(Student)
+        user = CustomUser.objects.select_related('student__school')\
+            .get(pk=student.user.pk)
+        get_redis_connection.return_value.get.return_value = \
+            pickle.dumps(user, pickle.HIGHEST_PROTOCOL)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached_user = StudentProfileBackend().get_user(user.pk)
+            assert cached_user.student.school == student.school
+
+        assert len(queries) == 0
+
+    @pytest.mark.django_db
+    def test_redis_down_falls_back_to_database(self, get_redis_connection):
+        from tas.backends import StudentProfileBackend
+        from tas.models import Student
+
+        redis_client = get_redis_connection.return_value
+        redis_client.get.side_effect = redis.ConnectionError
+        redis_client.setex.side_effect = redis.ConnectionError
+        student = G(Student)
+
+        assert StudentProfileBackend().get_user(student.user.pk) == \
+            student.user
+
+    @pytest.mark.django_db
+    def test_user_does_not_exist(self, get_redis_connection):
+        from tas.backends import StudentProfileBackend
+
+        get_redis_connection.return_value.get.return_value = None
+
+        assert StudentProfileBackend().get_user(-1) is None
+
+
+@mock.patch('tas.models.invalidate_cached_users')
+class TestCachedUserInvalidation(object):
+
+    @pytest.mark.django_db
+    def test_invalidated_on_profile_change(self, invalidate_cached_users):
+        from tas.models import Student
+
+        student = G(Student)
+        invalidate_cached_users.reset_mock()
+
+        student.blurb = 'A new blurb'
+        student.save()
+
+        invalidate_cached_users.assert_called_once_with([student.user.pk])
+
+    @pytest.mark.django_db
+    def test_invalidated_on_school_change(self, invalidate_cached_users):
+        from tas.models import Student
+
+        student = G(Student)
+        invalidate_cached_users.reset_mock()
+
+        student.school.max_course_count += 1
+        student.school.save()
+
+        invalidate_cached_users.assert_called_once_with([student.user.pk])
+
+
+class TestStudentProfileBackendAuthenticate(object):
+
+    @pytest.fixture
+    def user(self):
+        from tas.models import Student
+
+        user = G(Student).user
+        user.set_password('password')
+        user.save()
+        return user
+
+    @pytest.mark.django_db
+    def test_email_is_not_case_sensitive(self, user):
+        from tas.backends import StudentProfileBackend
+
+        backend = StudentProfileBackend()
+
+        assert backend.authenticate(email=user.email.upper(),
+                                    password='password') == user
+
+    @pytest.mark.django_db
+    def test_wrong_password(self, user):
+        from tas.backends import StudentProfileBackend
+
+        backend = StudentProfileBackend()
+
+        assert backend.authenticate(email=user.email,
+                                    password='wrong') is None
+
+    @pytest.mark.django_db
+    def test_unknown_email(self):
+        from tas.backends import StudentProfileBackend
+
+        backend = StudentProfileBackend()
+
+        assert backend.authenticate(email='nobody@example.com',
+                                    password='password') is None
+
+    @pytest.mark.django_db
+    def test_resolved_user_is_not_looked_up_again(self, user):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.backends import StudentProfileBackend
+
+        backend = StudentProfileBackend()
+
+        with CaptureQueriesContext(connection) as queries:
+            assert backend.authenticate(user=user, password='password') == \
+                user
+
+        assert len(queries) == 0
@@ -0,0 +1,144 @@
+import pytest
+from django_dynamic_fixture import G
+from rest_framework.test import APIClient
+
+
+class TestChanges(object):
+
+    @pytest.mark.django_db
+    def test_sequence_numbers(self):
+        from tas.models import Course, OutboxEvent
+        from tas.outbox import enqueue_message
+
+        course = G(Course)
+        enqueue_message('request_created', {'course': course.pk, 'id': 1})
+        enqueue_message('on_duty', {'course': str(course.pk), 'id': 2})
+        enqueue_message('heartbeat')
+
+        course.refresh_from_db()
+        assert course.sequence == 2
+        events = OutboxEvent.objects.order_by('pk')
+        assert [(event.course_pk, event.sequence) for event in events] == \
+            [(course.pk, 1), (course.pk, 2), (None, None)]
+
+    @pytest.mark.django_db
+    def test_collapses_changes(self):
+        from tas.changes import get_changes
+        from tas.models import Course
+        from tas.outbox import enqueue_message
+
+        course = G(Course)
+        enqueue_message('request_created', {'course': course.pk, 'id': 1})
+        enqueue_message('request_created', {'course': course.pk, 'id': 2})
+        enqueue_message('request_updated', {'course': course.pk, 'id': 2})
+        enqueue_message('requests_removed', {'course': course.pk,
+                                             'ids': [3, 4]})
+        enqueue_message('off_duty', {'course': course.pk, 'id': 5})
+        enqueue_message('request_created', {'course': G(Course).pk, 'id': 6})
+
+        changes = get_changes(course.pk, 1)
+        assert changes.sequence == 5
+        assert changes.request_ids == {2, 3, 4}
+        assert changes.office_hour_ids == {5}
+        assert not changes.tas_changed
+
+        assert get_changes(course.pk, 5).request_ids == set()
+
+    @pytest.mark.django_db
+    def test_snapshot_instead(self, settings):
+        from tas.changes import get_changes
+        from tas.models import Course, OutboxEvent
+        from tas.outbox import enqueue_message
+
+        settings.DELTA_SYNC_MAX_CHANGES = 3
+        course = G(Course)
+        for index in range(5):
+            enqueue_message('request_created', {'course': course.pk,
+                                                'id': index})
+
+        assert get_changes(course.pk, 6) is None
+        assert get_changes(course.pk, 1) is None
+        assert get_changes(course.pk, 2) is not None
+
+        OutboxEvent.objects.filter(sequence=4).delete()
+        assert get_changes(course.pk, 2) is None
+
+    @pytest.mark.django_db
+    def test_ta_roster_changes(self):
+        from tas.changes import get_changes
+        from tas.models import Course, TA
+
+        course = G(Course)
+        ta = G(TA, course=course)
+
+        assert get_changes(course.pk, 0).tas_changed
+        ta.delete()
+        assert get_changes(course.pk, 1).tas_changed
+
+
+class TestChangesView(object):
+
+    def get(self, student, course, since=None):
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/changes/'.format(course.pk)
+        params = {'since': since} if since is not None else {}
+        return client.get(url, params)
+
+    @pytest.mark.django_db
+    def test_snapshot(self):
+        from tas.models import Course, Request, Student, TA
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        help_request = G(Request, course=course)
+        G(Request, course=course, solved=True)
+        G(TA, course=course, student=G(Student, school=student.school))
+
+        response = self.get(student, course)
+
+        assert response.status_code == 200
+        assert response.data['snapshot']
+        assert response.data['sequence'] == 1
+        assert [row['id'] for row in response.data['requests']] == \
+            [help_request.pk]
+        assert len(response.data['tas']) == 1
+
+    @pytest.mark.django_db
+    def test_delta(self):
+        from tas.models import Course, Request, Student
+        from tas.outbox import enqueue_message
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        G(Request, course=course)
+        created = G(Request, course=course)
+        solved = G(Request, course=course, solved=True)
+        enqueue_message('request_created', {'course': course.pk,
+                                            'id': created.pk})
+        enqueue_message('request_removed', {'course': course.pk,
+                                            'id': solved.pk})
+
+        response = self.get(student, course, since=0)
+
+        assert not response.data['snapshot']
+        assert response.data['sequence'] == 2
+        assert [row['id'] for row in response.data['requests']] == \
+            [created.pk]
+        assert response.data['removed_requests'] == [solved.pk]
+        assert response.data['tas'] is None
+
+    @pytest.mark.django_db
+    def test_other_schools(self):
+        from tas.models import Course, Student
+
+        response = self.get(G(Student), G(Course))
+        assert response.status_code == 404
+
+    @pytest.mark.django_db
+    def test_invalid_since(self):
+        from tas.models import Course, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        assert self.get(student, course, since='soon').status_code == 400
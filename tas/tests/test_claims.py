@@ -0,0 +1,140 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from django.utils.timezone import now
+from django_dynamic_fixture import G
+
+
+class TestClaimNextRequest(object):
+
+    @pytest.mark.django_db
+    def test_claims_oldest_open_request(self):
+        from tas.claims import claim_next_request
+        from tas.models import Course, Request, Student
+
+        course = G(Course, request_time_to_live=0)
+        ta = G(Student)
+        G(Request, course=course, solved=True)
+        G(Request, course=course, cancelled=True)
+        G(Request, course=course, checked_out=True)
+        oldest = G(Request, course=course)
+        newest = G(Request, course=course)
+        G(Request)
+
+        claimed = claim_next_request(course, ta)
+        assert claimed == oldest
+        oldest.refresh_from_db()
+        assert oldest.checked_out
+        assert oldest.checked_out_by == ta
+
+        assert claim_next_request(course, ta) == newest
+        assert claim_next_request(course, ta) is None
+
+    @pytest.mark.django_db
+    def test_skips_expired_requests(self):
+        from tas.claims import claim_next_request
+        from tas.models import Course, Request, Student
+
+        course = G(Course, request_time_to_live=1)
+        expired = G(Request, course=course)
+        Request.objects.filter(pk=expired.pk)\
+            .update(when_asked=now() - timedelta(hours=2))
+
+        assert claim_next_request(course, G(Student)) is None
+
+    @pytest.mark.django_db(transaction=True)
+    def test_skips_requests_being_claimed(self):
+        from django.db import connection, transaction
+        from tas.claims import claim_next_request
+        from tas.models import Course, Request, Student
+
+        course = G(Course, request_time_to_live=0)
+        oldest = G(Request, course=course)
+        next_oldest = G(Request, course=course)
+
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(Request.objects.select_for_update()
+                         .filter(pk=oldest.pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            assert locked.wait(10)
+            assert claim_next_request(course, G(Student)) == next_oldest
+        finally:
+            release.set()
+            holder.join()
+
+
+class TestClaimView(object):
+
+    def claim(self, student, course):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/claim/'.format(course.pk)
+        return client.post(url)
+
+    @pytest.mark.django_db
+    def test_claim(self):
+        from tas.models import Course, Request, Student, TA
+
+        ta = G(Student)
+        course = G(Course, school=ta.school, request_time_to_live=0)
+        G(TA, student=ta, course=course, active=True)
+        help_request = G(Request, course=course)
+
+        response = self.claim(ta, course)
+        assert response.status_code == 200
+        assert response.data['id'] == help_request.pk
+        assert response.data['checked_out']
+
+        assert self.claim(ta, course).status_code == 204
+
+    @pytest.mark.django_db
+    def test_only_tas_can_claim(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+        help_request = G(Request, course=course)
+
+        assert self.claim(student, course).status_code == 403
+        help_request.refresh_from_db()
+        assert not help_request.checked_out
+
+
+class TestExpiredRequests(object):
+
+    @pytest.mark.django_db
+    def test_left_out_of_list_but_still_retrievable(self):
+        from rest_framework.test import APIClient
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        open_request = G(Request, course=course, requestor=student)
+        expired_request = G(Request, course=course, requestor=student,
+                            expired=True)
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/'.format(course.pk)
+
+        response = client.get(url)
+        assert [r['id'] for r in response.data] == [open_request.pk]
+
+        response = client.get('{}{}/'.format(url, expired_request.pk))
+        assert response.status_code == 200
+        assert response.data['expired']
@@ -0,0 +1,126 @@
+import time
+
+import mock
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+
+@pytest.fixture
+def replica(settings):
+    settings.REPLICA_DATABASE = 'replica'
+    settings.REPLICA_STICKY_SECONDS = 10
+    return 'replica'
+
+
+@pytest.yield_fixture
+def unpinned():
+    from tas.db_router import set_pinned
+
+    set_pinned(False)
+    yield
+    set_pinned(False)
+
+
+@pytest.mark.usefixtures('unpinned')
+class TestReplicaRouter(object):
+
+    def test_no_replica(self, settings):
+        from tas.db_router import ReplicaRouter
+
+        settings.REPLICA_DATABASE = None
+        router = ReplicaRouter()
+        assert router.db_for_read(None) == 'default'
+        assert router.db_for_write(None) == 'default'
+
+    def test_reads_from_replica(self, replica):
+        from tas.db_router import ReplicaRouter
+
+        router = ReplicaRouter()
+        assert router.db_for_read(None) == 'replica'
+        assert router.db_for_write(None) == 'default'
+
+    def test_use_primary(self, replica):
+        from tas.db_router import ReplicaRouter, is_pinned, use_primary
+
+        router = ReplicaRouter()
+        with use_primary():
+            with use_primary():
+                assert router.db_for_read(None) == 'default'
+            assert is_pinned()
+        assert router.db_for_read(None) == 'replica'
+
+    def test_reads_in_transactions_use_primary(self, replica):
+        from tas.db_router import ReplicaRouter
+
+        primary = mock.Mock(in_atomic_block=True)
+        with mock.patch('tas.db_router.connections', {'default': primary}):
+            assert ReplicaRouter().db_for_read(None) == 'default'
+
+    def test_never_migrates_replica(self, replica):
+        from tas.db_router import ReplicaRouter
+
+        router = ReplicaRouter()
+        assert router.allow_migrate('replica', 'tas') is False
+        assert router.allow_migrate('default', 'tas') is None
+
+
+@pytest.mark.usefixtures('unpinned')
+class TestReplicaStickinessMiddleware(object):
+
+    def make_request(self, method, session):
+        request = getattr(RequestFactory(), method)('/api/v3/school/')
+        request.session = session
+        return request
+
+    def test_writes_stick_to_primary(self, replica):
+        from tas.db_router import (ReplicaStickinessMiddleware,
+                                   STICKY_SESSION_KEY, is_pinned)
+
+        middleware = ReplicaStickinessMiddleware()
+        session = {}
+
+        request = self.make_request('get', session)
+        middleware.process_request(request)
+        assert not is_pinned()
+        middleware.process_response(request, HttpResponse())
+
+        request = self.make_request('post', session)
+        middleware.process_request(request)
+        assert is_pinned()
+        middleware.process_response(request, HttpResponse(status=201))
+        assert not is_pinned()
+        assert session[STICKY_SESSION_KEY] > time.time()
+
+        request = self.make_request('get', session)
+        middleware.process_request(request)
+        assert is_pinned()
+        middleware.process_response(request, HttpResponse())
+
+        session[STICKY_SESSION_KEY] = time.time() - 1
+        request = self.make_request('get', session)
+        middleware.process_request(request)
+        assert not is_pinned()
+
+    def test_failed_writes_dont_stick(self, replica):
+        from tas.db_router import ReplicaStickinessMiddleware
+
+        middleware = ReplicaStickinessMiddleware()
+        session = {}
+
+        request = self.make_request('patch', session)
+        middleware.process_request(request)
+        middleware.process_response(request, HttpResponse(status=409))
+        assert session == {}
+
+    def test_no_replica(self, settings):
+        from tas.db_router import ReplicaStickinessMiddleware
+
+        settings.REPLICA_DATABASE = None
+        middleware = ReplicaStickinessMiddleware()
+        session = {}
+
+        request = self.make_request('post', session)
+        middleware.process_request(request)
+        middleware.process_response(request, HttpResponse(status=201))
+        assert session == {}
@@ -0,0 +1,103 @@
+import mock
+import pytest
+from django_dynamic_fixture import G
+
+
+class TestSchoolDomainIndex(object):
+
+    @pytest.mark.django_db
+    def test_exact_domain(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+
+        assert get_school_id_for_email('a@tufts.edu') == sed.school.pk
+
+    @pytest.mark.django_db
+    def test_is_not_case_sensitive(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+
+        assert get_school_id_for_email('a@Tufts.EDU') == sed.school.pk
+
+    @pytest.mark.django_db
+    def test_subdomain_uses_parent_domain(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+
+        assert get_school_id_for_email('a@cs.tufts.edu') == sed.school.pk
+
+    @pytest.mark.django_db
+    def test_most_specific_domain_wins(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        G(SchoolEmailDomain, domain='tufts.edu')
+        cs = G(SchoolEmailDomain, domain='cs.tufts.edu')
+
+        assert get_school_id_for_email('a@cs.tufts.edu') == cs.school.pk
+
+    @pytest.mark.django_db
+    def test_suffix_must_match_whole_labels(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        G(SchoolEmailDomain, domain='tufts.edu')
+
+        assert get_school_id_for_email('a@nottufts.edu') is None
+        assert get_school_id_for_email('a@edu') is None
+
+    @pytest.mark.django_db
+    def test_resolves_without_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+        get_school_id_for_email('a@tufts.edu')
+
+        with CaptureQueriesContext(connection) as queries:
+            assert get_school_id_for_email('b@tufts.edu') == sed.school.pk
+
+        assert len(queries) == 0
+
+    @pytest.mark.django_db
+    def test_invalidated_when_domain_changes(self):
+        from tas.domains import get_school_id_for_email
+        from tas.models import SchoolEmailDomain
+
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+        assert get_school_id_for_email('a@tufts.edu') == sed.school.pk
+
+        sed.delete()
+
+        assert get_school_id_for_email('a@tufts.edu') is None
+
+    @pytest.mark.django_db
+    def test_rebuilt_after_ttl(self, settings):
+        from tas.domains import school_domain_index
+        from tas.models import SchoolEmailDomain
+
+        settings.SCHOOL_DOMAIN_INDEX_TTL = 60
+        sed = G(SchoolEmailDomain, domain='tufts.edu')
+
+        with mock.patch('tas.domains.time') as time:
+            time.time.return_value = 1000
+            school_domain_index.resolve('tufts.edu')
+
+            # Simulate another process changing the domain. update() doesn't
+            # send signals, so this process isn't told about it.
+            SchoolEmailDomain.objects.filter(pk=sed.pk)\
+                .update(domain='other.edu')
+
+            time.time.return_value = 1030
+            assert school_domain_index.resolve('tufts.edu') == sed.school.pk
+
+            time.time.return_value = 1061
+            assert school_domain_index.resolve('tufts.edu') is None
@@ -0,0 +1,151 @@
+import json
+
+import mock
+import pytest
+from django_dynamic_fixture import G
+
+
+def packet(message_type, data):
+    return json.dumps({'type': message_type, 'data': data})
+
+
+@pytest.yield_fixture
+def hub():
+    from tas.event_stream import EventHub
+
+    with mock.patch.object(EventHub, '_ensure_subscribed'):
+        yield EventHub()
+
+
+class TestEventStream(object):
+
+    def test_format_event(self):
+        from tas.event_stream import format_event
+
+        event = format_event({'type': 'request_created',
+                              'data': {'course': 1, 'seq': 7}})
+        assert event.startswith('id: 7\nevent: request_created\ndata: ')
+        assert event.endswith('\n\n')
+        data = event.split('data: ', 1)[1]
+        assert json.loads(data) == {'course': 1, 'seq': 7}
+
+    def test_format_event_without_sequence(self):
+        from tas.event_stream import format_event
+
+        event = format_event({'type': 'heartbeat', 'data': None})
+        assert event == 'event: heartbeat\ndata: {}\n\n'
+
+    def test_dispatches_by_course(self, hub):
+        first = hub.register(1)
+        second = hub.register(2)
+
+        hub.dispatch(packet('request_created', {'course': 1, 'seq': 1}))
+        hub.dispatch(packet('tas_changed', {'course': '2', 'seq': 1}))
+        hub.dispatch(b'--heartbeat--')
+        hub.dispatch(packet('heartbeat', None))
+
+        assert first.events.qsize() == 1
+        assert 'request_created' in first.events.get_nowait()
+        assert second.events.qsize() == 1
+        assert 'tas_changed' in second.events.get_nowait()
+
+    def test_dispatches_everything_unformatted(self, hub):
+        from tas.event_stream import ALL_COURSES
+
+        listener = hub.register(ALL_COURSES)
+        message = packet('request_created', {'course': 1, 'seq': 1})
+
+        hub.dispatch(message.encode('utf-8'))
+        hub.dispatch(b'--heartbeat--')
+
+        assert listener.events.get_nowait() == message
+        assert listener.events.get_nowait() == '--heartbeat--'
+
+    def test_closes_slow_streams(self, hub):
+        from tas.event_stream import MAX_BACKLOG
+
+        slow = hub.register(1)
+        for seq in range(MAX_BACKLOG + 1):
+            hub.dispatch(packet('request_created', {'course': 1, 'seq': seq}))
+
+        assert slow.closed
+        assert 1 not in hub.streams
+
+    def test_reads_bursts(self, hub):
+        from tas.event_stream import ALL_COURSES, _wait_readable
+        from tas.utils import get_redis_connection, redis_key
+
+        listener = hub.register(ALL_COURSES)
+        channel = redis_key('burst')
+        connection = get_redis_connection()
+        pubsub = connection.pubsub()
+        pubsub.subscribe(channel)
+        assert pubsub.get_message(timeout=5)['type'] == 'subscribe'
+
+        # Published together, like the outbox relay does
+        pipeline = connection.pipeline(transaction=False)
+        for seq in range(5):
+            pipeline.publish(channel, packet('request_created',
+                                             {'course': 1, 'seq': seq}))
+        pipeline.execute()
+
+        assert _wait_readable(pubsub.connection._sock, 5)
+        hub._read_messages(pubsub)
+        pubsub.close()
+
+        seqs = [json.loads(listener.events.get_nowait())['data']['seq']
+                for _ in range(listener.events.qsize())]
+        assert seqs == list(range(5))
+
+    def test_stream(self, hub):
+        events = hub.stream(1)
+        assert next(events).startswith('retry: ')
+        assert 1 in hub.streams
+
+        hub.dispatch(packet('request_created', {'course': 1, 'seq': 3}))
+        assert next(events).startswith('id: 3\n')
+
+        events.close()
+        assert 1 not in hub.streams
+
+    @mock.patch('tas.event_stream.KEEPALIVE_INTERVAL', 0)
+    def test_keepalive(self, hub):
+        events = hub.stream(1)
+        next(events)
+        assert next(events) == ': keepalive\n\n'
+
+    @pytest.mark.django_db
+    @mock.patch('tas.event_stream.hub')
+    def test_view(self, hub, client):
+        from tas.models import Course
+
+        hub.stream.return_value = iter(['retry: 1000\n\n'])
+        course = G(Course)
+
+        response = client.get('/events/courses/{}/'.format(course.pk))
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        assert response['Cache-Control'] == 'no-cache'
+        assert b''.join(response.streaming_content) == b'retry: 1000\n\n'
+        hub.stream.assert_called_once_with(course.pk)
+
+        response = client.get('/events/courses/{}/'.format(course.pk + 1))
+        assert response.status_code == 404
+
+    @pytest.mark.django_db
+    @mock.patch('tas.event_stream.hub')
+    def test_view_closes_database_connections(self, hub, client):
+        from tas.models import Course
+
+        hub.stream.return_value = iter([])
+        course = G(Course)
+        idle = mock.Mock(in_atomic_block=False)
+        in_transaction = mock.Mock(in_atomic_block=True)
+
+        with mock.patch('tas.event_stream.connections') as connections:
+            connections.all.return_value = [idle, in_transaction]
+            response = client.get('/events/courses/{}/'.format(course.pk))
+
+        assert response.status_code == 200
+        assert idle.close.called
+        assert not in_transaction.close.called
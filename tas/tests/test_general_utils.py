@@ -201,6 +201,34 @@ class TestSchoolAdministratorTools(object):
         from tas.utils import get_school_admin_group_name as gsagn
         assert gsagn('Test School') == 'Test School Admins'
 
+    @pytest.mark.django_db
+    def test_get_administered_school_ids(self):
+        from django.contrib.auth.models import Group
+        from tas.utils import (
+            get_administered_school_ids,
+            get_school_admin_group_name
+        )
+        from tas.models import School, Student
+
+        # Names ending in letters from ' Admins' used to be mangled by rstrip
+        school = G(School, name='Harvard')
+        G(School, name='Other School')
+        student = G(Student)
+
+        group_name = get_school_admin_group_name(school.name)
+        student.user.groups.add(Group.objects.get(name=group_name))
+
+        assert get_administered_school_ids(student.user) == [school.pk]
+
+    @pytest.mark.django_db
+    def test_get_administered_school_ids_no_groups(self):
+        from tas.utils import get_administered_school_ids
+        from tas.models import Student
+
+        student = G(Student)
+
+        assert get_administered_school_ids(student.user) == []
+
 
 class TestSplitCourseString(object):
 
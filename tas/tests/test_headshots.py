@@ -0,0 +1,273 @@
+import os
+from io import BytesIO
+
+import mock
+import pytest
+from PIL import Image
+from django_dynamic_fixture import G
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+
+def make_image_upload(width=800, height=600, color='red'):
+    output = BytesIO()
+    Image.new('RGB', (width, height), color).save(output, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', output.getvalue(),
+                              content_type='image/jpeg')
+
+
+@pytest.fixture
+def headshot_settings(settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir.mkdir('media'))
+    settings.HEADSHOT_SPOOL_DIR = str(tmpdir.join('spool'))
+    return settings
+
+
+@pytest.yield_fixture
+def media_storage(headshot_settings):
+    """Storage in the temporary MEDIA_ROOT.
+
+    default_storage keeps the MEDIA_ROOT it was first used with, so it would
+    write into the real media directory.
+    """
+    from django.core.files.storage import FileSystemStorage
+
+    storage = FileSystemStorage(location=headshot_settings.MEDIA_ROOT)
+    with mock.patch('tas.headshots.default_storage', storage):
+        yield storage
+
+
+class TestSpoolHeadshot(object):
+
+    def test_spools_to_disk(self, headshot_settings):
+        from tas.headshots import spool_headshot
+
+        path = spool_headshot(make_image_upload())
+
+        assert os.path.dirname(path) == headshot_settings.HEADSHOT_SPOOL_DIR
+        assert Image.open(path).size == (800, 600)
+
+    def test_rejects_non_images(self, headshot_settings):
+        from tas.headshots import spool_headshot, InvalidHeadshotError
+
+        upload = SimpleUploadedFile('photo.jpg', b'not an image')
+
+        with pytest.raises(InvalidHeadshotError):
+            spool_headshot(upload)
+
+        assert os.listdir(headshot_settings.HEADSHOT_SPOOL_DIR) == []
+
+
+class TestProcessHeadshot(object):
+
+    def test_creates_every_size(self, headshot_settings, media_storage):
+        from tas.headshots import (
+            spool_headshot,
+            process_headshot,
+            hash_file,
+            get_headshot_name,
+        )
+
+        path = spool_headshot(make_image_upload())
+        with open(path, 'rb') as spooled:
+            content_hash = hash_file(spooled)
+
+        assert process_headshot(path) == get_headshot_name(content_hash)
+
+        for size, dimensions in headshot_settings.HEADSHOT_SIZES.items():
+            name = get_headshot_name(content_hash, size)
+            with media_storage.open(name) as resized:
+                assert max(Image.open(resized).size) == max(dimensions)
+
+    def test_identical_uploads_are_not_reprocessed(self, media_storage):
+        from tas.headshots import spool_headshot, process_headshot
+
+        first = process_headshot(spool_headshot(make_image_upload()))
+
+        with mock.patch('tas.headshots.ResizeToFit') as resize:
+            second = process_headshot(spool_headshot(make_image_upload()))
+            assert not resize.called
+
+        assert first == second
+
+    def test_saves_rgb_jpegs(self, headshot_settings, media_storage):
+        from tas.headshots import spool_headshot, process_headshot
+
+        output = BytesIO()
+        Image.new('RGBA', (800, 600), (255, 0, 0, 128)).save(output, 'PNG')
+        upload = SimpleUploadedFile('photo.png', output.getvalue(),
+                                    content_type='image/png')
+
+        name = process_headshot(spool_headshot(upload))
+
+        with media_storage.open(name) as resized:
+            image = Image.open(resized)
+            assert image.format == 'JPEG'
+            assert image.mode == 'RGB'
+
+
+class TestProcessUploadedHeadshotTask(object):
+
+    @pytest.mark.django_db
+    def test_updates_student(self, media_storage):
+        from tas.headshots import spool_headshot
+        from tas.models import Student
+        from tas.tasks import process_uploaded_headshot
+
+        student = G(Student)
+        path = spool_headshot(make_image_upload())
+
+        process_uploaded_headshot(student.pk, path)
+
+        student.refresh_from_db()
+        assert student.headshot.name.startswith('headshots/')
+        assert student.headshot.name.endswith('/thumbnail.jpg')
+        assert not os.path.exists(path)
+
+
+class TestUploadPhotoView(object):
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.process_uploaded_headshot')
+    def test_processing_is_deferred(self, task, headshot_settings):
+        from rest_framework.test import APIClient
+        from tas.models import Student
+
+        student = G(Student)
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+
+        response = client.post('/api/v3/user/upload_photo/',
+                               {'photo': make_image_upload()},
+                               format='multipart')
+
+        assert response.status_code == 202
+        assert task.delay.call_count == 1
+        assert task.delay.call_args[0][0] == student.pk
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.process_uploaded_headshot')
+    def test_spool_is_cleaned_up_if_queueing_fails(self, task,
+                                                   headshot_settings):
+        from rest_framework.test import APIClient
+        from tas.models import Student
+
+        task.delay.side_effect = IOError('broker is down')
+        student = G(Student)
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+
+        with pytest.raises(IOError):
+            client.post('/api/v3/user/upload_photo/',
+                        {'photo': make_image_upload()},
+                        format='multipart')
+
+        assert os.listdir(headshot_settings.HEADSHOT_SPOOL_DIR) == []
+
+    @pytest.mark.django_db
+    @mock.patch('tas.api.views.process_uploaded_headshot')
+    def test_non_image_is_rejected(self, task, headshot_settings):
+        from rest_framework.test import APIClient
+        from tas.models import Student
+
+        student = G(Student)
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+
+        upload = SimpleUploadedFile('photo.jpg', b'not an image')
+        response = client.post('/api/v3/user/upload_photo/',
+                               {'photo': upload},
+                               format='multipart')
+
+        assert response.status_code == 400
+        assert not task.delay.called
+
+
+class TestIsContentAddressed(object):
+
+    @pytest.mark.parametrize('name,expected', (
+        ('headshots/{}/thumbnail.jpg'.format('a' * 40), True),
+        ('headshots/{}'.format('a' * 56), False),
+        ('blank/blank.jpg', False),
+    ))
+    def test_is_content_addressed(self, name, expected):
+        from tas.headshots import is_content_addressed
+
+        assert is_content_addressed(name) == expected
+
+
+class TestServeMedia(object):
+
+    @pytest.fixture
+    def media_file(self, media_storage):
+        from django.core.files.base import ContentFile
+
+        def save(name):
+            return media_storage.save(name, ContentFile(b'headshot'))
+
+        return save
+
+    def test_serves_with_django(self, rf, headshot_settings, media_file):
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = None
+        name = media_file('blank/blank.jpg')
+
+        response = serve_media(rf.get('/media/' + name), name)
+
+        assert b''.join(response.streaming_content) == b'headshot'
+        assert 'max-age=300' in response['Cache-Control']
+
+    def test_content_addressed_is_immutable(self, rf, headshot_settings,
+                                            media_file):
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = None
+        name = media_file('headshots/{}/thumbnail.jpg'.format('a' * 40))
+
+        response = serve_media(rf.get('/media/' + name), name)
+
+        assert 'immutable' in response['Cache-Control']
+        assert 'max-age=31536000' in response['Cache-Control']
+
+    def test_x_accel_redirect(self, rf, headshot_settings, media_file):
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = 'x-accel-redirect'
+        name = media_file('blank/blank.jpg')
+
+        response = serve_media(rf.get('/media/' + name), name)
+
+        assert response['X-Accel-Redirect'] == '/protected-media/' + name
+        assert response['Content-Type'] == 'image/jpeg'
+        assert response.content == b''
+
+    def test_x_sendfile(self, rf, headshot_settings, media_file):
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = 'x-sendfile'
+        name = media_file('blank/blank.jpg')
+
+        response = serve_media(rf.get('/media/' + name), name)
+
+        assert response['X-Sendfile'] == os.path.join(
+            headshot_settings.MEDIA_ROOT, name
+        )
+
+    def test_missing_file(self, rf, headshot_settings):
+        from django.http import Http404
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = 'x-sendfile'
+
+        with pytest.raises(Http404):
+            serve_media(rf.get('/media/nope.jpg'), 'nope.jpg')
+
+    def test_path_traversal(self, rf, headshot_settings):
+        from django.http import Http404
+        from tas.views import serve_media
+
+        headshot_settings.MEDIA_SENDFILE_BACKEND = 'x-accel-redirect'
+
+        with pytest.raises(Http404):
+            serve_media(rf.get('/media/../secret.py'), '../secret.py')
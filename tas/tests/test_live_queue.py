@@ -0,0 +1,275 @@
+from datetime import timedelta
+
+import mock
+import pytest
+import redis
+from django.utils.timezone import now
+from django_dynamic_fixture import G
+
+
+@pytest.yield_fixture
+def live_queue_enabled(settings):
+    settings.LIVE_QUEUE_ENABLED = True
+    # Transactions never commit inside a test, so sync straight away
+    with mock.patch('tas.live_queue.transaction.on_commit',
+                    side_effect=lambda callback: callback()):
+        yield
+
+
+@pytest.mark.usefixtures('live_queue_enabled')
+class TestLiveQueue(object):
+
+    @pytest.mark.django_db
+    def test_builds_from_database(self):
+        from tas.live_queue import get_open_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        first = G(Request, course=course, question='first')
+        second = G(Request, course=course, question='second')
+        G(Request, course=course, solved=True)
+        G(Request, course=course, cancelled=True)
+        G(Request)
+
+        rows = get_open_requests(course)
+        assert [row['id'] for row in rows] == [first.pk, second.pk]
+        assert rows[0]['question'] == 'first'
+        assert 'owned_by_me' not in rows[0]
+        assert 'can_ta_for' not in rows[0]
+
+    @pytest.mark.django_db
+    def test_follows_saves(self):
+        from tas.live_queue import get_open_requests, count_open_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        assert get_open_requests(course) == []
+
+        help_request = G(Request, course=course, question='old')
+        assert count_open_requests(course) == 1
+
+        help_request.question = 'new'
+        help_request.save()
+        assert get_open_requests(course)[0]['question'] == 'new'
+
+        help_request.solved = True
+        help_request.save()
+        assert get_open_requests(course) == []
+        assert count_open_requests(course) == 0
+
+    @pytest.mark.django_db
+    def test_follows_requestor_name(self):
+        from tas.live_queue import get_open_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        help_request = G(Request, course=course)
+        get_open_requests(course)
+
+        user = help_request.requestor.user
+        user.first_name = 'Renamed'
+        user.save()
+
+        row = get_open_requests(course)[0]
+        assert row['requestor']['first_name'] == 'Renamed'
+
+    @pytest.mark.django_db
+    def test_drops_expired_requests(self):
+        from tas.live_queue import (get_open_requests, count_open_requests,
+                                    sync_requests)
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=1)
+        stale = G(Request, course=course)
+        get_open_requests(course)
+
+        # Signals aren't sent by update, so the queue still has the request
+        Request.objects.filter(pk=stale.pk).update(
+            when_asked=now() - timedelta(hours=2)
+        )
+        stale.refresh_from_db()
+        sync_requests([stale])
+        fresh = G(Request, course=course)
+
+        assert [row['id'] for row in get_open_requests(course)] == [fresh.pk]
+        assert count_open_requests(course) == 1
+
+    @pytest.mark.django_db
+    def test_rebuilds_inconsistent_queue(self):
+        from tas.live_queue import get_open_requests, _rows_key
+        from tas.models import Course, Request
+        from tas.utils import get_redis_connection
+
+        course = G(Course, request_time_to_live=0)
+        help_request = G(Request, course=course)
+        get_open_requests(course)
+
+        get_redis_connection().hdel(_rows_key(course.pk), help_request.pk)
+
+        rows = get_open_requests(course)
+        assert [row['id'] for row in rows] == [help_request.pk]
+
+    @pytest.mark.django_db
+    def test_ignores_older_versions(self):
+        from tas.live_queue import get_open_requests, sync_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        help_request = G(Request, course=course, question='old')
+        get_open_requests(course)
+        old = Request.objects.get(pk=help_request.pk)
+
+        help_request.question = 'new'
+        help_request.save()
+
+        # The first save's update arrives after the second's
+        sync_requests([old])
+        assert get_open_requests(course)[0]['question'] == 'new'
+
+    @pytest.mark.django_db
+    def test_closed_requests_stay_closed(self):
+        from tas.live_queue import get_open_requests, sync_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        help_request = G(Request, course=course)
+        get_open_requests(course)
+        still_open = Request.objects.get(pk=help_request.pk)
+
+        help_request.solved = True
+        help_request.save()
+
+        # An update from before the request was solved arrives late
+        sync_requests([still_open])
+        assert get_open_requests(course) == []
+
+    def create_after_read(self, course, created):
+        """Stands in for use_primary in `rebuild`, creating a request once
+        the open requests have been read.
+        """
+        from tas.models import Request
+
+        class CreateAfterRead(object):
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                created.append(G(Request, course=course))
+
+        return mock.patch('tas.live_queue.use_primary', CreateAfterRead)
+
+    @pytest.mark.django_db
+    def test_first_build_keeps_requests_created_while_building(self):
+        from tas.live_queue import get_open_requests
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        first = G(Request, course=course)
+        created = []
+
+        with self.create_after_read(course, created):
+            rows = get_open_requests(course)
+
+        assert [row['id'] for row in rows] == [first.pk, created[0].pk]
+
+    @pytest.mark.django_db
+    def test_rebuild_keeps_requests_created_while_building(self):
+        from tas.live_queue import get_open_requests, rebuild
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        first = G(Request, course=course)
+        get_open_requests(course)
+        created = []
+
+        with self.create_after_read(course, created):
+            rebuild(course)
+
+        rows = get_open_requests(course)
+        assert [row['id'] for row in rows] == [first.pk, created[0].pk]
+
+    @pytest.mark.django_db
+    def test_rebuild_drops_closed_requests(self):
+        from tas.live_queue import get_open_requests, rebuild
+        from tas.models import Course, Request
+
+        course = G(Course, request_time_to_live=0)
+        closed = G(Request, course=course)
+        still_open = G(Request, course=course)
+        get_open_requests(course)
+
+        # Signals aren't sent by update, so the queue still has the request
+        Request.objects.filter(pk=closed.pk).update(solved=True)
+        rebuild(course)
+
+        assert [row['id'] for row in get_open_requests(course)] == \
+            [still_open.pk]
+
+    @pytest.mark.django_db
+    def test_redis_errors(self):
+        from tas.live_queue import get_open_requests, count_open_requests
+        from tas.models import Course
+
+        course = G(Course)
+        with mock.patch('tas.live_queue.get_redis_connection') as connection:
+            connection.return_value.exists.side_effect = redis.RedisError
+            assert get_open_requests(course) is None
+            assert count_open_requests(course) is None
+
+    @pytest.mark.django_db
+    def test_disabled(self, settings):
+        from tas.live_queue import get_open_requests, count_open_requests
+        from tas.models import Course
+
+        settings.LIVE_QUEUE_ENABLED = False
+        course = G(Course)
+        assert get_open_requests(course) is None
+        assert count_open_requests(course) is None
+
+
+@pytest.mark.usefixtures('live_queue_enabled')
+class TestLiveQueueViews(object):
+
+    @pytest.mark.django_db
+    def test_list_is_personalized(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIClient
+        from tas.live_queue import get_open_requests
+        from tas.models import Course, Request, Student, TA
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        mine = G(Request, course=course, requestor=student)
+        theirs = G(Request, course=course)
+        G(TA, student=student, course=course, active=True)
+        get_open_requests(course)
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/'.format(course.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+
+        assert response.status_code == 200
+        rows = dict((row['id'], row) for row in response.data)
+        assert rows[mine.pk]['owned_by_me']
+        assert not rows[theirs.pk]['owned_by_me']
+        assert rows[theirs.pk]['can_ta_for']
+        assert not any('tas_request' in query['sql'] for query in queries)
+
+    @pytest.mark.django_db
+    def test_course_request_count(self):
+        from rest_framework.test import APIClient
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        G(Request, course=course)
+        G(Request, course=course)
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        response = client.get('/api/v3/school/courses/{}/'.format(course.pk))
+
+        assert response.data['current_request_count'] == 2
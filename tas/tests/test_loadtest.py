@@ -0,0 +1,65 @@
+import pytest
+
+
+class TestPercentile(object):
+
+    def test_empty(self):
+        from tas.loadtest import percentile
+        assert percentile([], 50) is None
+
+    @pytest.mark.parametrize('percent,expected', (
+        (50, 50),
+        (95, 95),
+        (99, 99),
+        (100, 100),
+    ))
+    def test_nearest_rank(self, percent, expected):
+        from tas.loadtest import percentile
+        assert percentile(list(range(1, 101)), percent) == expected
+
+    def test_rank_rounds_up(self):
+        from tas.loadtest import percentile
+        assert percentile([1, 2, 3], 50) == 2
+        assert percentile(list(range(1, 11)), 95) == 10
+
+    def test_single_value(self):
+        from tas.loadtest import percentile
+        assert percentile([3], 99) == 3
+
+
+class TestRecorder(object):
+
+    def test_summary(self):
+        from tas.loadtest import Recorder
+
+        recorder = Recorder()
+        recorder.started_at = 0
+        recorder.finished_at = 10
+        for latency in (0.1, 0.2, 0.3):
+            recorder.record_call('create_request', latency, True)
+        recorder.record_call('create_request', 0.4, False)
+
+        summary = recorder.summary()
+        endpoint = summary['endpoints']['create_request']
+
+        assert summary['calls'] == 4
+        assert summary['throughput'] == 0.4
+        assert endpoint['count'] == 4
+        assert endpoint['errors'] == 1
+        assert endpoint['p50'] == 0.2
+        assert endpoint['p99'] == 0.4
+
+    def test_event_arriving_before_response(self):
+        from tas.loadtest import Recorder
+
+        recorder = Recorder()
+        recorder.started_at = 0
+        recorder.record_event('request_created', 1, 5, received_at=10.5)
+        recorder.expect_event('request_created', 1, 5, sent_at=10.0)
+        recorder.record_event('request_created', 1, 6, received_at=11)
+
+        summary = recorder.summary()
+
+        assert summary['events_received'] == 2
+        assert summary['event_lag']['request_created']['count'] == 1
+        assert summary['event_lag']['request_created']['p50'] == 0.5
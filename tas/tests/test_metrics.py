@@ -0,0 +1,173 @@
+import mock
+import pytest
+from django_dynamic_fixture import G
+
+
+@pytest.fixture(autouse=True)
+def empty_metrics():
+    from tas import metrics
+    metrics.reset()
+
+
+class TestCounters(object):
+
+    def test_record_and_collect(self):
+        from tas import metrics
+
+        metrics.record_request('v3:request-list', 0.2, 0.05, 3, 0.01, 100)
+        metrics.record_request('v3:request-list', 0.02, 0.01, 1, 0, 50)
+
+        totals = metrics.collect()['v3:request-list']
+
+        assert totals['requests_total'] == 2
+        assert totals['db_queries_total'] == 4
+        assert totals['response_bytes_total'] == 150
+        assert totals['request_duration_seconds_total'] == pytest.approx(0.22)
+
+    def test_counters_from_every_thread_are_collected(self):
+        import threading
+        from tas import metrics
+
+        def record():
+            metrics.record_request('v3:school', 0.1, 0, 0, 0, 0)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert metrics.collect()['v3:school']['requests_total'] == 4
+
+    def test_render_prometheus(self):
+        from tas import metrics
+
+        metrics.record_request('v3:school', 0.03, 0.01, 2, 0, 10)
+
+        text = metrics.render_prometheus(metrics.collect())
+
+        assert '# TYPE halliganhelper_requests_total counter' in text
+        assert 'halliganhelper_db_queries_total{view="v3:school",' in text
+        assert 'le="0.025"} 0' in text
+        assert 'le="0.05"} 1' in text
+        assert 'le="+Inf"} 1' in text
+
+    def test_redis_publish_time(self):
+        from tas import metrics
+
+        metrics.start_request()
+        with mock.patch('tas.metrics.time') as time:
+            time.time.side_effect = [10, 10.5]
+            with metrics.timed_redis_publish():
+                pass
+
+        assert metrics.get_redis_publish_time() == 0.5
+
+    def test_sql_is_only_kept_when_asked_for(self):
+        from tas import metrics
+
+        metrics.start_request()
+        metrics.record_query(0.5, 'SELECT 1')
+
+        assert metrics.get_query_count() == 1
+        assert metrics.get_query_time() == 0.5
+        assert metrics.get_queries() == []
+
+        metrics.start_request(keep_sql=True)
+        metrics.record_query(0.5, 'SELECT %s', (1,))
+
+        assert metrics.get_query_count() == 1
+        assert metrics.get_queries() == [(0.5, 'SELECT %s', (1,))]
+
+
+class TestRequestMetricsMiddleware(object):
+
+    @pytest.mark.django_db
+    def test_records_view(self, client):
+        from tas import metrics
+        from tas.models import Student
+
+        student = G(Student)
+        client.force_login(student.user)
+        client.get('/api/v3/school/')
+
+        totals = metrics.collect()
+
+        assert totals['tas.api.views.SchoolView']['requests_total'] == 1
+
+    @pytest.mark.django_db
+    def test_logs_slow_requests(self, client, settings):
+        from tas.models import Student
+
+        settings.SLOW_REQUEST_THRESHOLD = 0
+        student = G(Student)
+        client.force_login(student.user)
+
+        with mock.patch('tas.middleware.slow_request_logger') as logger:
+            client.get('/api/v3/school/')
+
+        assert logger.warning.called
+        message = logger.warning.call_args[0][-1]
+        assert 'SELECT' in message
+
+    @pytest.mark.django_db
+    def test_leaves_query_log_alone(self, client):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tas.models import Student
+
+        student = G(Student)
+        client.force_login(student.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            list(Student.objects.all())
+            with mock.patch('tas.middleware.metrics.record_request') as record:
+                client.get('/api/v3/school/')
+
+        # The query made before the request is still captured, but isn't
+        # counted against the request
+        request_queries = record.call_args[0][3]
+        assert request_queries > 0
+        assert len(queries) == request_queries + 1
+        assert 'tas_student' in queries[0]['sql']
+
+    @pytest.mark.django_db
+    def test_leaves_debug_cursor_off(self, client, settings):
+        from django.db import connection
+        from tas.models import Student
+
+        settings.SLOW_REQUEST_THRESHOLD = None
+        student = G(Student)
+        client.force_login(student.user)
+
+        with mock.patch('tas.middleware.metrics.record_request') as record:
+            client.get('/api/v3/school/')
+
+        assert not connection.force_debug_cursor
+        assert record.call_args[0][3] > 0
+
+
+class TestMetricsView(object):
+
+    def test_forbidden_for_everyone_else(self, rf, settings):
+        from django.contrib.auth.models import AnonymousUser
+        from tas.metrics import metrics_view
+
+        settings.METRICS_ALLOWED_IPS = ()
+        request = rf.get('/metrics/')
+        request.user = AnonymousUser()
+
+        assert metrics_view(request).status_code == 403
+
+    def test_allowed_ip(self, rf, settings):
+        from django.contrib.auth.models import AnonymousUser
+        from tas.metrics import metrics_view
+
+        settings.METRICS_ALLOWED_IPS = ('127.0.0.1',)
+        request = rf.get('/metrics/', REMOTE_ADDR='127.0.0.1')
+        request.user = AnonymousUser()
+
+        response = metrics_view(request)
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
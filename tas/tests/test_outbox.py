@@ -0,0 +1,141 @@
+import json
+
+import mock
+import pytest
+import redis
+from django_dynamic_fixture import G
+
+
+class TestOutbox(object):
+
+    @pytest.mark.django_db
+    def test_enqueue(self):
+        from tas.models import OutboxEvent
+        from tas.outbox import enqueue_message
+
+        enqueue_message('request_created', {'course': 1, 'id': 2})
+        enqueue_message('heartbeat')
+
+        events = OutboxEvent.objects.order_by('pk')
+        assert [event.message_type for event in events] == \
+            ['request_created', 'heartbeat']
+        assert json.loads(events[0].data) == {'course': 1, 'id': 2}
+        assert events[1].data == ''
+        assert all(event.delivered_at is None for event in events)
+
+    @pytest.mark.django_db
+    @mock.patch('tas.outbox.publish_message')
+    def test_relays_in_order_in_batches(self, publish_message):
+        from tas.models import OutboxEvent
+        from tas.outbox import enqueue_message, relay_batch, relay_pending
+
+        for index in range(5):
+            enqueue_message('request_created', {'id': index})
+
+        assert relay_batch(batch_size=2) == 2
+        assert OutboxEvent.objects.filter(delivered_at=None).count() == 3
+
+        assert relay_pending(batch_size=2) == 3
+        assert relay_pending(batch_size=2) == 0
+
+        published = [call[0] for call in publish_message.call_args_list]
+        assert published == [('request_created', {'id': index})
+                             for index in range(5)]
+
+    @pytest.mark.django_db
+    @mock.patch('tas.outbox.publish_message')
+    def test_failed_publish_is_retried(self, publish_message):
+        from tas.models import OutboxEvent
+        from tas.outbox import enqueue_message, relay_batch
+
+        enqueue_message('on_duty', {'id': 1})
+        publish_message.side_effect = redis.RedisError
+
+        with pytest.raises(redis.RedisError):
+            relay_batch()
+        assert OutboxEvent.objects.get().delivered_at is None
+
+        publish_message.side_effect = None
+        assert relay_batch() == 1
+        assert OutboxEvent.objects.get().delivered_at is not None
+
+    @pytest.mark.django_db
+    def test_prune_delivered(self, settings):
+        from django.utils.timezone import now
+        from tas.models import OutboxEvent
+        from tas.outbox import prune_delivered
+
+        settings.OUTBOX_RETENTION = 60
+        G(OutboxEvent, delivered_at=None)
+        G(OutboxEvent, delivered_at=now())
+        old = G(OutboxEvent, delivered_at=now())
+        OutboxEvent.objects.filter(pk=old.pk)\
+            .update(delivered_at=now().replace(year=2000))
+
+        prune_delivered()
+
+        assert OutboxEvent.objects.count() == 2
+        assert not OutboxEvent.objects.filter(pk=old.pk).exists()
+
+    @pytest.mark.django_db
+    def test_views_enqueue(self):
+        from rest_framework.test import APIClient
+        from tas.models import Course, OutboxEvent, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school)
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/'.format(course.pk)
+        with mock.patch('tas.utils.redis_broadcast_publisher') as publisher:
+            response = client.post(url, {'question': 'Why?',
+                                         'where_located': 'Lab'})
+
+        assert response.status_code == 201
+        assert not publisher.publish_message.called
+
+        event = OutboxEvent.objects.get()
+        assert event.message_type == 'request_created'
+        assert json.loads(event.data) == {'course': course.pk,
+                                          'id': response.data['id']}
+
+    @pytest.mark.django_db
+    @mock.patch('tas.outbox.publish_message')
+    def test_publishes_sequence_numbers(self, publish_message):
+        from tas.models import Course
+        from tas.outbox import enqueue_message, relay_batch
+
+        course = G(Course)
+        enqueue_message('request_created', {'course': course.pk, 'id': 1})
+        enqueue_message('request_removed', {'course': course.pk, 'id': 1})
+        enqueue_message('heartbeat')
+        relay_batch()
+
+        published = [call[0] for call in publish_message.call_args_list]
+        assert published == [
+            ('request_created', {'course': course.pk, 'id': 1, 'seq': 1}),
+            ('request_removed', {'course': course.pk, 'id': 1, 'seq': 2}),
+            ('heartbeat', None),
+        ]
+
+    @mock.patch('tas.outbox.select.select')
+    def test_buffered_notifications_dont_wait(self, select):
+        from tas.outbox import _wait_for_notification
+
+        listener = mock.Mock(notifies=['already read'])
+
+        _wait_for_notification(listener, 5)
+
+        assert not select.called
+        assert listener.notifies == []
+
+    @mock.patch('tas.outbox.select.select', return_value=([], [], []))
+    def test_waits_for_notifications(self, select):
+        from tas.outbox import _wait_for_notification
+
+        listener = mock.Mock(notifies=[])
+
+        _wait_for_notification(listener, 5)
+
+        select.assert_called_once_with([listener], [], [], 5)
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+import mock
+import pytest
+from django_dynamic_fixture import G
+
+
+class TestStackSampler(object):
+
+    def test_samples_the_target_thread(self):
+        from tas.profiling import StackSampler
+
+        def busy_waiting():
+            deadline = time.time() + 0.2
+            while time.time() < deadline:
+                pass
+
+        sampler = StackSampler(threading.current_thread().ident, 0.001)
+        sampler.start()
+        busy_waiting()
+        samples = sampler.stop()
+
+        assert samples
+        assert any('busy_waiting' in stack for stack in samples)
+
+    def test_render_collapsed(self):
+        from collections import Counter
+        from tas.profiling import render_collapsed
+
+        samples = Counter({'a;b': 1, 'a;b;c': 3})
+
+        assert render_collapsed(samples) == 'a;b;c 3\na;b 1\n'
+
+
+class TestRequestProfilerMiddleware(object):
+
+    @pytest.fixture
+    def superuser(self):
+        from tas.models import Student
+
+        student = G(Student)
+        student.user.is_superuser = True
+        student.user.save()
+        return student.user
+
+    @pytest.mark.django_db
+    def test_not_profiled_for_regular_users(self, client, settings, tmpdir):
+        from tas.models import Student
+
+        settings.PROFILE_DIR = str(tmpdir)
+        client.force_login(G(Student).user)
+
+        response = client.get('/api/v3/school/?profile=1')
+
+        assert 'X-Profile' not in response
+        assert os.listdir(str(tmpdir)) == []
+
+    @pytest.mark.django_db
+    def test_profile_is_stored(self, client, settings, tmpdir, superuser):
+        settings.PROFILE_DIR = str(tmpdir)
+        client.force_login(superuser)
+
+        response = client.get('/api/v3/school/', HTTP_X_PROFILE='1')
+
+        assert response.status_code == 200
+        assert os.listdir(str(tmpdir)) == [response['X-Profile']]
+
+    @pytest.mark.django_db
+    def test_profile_inline(self, client, settings, superuser):
+        client.force_login(superuser)
+
+        with mock.patch('tas.middleware.render_collapsed') as render:
+            render.return_value = 'a;b 1\n'
+            response = client.get('/api/v3/school/?profile=inline')
+
+        assert response['Content-Type'] == 'text/plain'
+        assert response.content == b'a;b 1\n'
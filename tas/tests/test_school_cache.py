@@ -0,0 +1,99 @@
+import json
+
+import mock
+import pytest
+import redis
+from django_dynamic_fixture import G
+
+
+@pytest.yield_fixture
+def school_cache_enabled(settings):
+    settings.SCHOOL_CACHE_ENABLED = True
+    # Transactions never commit inside a test, so invalidate straight away
+    with mock.patch('tas.school_cache.transaction.on_commit',
+                    side_effect=lambda callback: callback()):
+        yield
+
+
+@pytest.mark.usefixtures('school_cache_enabled')
+class TestSchoolCache(object):
+
+    @pytest.mark.django_db
+    def test_caches_document(self):
+        from tas import school_cache
+        from tas.models import Course, School
+
+        school = G(School)
+        course = G(Course, school=school)
+
+        with mock.patch('tas.school_cache.build_document',
+                        wraps=school_cache.build_document) as build:
+            document = json.loads(school_cache.get_document(school))
+            assert json.loads(school_cache.get_document(school)) == document
+            assert build.call_count == 1
+
+        assert document['name'] == school.name
+        assert [c['id'] for c in document['courses']] == [course.pk]
+        assert 'am_a_ta' not in document['courses'][0]
+
+    @pytest.mark.django_db
+    def test_invalidated_by_course_events(self):
+        from tas import school_cache
+        from tas.models import Course, School
+        from tas.outbox import enqueue_message
+
+        school = G(School)
+        course = G(Course, school=school)
+        document = json.loads(school_cache.get_document(school))
+        assert document['courses'][0]['sequence'] == 0
+
+        enqueue_message('request_created', {'course': course.pk, 'id': 1})
+
+        document = json.loads(school_cache.get_document(school))
+        assert document['courses'][0]['sequence'] == 1
+
+    @pytest.mark.django_db
+    def test_invalidated_by_course_changes(self):
+        from tas import school_cache
+        from tas.models import Course, School
+
+        school = G(School)
+        course = G(Course, school=school, name='Old')
+        school_cache.get_document(school)
+
+        course.name = 'New'
+        course.save()
+        document = json.loads(school_cache.get_document(school))
+        assert document['courses'][0]['name'] == 'New'
+
+        course.delete()
+        assert json.loads(school_cache.get_document(school))['courses'] == []
+
+    @pytest.mark.django_db
+    def test_not_stored_if_invalidated_while_building(self):
+        from tas import school_cache
+        from tas.models import School
+
+        school = G(School)
+
+        def build_racing_a_change(school):
+            school_cache.invalidate([school.pk])
+            return '{}'
+
+        with mock.patch('tas.school_cache.build_document',
+                        side_effect=build_racing_a_change):
+            assert school_cache.get_document(school) == '{}'
+
+        assert json.loads(school_cache.get_document(school))['name'] == \
+            school.name
+
+    @pytest.mark.django_db
+    @mock.patch('tas.school_cache.get_redis_connection',
+                side_effect=redis.ConnectionError)
+    def test_falls_back_without_redis(self, get_redis_connection):
+        from tas import school_cache
+        from tas.models import School
+
+        school = G(School)
+        assert json.loads(school_cache.get_document(school))['name'] == \
+            school.name
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import mock
+import pytest
+from django.utils.timezone import now
+from django_dynamic_fixture import G
+
+
+def in_a_minute():
+    from tas.utils import to_timestamp
+    return to_timestamp(now() + timedelta(minutes=1))
+
+
+@mock.patch('tas.outbox.enqueue_message')
+class TestShifts(object):
+
+    @pytest.mark.django_db
+    def test_publishes_ended_shifts_once(self, enqueue_message):
+        from tas.models import OfficeHour
+        from tas.shifts import schedule, end_due_shifts
+
+        office_hour = G(OfficeHour, end_time=now() + timedelta(seconds=30))
+        schedule(office_hour)
+        assert end_due_shifts() == 0
+
+        with mock.patch('tas.shifts.time.time', return_value=in_a_minute()):
+            assert end_due_shifts() == 1
+            assert end_due_shifts() == 0
+
+        enqueue_message.assert_called_once_with('off_duty', {
+            'course': office_hour.course_id,
+            'id': office_hour.pk,
+        })
+
+    @pytest.mark.django_db
+    def test_publishes_in_batches(self, enqueue_message):
+        from tas.models import OfficeHour
+        from tas.shifts import schedule, end_due_shifts
+
+        for _ in range(5):
+            schedule(G(OfficeHour, end_time=now() + timedelta(seconds=30)))
+
+        with mock.patch('tas.shifts.time.time', return_value=in_a_minute()):
+            assert end_due_shifts(batch_size=2) == 5
+
+        assert enqueue_message.call_count == 5
+
+    @pytest.mark.django_db
+    def test_ending_early_unschedules(self, enqueue_message):
+        from tas.models import OfficeHour
+        from tas.shifts import schedule, end_due_shifts
+
+        office_hour = G(OfficeHour, end_time=now() + timedelta(seconds=30))
+        schedule(office_hour)
+
+        office_hour.end_time = now()
+        schedule(office_hour)
+
+        with mock.patch('tas.shifts.time.time', return_value=in_a_minute()):
+            assert end_due_shifts() == 0
+
+    @pytest.mark.django_db
+    def test_schedule_all(self, enqueue_message):
+        from tas.models import OfficeHour
+        from tas.shifts import schedule_all, end_due_shifts
+
+        G(OfficeHour, end_time=now() + timedelta(seconds=30))
+        G(OfficeHour, end_time=now() - timedelta(seconds=30))
+        schedule_all()
+
+        with mock.patch('tas.shifts.time.time', return_value=in_a_minute()):
+            assert end_due_shifts() == 1
+
+    def test_sleeps_until_next_shift(self, enqueue_message):
+        from tas.shifts import seconds_until_next_shift_ends, MAX_SLEEP
+
+        with mock.patch('tas.shifts.get_redis_connection') as connection:
+            zrange = connection.return_value.zrange
+            zrange.return_value = []
+            assert seconds_until_next_shift_ends() == MAX_SLEEP
+
+            with mock.patch('tas.shifts.time.time', return_value=100):
+                zrange.return_value = [(b'1:1', 100.25)]
+                assert seconds_until_next_shift_ends() == 0.25
+
+                zrange.return_value = [(b'1:1', 99)]
+                assert seconds_until_next_shift_ends() == 0
@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+import mock
+import pytest
+import redis
+from django.utils.timezone import now
+from django_dynamic_fixture import G
+
+
+class TestWaitTimes(object):
+
+    @pytest.mark.django_db
+    def test_averages_first_samples(self):
+        from tas.models import Course, Request, Student
+        from tas.wait_times import record_solved, get_service_time
+
+        # when_asked is always set to when the request is created
+        course = G(Course)
+        asked = now()
+        for minutes in (4, 6):
+            ta = G(Student)
+            record_solved(G(Request, course=course, when_asked=asked,
+                            when_solved=asked + timedelta(minutes=minutes),
+                            who_solved=ta, solved=True))
+
+        assert get_service_time(course.pk) == pytest.approx(300, abs=5)
+
+    @pytest.mark.django_db
+    def test_measures_from_previous_solve(self):
+        from tas.models import Course, Request, Student
+        from tas.wait_times import record_solved, get_service_time
+
+        course = G(Course)
+        ta = G(Student)
+        asked = now()
+
+        # Both were asked at once, but the TA only got to the second one
+        # after solving the first.
+        first_solved = asked + timedelta(minutes=10)
+        record_solved(G(Request, course=course, when_asked=asked,
+                        when_solved=first_solved, who_solved=ta))
+        record_solved(G(Request, course=course, when_asked=asked,
+                        when_solved=first_solved + timedelta(minutes=2),
+                        who_solved=ta))
+
+        assert get_service_time(course.pk) == pytest.approx(360, abs=5)
+
+    @pytest.mark.django_db
+    def test_no_samples(self):
+        from tas.models import Course
+        from tas.wait_times import get_service_time
+
+        assert get_service_time(G(Course).pk) is None
+
+    @mock.patch('tas.wait_times.get_redis_connection')
+    def test_redis_errors(self, get_redis_connection):
+        from tas.wait_times import get_service_time
+
+        get_redis_connection.return_value.hget.side_effect = redis.RedisError
+        assert get_service_time(1) is None
+
+    def test_estimate_wait(self):
+        from tas.wait_times import estimate_wait
+
+        assert estimate_wait(4, 300, 2) == 600
+        assert estimate_wait(0, 300, 2) == 0
+        assert estimate_wait(4, None, 2) is None
+        assert estimate_wait(4, 300, 0) is None
+
+
+class TestQueuePosition(object):
+
+    def get(self, student, course):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(user=student.user)
+        url = '/api/v3/school/courses/{}/requests/position/'
+        return client.get(url.format(course.pk))
+
+    @pytest.mark.django_db
+    def test_position(self):
+        from tas.models import Course, Request, Student, OfficeHour
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        G(Request, course=course)
+        G(Request, course=course)
+        mine = G(Request, course=course, requestor=student)
+        G(Request, course=course)
+        G(OfficeHour, course=course, end_time=now() + timedelta(hours=1))
+
+        with mock.patch('tas.api.views.wait_times.get_service_time',
+                        return_value=120):
+            response = self.get(student, course)
+
+        assert response.status_code == 200
+        assert response.data['id'] == mine.pk
+        assert response.data['position'] == 3
+        assert response.data['queue_length'] == 4
+        assert response.data['on_duty_tas'] == 1
+        assert response.data['estimated_wait'] == 240
+
+    @pytest.mark.django_db
+    def test_not_in_line(self):
+        from tas.models import Course, Request, Student
+
+        student = G(Student)
+        course = G(Course, school=student.school, request_time_to_live=0)
+        G(Request, course=course)
+
+        response = self.get(student, course)
+
+        assert response.data['id'] is None
+        assert response.data['position'] is None
+        assert response.data['queue_length'] == 1
+        assert response.data['estimated_wait'] is None
+
+    @pytest.mark.django_db
+    def test_solving_records_solver(self):
+        from rest_framework.test import APIClient
+        from tas.models import Course, Request, Student, TA
+
+        ta = G(Student)
+        course = G(Course, school=ta.school)
+        G(TA, student=ta, course=course, active=True)
+        requestor = G(Student, school=ta.school)
+        help_request = G(Request, course=course, requestor=requestor)
+
+        client = APIClient()
+        client.force_authenticate(user=ta.user)
+        url = '/api/v3/school/courses/{}/requests/{}/'
+        response = client.patch(url.format(course.pk, help_request.pk),
+                                {'solved': True}, format='json')
+
+        assert response.status_code == 200
+        help_request.refresh_from_db()
+        assert help_request.who_solved == ta
+        assert help_request.when_solved is not None
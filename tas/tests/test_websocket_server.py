@@ -0,0 +1,159 @@
+import json
+import select
+import socket
+import threading
+import time
+
+import mock
+import pytest
+from django.test import RequestFactory
+
+
+class FakeWebsocket(object):
+
+    def __init__(self):
+        self.server_end, self.client_end = socket.socketpair()
+        self.sent = []
+        self.closed = False
+
+    def get_file_descriptor(self):
+        return self.server_end.fileno()
+
+    def receive(self):
+        message = self.server_end.recv(1024)
+        if not message:
+            self.closed = True
+        return message
+
+    def flush(self):
+        pass
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def close(self, code=1000, message=''):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.yield_fixture
+def hub():
+    from tas.event_stream import EventHub
+
+    with mock.patch.object(EventHub, '_ensure_subscribed'):
+        hub = EventHub()
+        with mock.patch('tas.websocket_server.hub', hub):
+            yield hub
+
+
+@pytest.yield_fixture
+def subscribed_hub(settings):
+    """A hub with a real subscription to its own broadcast channel."""
+    from tas.event_stream import EventHub, get_broadcast_channel
+    from tas.utils import get_redis_connection, redis_key
+
+    settings.WS4REDIS_PREFIX = redis_key('ws4redis')
+    hub = EventHub()
+    hub._ensure_subscribed()
+    channel = get_broadcast_channel()
+    # Returns the channel and how many subscribers it has
+    wait_for(lambda: get_redis_connection().execute_command(
+        'PUBSUB', 'NUMSUB', channel
+    )[1])
+    with mock.patch('tas.websocket_server.hub', hub):
+        yield hub
+
+
+@pytest.fixture
+def server():
+    from tas.websocket_server import MultiplexedWebsocketServer
+
+    class Server(MultiplexedWebsocketServer):
+        def select(self, rlist, wlist, xlist, timeout=None):
+            return select.select(rlist, wlist, xlist, timeout)
+
+    return Server()
+
+
+class TestWebsocketServer(object):
+
+    def test_stream_wakes_up_reader(self):
+        from tas.websocket_server import WebsocketStream
+
+        stream = WebsocketStream()
+        try:
+            assert select.select([stream.wakeup_fd], [], [], 0)[0] == []
+            stream.put('first')
+            stream.put('second')
+            assert select.select([stream.wakeup_fd], [], [], 0)[0] == \
+                [stream.wakeup_fd]
+            assert stream.drain() == ['first', 'second']
+            assert select.select([stream.wakeup_fd], [], [], 0)[0] == []
+        finally:
+            stream.close()
+
+    @pytest.mark.parametrize('path,ok', (
+        ('/ws/ta?subscribe-broadcast', True),
+        ('/ws/ta?subscribe-broadcast&subscribe-user', True),
+        ('/ws/ta?subscribe-user', False),
+        ('/ws/other?subscribe-broadcast', False),
+    ))
+    def test_check_subscriptions(self, server, path, ok):
+        from ws4redis.exceptions import HandshakeError
+
+        request = RequestFactory().get(path)
+        if ok:
+            server.check_subscriptions(request)
+        else:
+            with pytest.raises(HandshakeError):
+                server.check_subscriptions(request)
+
+    def test_serve(self, server, hub, settings):
+        from tas.event_stream import ALL_COURSES
+
+        settings.WS4REDIS_HEARTBEAT = '--heartbeat--'
+        websocket = FakeWebsocket()
+        serving = threading.Thread(target=server.serve, args=(websocket,))
+        serving.start()
+        wait_for(lambda: ALL_COURSES in hub.streams)
+
+        message = json.dumps({'type': 'heartbeat', 'data': None})
+        hub.dispatch(message)
+        wait_for(lambda: websocket.sent == [message])
+
+        websocket.client_end.sendall(b'--heartbeat--')
+        wait_for(lambda: websocket.sent == [message, '--heartbeat--'])
+
+        websocket.client_end.close()
+        serving.join(5)
+        assert not serving.is_alive()
+        assert ALL_COURSES not in hub.streams
+
+    def test_serves_published_bursts(self, server, subscribed_hub):
+        from tas.event_stream import ALL_COURSES, get_broadcast_channel
+        from tas.utils import get_redis_connection
+
+        websocket = FakeWebsocket()
+        serving = threading.Thread(target=server.serve, args=(websocket,))
+        serving.start()
+        wait_for(lambda: ALL_COURSES in subscribed_hub.streams)
+
+        # Published together, like the outbox relay does
+        messages = [json.dumps({'type': 'request_created',
+                                'data': {'course': 1, 'seq': seq}})
+                    for seq in range(5)]
+        pipeline = get_redis_connection().pipeline(transaction=False)
+        for message in messages:
+            pipeline.publish(get_broadcast_channel(), message)
+        pipeline.execute()
+        wait_for(lambda: websocket.sent == messages)
+
+        websocket.client_end.close()
+        serving.join(5)
+        assert not serving.is_alive()
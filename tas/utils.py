@@ -1,7 +1,11 @@
+import calendar
 import logging
 import requests
 import json
 
+import redis
+
+from django.conf import settings
 from django.template.loader import get_template
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
@@ -9,10 +13,15 @@ from django.db.models import Q
 
 from ws4redis.publisher import RedisPublisher
 from ws4redis.redis_store import RedisMessage
+
+from .metrics import timed_redis_publish
+
 redis_broadcast_publisher = RedisPublisher(facility='ta', broadcast=True)
 
 logger = logging.getLogger(__name__)
 
+_redis_connection_pool = None
+
 
 class InvalidCourseStringError(ValueError):
     def __init__(self, value):
@@ -161,6 +170,23 @@ def get_school_admin_group_name(school_name):
     return '{} Admins'.format(school_name)
 
 
+def get_administered_school_ids(user):
+    """Returns a list of the pks of the schools `user` is an administrator
+    for, based on the admin groups they belong to.
+    """
+    from tas.models import School
+
+    suffix = get_school_admin_group_name('')
+    group_names = user.groups.filter(name__endswith=suffix)\
+        .values_list('name', flat=True)
+    school_names = [name[:-len(suffix)] for name in group_names]
+    if not school_names:
+        return []
+
+    return list(School.objects.filter(name__in=school_names)
+                .values_list('pk', flat=True))
+
+
 def _split_course_string(course_string):
     """ Split the course string in to a course number and a course postfix
     Expects all strings to be in the format numpostfix. For instance,
@@ -210,4 +236,31 @@ def publish_message(message_type, data=None, publisher=None):
                  packet, publisher is None)
 
     message = RedisMessage(json.dumps(packet))
-    redis_publisher.publish_message(message)
+    with timed_redis_publish():
+        redis_publisher.publish_message(message)
+
+
+def get_redis_connection():
+    """Returns a client for the application's redis server. Connections are
+    pooled for the whole process.
+    """
+    global _redis_connection_pool
+    if _redis_connection_pool is None:
+        _redis_connection_pool = redis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD or None,
+        )
+
+    return redis.StrictRedis(connection_pool=_redis_connection_pool)
+
+
+def redis_key(*parts):
+    """Build a redis key under `settings.REDIS_KEY_PREFIX`."""
+    prefix = getattr(settings, 'REDIS_KEY_PREFIX', 'hh')
+    return ':'.join(str(part) for part in (prefix,) + parts)
+
+
+def to_timestamp(value):
+    """Seconds since the epoch of an aware datetime, as a float."""
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
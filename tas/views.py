@@ -1,11 +1,21 @@
 import logging
+import mimetypes
+import os
 
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.six.moves.urllib.parse import quote
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.static import serve
 
 from registration.backends.default.views import RegistrationView
 from registration.signals import user_registered, user_activated
 
+from .headshots import is_content_addressed
 from .utils import check_ta
 from .custom_user_forms import EmailUserCreationForm, EmailAuthenticationForm
 
@@ -44,3 +54,49 @@ def login_or_register(request):
 @ensure_csrf_cookie
 def ModularHomePage(request):
     return render(request, 'logged_in.html', {})
+
+
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT.
+
+    Depending on `settings.MEDIA_SENDFILE_BACKEND` the file is either
+    streamed by Django or handed off to the web server with an
+    X-Accel-Redirect (nginx) or X-Sendfile (apache, lighttpd) header.
+    Content addressed files never change, so they're cached forever.
+    """
+    backend = settings.MEDIA_SENDFILE_BACKEND
+
+    if backend is None:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    else:
+        try:
+            full_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404(path)
+
+        if not os.path.isfile(full_path):
+            raise Http404(path)
+
+        content_type, _ = mimetypes.guess_type(full_path)
+        response = HttpResponse(
+            content_type=content_type or 'application/octet-stream'
+        )
+
+        if backend == 'x-accel-redirect':
+            redirect = settings.MEDIA_ACCEL_REDIRECT_PREFIX + path
+            response['X-Accel-Redirect'] = quote(redirect.encode('utf-8'))
+        elif backend == 'x-sendfile':
+            response['X-Sendfile'] = full_path.encode('utf-8')
+        else:
+            raise ValueError(
+                'Unknown MEDIA_SENDFILE_BACKEND: {}'.format(backend)
+            )
+
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, immutable=True,
+                            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE)
+    else:
+        patch_cache_control(response, public=True,
+                            max_age=settings.MEDIA_MAX_AGE)
+
+    return response
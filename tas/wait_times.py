@@ -0,0 +1,110 @@
+"""How long TAs spend on a request, per course.
+
+Every time a request is solved, the time the TA spent on it is folded into
+an exponentially weighted moving average kept in redis, so recent lab
+nights count for more than old ones. Updating it is a single script call
+and reading it is a single hash lookup; history is never scanned.
+
+A TA can't have started on a request before it was asked or before they
+solved their previous one, so that's what `when_solved` is measured from.
+Otherwise time spent waiting in line would be counted as time spent
+helping.
+"""
+import logging
+
+import redis
+
+from django.conf import settings
+
+from .utils import get_redis_connection, redis_key, to_timestamp
+
+logger = logging.getLogger(__name__)
+
+# How long to remember when a TA last solved something. Anything older than
+# this is from a different lab night.
+LAST_SOLVED_TIMEOUT = 60 * 60 * 12
+
+# Until there are enough samples for the smoothing factor to take over, each
+# one is weighted as 1 / count, which makes the mean a plain average.
+_RECORD_SOLVED = """
+local asked = tonumber(ARGV[1])
+local solved = tonumber(ARGV[2])
+local last_solved = tonumber(redis.call('GET', KEYS[2]) or asked)
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[4])
+
+local sample = solved - math.max(asked, last_solved)
+if sample <= 0 then
+    return nil
+end
+
+local count = redis.call('HINCRBY', KEYS[1], 'count', 1)
+local mean = tonumber(redis.call('HGET', KEYS[1], 'mean') or sample)
+local weight = math.max(tonumber(ARGV[3]), 1 / count)
+mean = mean + weight * (sample - mean)
+redis.call('HSET', KEYS[1], 'mean', tostring(mean))
+return tostring(mean)
+"""
+
+_record_solved_script = None
+
+
+def _stats_key(course_id):
+    return redis_key('service_time', course_id)
+
+
+def _last_solved_key(ta_id):
+    return redis_key('last_solved', ta_id)
+
+
+def _get_record_solved_script():
+    global _record_solved_script
+    if _record_solved_script is None:
+        _record_solved_script = \
+            get_redis_connection().register_script(_RECORD_SOLVED)
+    return _record_solved_script
+
+
+def record_solved(help_request):
+    """Fold the time spent on a just solved request into its course's
+    average.
+    """
+    smoothing = getattr(settings, 'SERVICE_TIME_SMOOTHING', 0.1)
+    try:
+        _get_record_solved_script()(
+            keys=[_stats_key(help_request.course_id),
+                  _last_solved_key(help_request.who_solved_id)],
+            args=[to_timestamp(help_request.when_asked),
+                  to_timestamp(help_request.when_solved),
+                  smoothing,
+                  LAST_SOLVED_TIMEOUT],
+            client=get_redis_connection()
+        )
+    except redis.RedisError:
+        logger.exception('Failed to record service time. request=%s',
+                         help_request.pk)
+
+
+def get_service_time(course_id):
+    """Returns the average number of seconds a TA spends on a request in the
+    course, or None if nothing has been solved yet or redis can't be
+    reached.
+    """
+    try:
+        mean = get_redis_connection().hget(_stats_key(course_id), 'mean')
+    except redis.RedisError:
+        logger.exception('Failed to read service time. course=%s', course_id)
+        return None
+
+    if mean is None:
+        return None
+    return float(mean)
+
+
+def estimate_wait(ahead, service_time, on_duty_tas):
+    """Estimate how many seconds someone with `ahead` requests in front of
+    them will wait for a TA, with `on_duty_tas` TAs working the queue.
+    """
+    if service_time is None or on_duty_tas < 1:
+        return None
+
+    return ahead * service_time / on_duty_tas
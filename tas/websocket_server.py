@@ -0,0 +1,144 @@
+"""A WebSocket server for the broadcast channel that shares one redis
+subscription between all of its clients.
+
+ws4redis opens a pubsub connection to redis for every WebSocket, so each
+open browser tab costs a redis connection and every published message is
+copied to redis's output buffer once per client. This server speaks the
+same protocol as far as our clients use it (`/ws/ta?subscribe-broadcast`
+and the `WS4REDIS_HEARTBEAT` messages), but gets its messages from the
+process's `tas.event_stream.hub`.
+
+Only broadcasts are supported; clients can't publish, and user, group and
+session channels are ignored. `MultiplexedWebsocketServer` doesn't know how
+to talk to a WebSocket itself. It's combined with ws4redis's uWSGI server in
+`HalliganAvailability.wsgi_websocket`, which can only be imported inside
+uWSGI.
+"""
+import fcntl
+import logging
+import os
+
+from django import http
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.utils.encoding import force_str
+from django.utils.six.moves import http_client
+
+from ws4redis.exceptions import HandshakeError, WebSocketError
+from ws4redis.wsgi_server import WebsocketWSGIServer
+
+from .event_stream import ALL_COURSES, FACILITY, Stream, hub
+
+logger = logging.getLogger(__name__)
+
+# How long a connection can be quiet before a heartbeat is sent, in seconds.
+# The same as ws4redis.
+HEARTBEAT_INTERVAL = 4
+
+
+class WebsocketStream(Stream):
+    """A stream that also wakes up the greenlet serving its WebSocket, so
+    it can wait on the socket and the stream at the same time.
+    """
+
+    def __init__(self):
+        super(WebsocketStream, self).__init__()
+        self.wakeup_fd, self._wakeup_write_fd = os.pipe()
+        # The hub must never block on a client
+        flags = fcntl.fcntl(self._wakeup_write_fd, fcntl.F_GETFL)
+        fcntl.fcntl(self._wakeup_write_fd, fcntl.F_SETFL,
+                    flags | os.O_NONBLOCK)
+
+    def put(self, event):
+        super(WebsocketStream, self).put(event)
+        try:
+            os.write(self._wakeup_write_fd, b'.')
+        except OSError:
+            # The pipe is full, so the reader is already due to wake up
+            pass
+
+    def drain(self):
+        """Returns everything queued up since the last call."""
+        os.read(self.wakeup_fd, 4096)
+        events = []
+        while not self.events.empty():
+            events.append(self.events.get_nowait())
+        return events
+
+    def close(self):
+        self.closed = True
+        os.close(self.wakeup_fd)
+        os.close(self._wakeup_write_fd)
+
+
+class MultiplexedWebsocketServer(WebsocketWSGIServer):
+    """Subclasses have to provide `upgrade_websocket` and `select`, like
+    ws4redis's servers do.
+    """
+
+    def check_subscriptions(self, request):
+        facility = request.path_info.replace(settings.WEBSOCKET_URL, '', 1)
+        if facility != FACILITY:
+            raise HandshakeError('Unknown facility: {}'.format(facility))
+
+        channels, _ = self.process_subscriptions(request)
+        if 'subscribe-broadcast' not in channels:
+            raise HandshakeError('Only broadcasts can be subscribed to')
+
+    def send_heartbeat(self, websocket):
+        heartbeat = getattr(settings, 'WS4REDIS_HEARTBEAT', None)
+        if heartbeat and not websocket.closed:
+            websocket.send(heartbeat)
+
+    def serve(self, websocket):
+        stream = hub.register(ALL_COURSES, WebsocketStream())
+        try:
+            websocket_fd = websocket.get_file_descriptor()
+            while not (websocket.closed or stream.closed):
+                ready = self.select([websocket_fd, stream.wakeup_fd], [], [],
+                                    HEARTBEAT_INTERVAL)[0]
+                if stream.wakeup_fd in ready:
+                    for message in stream.drain():
+                        websocket.send(message)
+
+                if websocket_fd in ready:
+                    # Clients only ever send heartbeats
+                    websocket.receive()
+                    self.send_heartbeat(websocket)
+                elif not ready:
+                    websocket.flush()
+                    self.send_heartbeat(websocket)
+        finally:
+            hub.unregister(ALL_COURSES, stream)
+            stream.close()
+
+    def __call__(self, environ, start_response):
+        websocket = None
+        response = http.HttpResponseServerError()
+        try:
+            self.assure_protocol_requirements(environ)
+            self.check_subscriptions(WSGIRequest(environ))
+            websocket = self.upgrade_websocket(environ, start_response)
+            self.serve(websocket)
+        except WebSocketError as error:
+            logger.debug('WebSocket closed: %s', error)
+        except HandshakeError as error:
+            logger.warning('WebSocket handshake failed: %s', error)
+            response = http.HttpResponseBadRequest(content=error)
+        except Exception as error:
+            logger.exception('WebSocket failed')
+            response = http.HttpResponseServerError(content=error)
+        else:
+            response = http.HttpResponse()
+        finally:
+            if websocket:
+                websocket.close(code=1001, message='Websocket Closed')
+            else:
+                status = '{} {}'.format(
+                    response.status_code,
+                    http_client.responses.get(response.status_code, '')
+                )
+                start_response(force_str(status),
+                               list(response._headers.values()))
+
+        return response